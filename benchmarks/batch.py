@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Compare the throughput (world days per second) of stepping many worlds with
+the batched engine against running the same number of serial simulations
+with a process pool.
+
+    python benchmarks/batch.py --worlds 256 --days 50 --workers 4
+
+"""
+
+from dinolemma.batch import BatchDilemma
+from dinolemma.results import run_replicate
+from multiprocessing import Pool
+import argparse
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="dinolemma batched engine benchmark")
+    parser.add_argument("--worlds", type=int, default=256)
+    parser.add_argument("--days", type=int, default=50)
+    parser.add_argument("--grid_size", type=int, default=25)
+    parser.add_argument("--ndinos", type=int, default=10)
+    parser.add_argument("--ntrees", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    start = time.time()
+    batch = BatchDilemma(
+        worlds=args.worlds,
+        grid_size=args.grid_size,
+        number_dinos=args.ndinos,
+        number_trees=args.ntrees,
+        seed=0,
+    )
+    batch.run(args.days)
+    batched = time.time() - start
+
+    jobs = [
+        {
+            "days": args.days,
+            "seed": i,
+            "grid_size": args.grid_size,
+            "number_dinos": args.ndinos,
+            "number_trees": args.ntrees,
+        }
+        for i in range(args.worlds)
+    ]
+    start = time.time()
+    with Pool(args.workers) as pool:
+        pool.map(run_replicate, jobs)
+    pooled = time.time() - start
+
+    world_days = args.worlds * args.days
+    print("%-24s %12s %16s" % ("engine", "seconds", "world days/s"))
+    print("%-24s %12.2f %16.1f" % ("batched", batched, world_days / batched))
+    print(
+        "%-24s %12.2f %16.1f"
+        % ("pool (%s workers)" % args.workers, pooled, world_days / pooled)
+    )
+
+
+if __name__ == "__main__":
+    main()
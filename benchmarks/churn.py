@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Measure allocation churn from births and deaths. A group of dinosaurs loses
+and gains a number of entities each round (as a volatile population would),
+with and without the pool of removed entities. We report the time, and the
+number of garbage collections (which are triggered by allocations).
+
+    python benchmarks/churn.py --number 10000 --turnover 1000 --rounds 100
+
+"""
+
+from dinolemma.dinosaurs import Dinosaurs
+import argparse
+import gc
+import random
+import time
+
+
+def churn(pool_size, number, turnover, rounds):
+    """Remove and create turnover entities for a number of rounds, and return
+       the seconds and number of garbage collections.
+    """
+    rng = random.Random(0)
+    group = Dinosaurs(number, rng=rng, pool_size=pool_size)
+    collections = sum(stats["collections"] for stats in gc.get_stats())
+    start = time.time()
+    for _ in range(rounds):
+        for name in rng.sample(list(group.entities), turnover):
+            del group[name]
+        for _ in range(turnover):
+            group.new(rng=rng)
+    seconds = time.time() - start
+    collections = sum(stats["collections"] for stats in gc.get_stats()) - collections
+    return seconds, collections
+
+
+def main():
+    parser = argparse.ArgumentParser(description="dinolemma birth and death churn")
+    parser.add_argument("--number", type=int, default=10000)
+    parser.add_argument("--turnover", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    print("%-10s %10s %12s" % ("pool", "seconds", "collections"))
+    for label, pool_size in [("off", 0), ("on", args.turnover)]:
+        seconds, collections = churn(pool_size, args.number, args.turnover, args.rounds)
+        print("%-10s %10.2f %12s" % (label, seconds, collections))
+
+
+if __name__ == "__main__":
+    main()
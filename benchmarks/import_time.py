@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Measure the startup cost of the dinolemma client. Each case is run in a fresh
+interpreter (so nothing is cached in sys.modules) and we report the best and
+median wall time over some number of repeats.
+
+    python benchmarks/import_time.py --repeats 20
+
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+CASES = [
+    ("python (baseline)", ["-c", "pass"]),
+    ("import dinolemma.client", ["-c", "import dinolemma.client"]),
+    ("dinolemma --version", ["-m", "dinolemma.client", "--version"]),
+    ("dinolemma --help", ["-m", "dinolemma.client", "--help"]),
+    ("import dinolemma.game", ["-c", "import dinolemma.game"]),
+]
+
+
+def time_command(args, repeats):
+    """Run a python command some number of times, and return the times (ms)
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, stdout=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="dinolemma import time benchmark")
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    print("%-28s %10s %10s" % ("case", "best (ms)", "median (ms)"))
+    for name, command in CASES:
+        times = time_command(command, args.repeats)
+        print("%-28s %10.1f %10.1f" % (name, min(times), statistics.median(times)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Measure the memory used per entity. For each entity class we create some
+number of placed entities (1 million by default) and report the bytes
+allocated per entity with tracemalloc. The entity names are created before
+tracing starts, so they are not counted.
+
+    python benchmarks/memory.py --number 1000000
+
+"""
+
+from dinolemma.entity import Entity
+from dinolemma.dinosaurs import Dinosaur
+from dinolemma.avocados import AvocadoTree
+import argparse
+import gc
+import tracemalloc
+
+
+def bytes_per_entity(Entity, names):
+    """Create one entity per name (placed on a grid location) and return the
+       bytes allocated per entity.
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    entities = []
+    for i, name in enumerate(names):
+        entity = Entity(name)
+        entity.set_location(i % 1000, i // 1000)
+        entities.append(entity)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # Don't count the list holding the entities
+    return (after - before - len(entities) * 8) / len(entities)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="dinolemma entity memory benchmark")
+    parser.add_argument("--number", type=int, default=1000000)
+    args = parser.parse_args()
+
+    names = ["entity-%s" % i for i in range(args.number)]
+    print("%-14s %16s" % ("entity", "bytes per entity"))
+    for Class in [Entity, Dinosaur, AvocadoTree]:
+        print("%-14s %16.1f" % (Class.__name__, bytes_per_entity(Class, names)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Measure how the per entity kernels (change and death checks for dinosaurs
+and trees) scale with the number of threads, for one large world held as
+arrays. We report the seconds per update and the speedup over one thread.
+
+    python benchmarks/threads.py --number 2000000 --workers 1 2 4 8
+
+"""
+
+from dinolemma.kernels import dinosaur_change, dinosaur_dead, tree_change, tree_dead
+from dinolemma.threads import KernelPool, CHUNK_SIZE
+import argparse
+import numpy
+import time
+
+
+def update(pool, d, t, u, rounds):
+    """Run the kernels for every entity a number of rounds, return seconds
+    """
+    start = time.time()
+    for _ in range(rounds):
+        pool.run(
+            dinosaur_change,
+            d["hunger"],
+            d["size"],
+            d["dead"],
+            d["freezing_point"],
+            d["boiling_point"],
+            50,
+            u[:1],
+        )
+        pool.run(dinosaur_dead, d["hunger"], d["dead"])
+        pool.run(
+            tree_change,
+            t["height"],
+            t["happy"],
+            t["is_diseased"],
+            t["dead"],
+            t["avocados"],
+            t["freezing_point"],
+            t["probability_disease"],
+            50,
+            0.5,
+            u,
+        )
+        pool.run(tree_dead, t["height"], t["dead"])
+    return (time.time() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="dinolemma threaded kernels")
+    parser.add_argument("--number", type=int, default=2000000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--chunk_size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    rng = numpy.random.default_rng(0)
+    number = args.number
+    d = {
+        "hunger": rng.random(number) * 0.5,
+        "size": rng.random(number),
+        "dead": numpy.zeros(number, dtype=bool),
+        "freezing_point": rng.integers(-20, 5, number),
+        "boiling_point": rng.integers(85, 500, number),
+    }
+    t = {
+        "height": rng.random(number),
+        "happy": numpy.ones(number, dtype=bool),
+        "is_diseased": numpy.zeros(number, dtype=bool),
+        "dead": numpy.zeros(number, dtype=bool),
+        "avocados": numpy.zeros(number, dtype=numpy.int64),
+        "freezing_point": rng.integers(-100, 32, number),
+        "probability_disease": rng.random(number) * 0.05,
+    }
+    u = rng.random((4, number))
+
+    print("%-10s %10s %10s" % ("workers", "seconds", "speedup"))
+    single = None
+    for workers in args.workers:
+        pool = KernelPool(workers, chunk_size=args.chunk_size)
+        seconds = update(pool, d, t, u, args.rounds)
+        pool.shutdown()
+        single = single or seconds
+        print("%-10s %10.4f %10.2f" % (workers, seconds, single / seconds))
+
+
+if __name__ == "__main__":
+    main()
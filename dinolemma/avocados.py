@@ -8,18 +8,37 @@ with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 """
 
-from dinolemma.entity import Group, Entity
+from dinolemma.colors import GREEN
+from dinolemma.entity import Group, Entity, PERCENT
+from dinolemma.environment import Environment
 from dinolemma.namer import GenericNamer
+from dinolemma.species import register, TREE
 import random
 import numpy
 
 
 class AvocadoTree(Entity):
-    def __init__(self, name, can_move=False):
-        super().__init__(name=name, can_move=can_move)
+
+    __slots__ = (
+        "height",
+        "dead",
+        "happy",
+        "is_diseased",
+        "avocados",
+        "freezing_point",
+        "probability_disease",
+        "probability_reproduce",
+    )
+    tracked = ("height", "avocados")
+
+    def __init__(self, name, can_move=False, uid=None, rng=random):
+        super().__init__(name=name, can_move=can_move, uid=uid, rng=rng)
+
+    def reset(self, name, uid=None, rng=random):
+        super().reset(name, uid=uid, rng=rng)
 
         # The age of an avocado tree is represented by it's height
-        self.height = random.choice(range(100)) * 0.01
+        self.height = rng.choice(PERCENT)
         self.dead = False
         self.happy = True
         self.is_diseased = False
@@ -27,14 +46,14 @@ class AvocadoTree(Entity):
         # More than 80% grown, we can have avocados!
         self.avocados = 0
         if self.height > 0.80:
-            self.avocados = random.choice(range(0, 5))
+            self.avocados = rng.choice(range(0, 5))
 
         # At this temperature, there is a 50% chance of freezing
-        self.freezing_point = random.choice(range(-100, 32))
+        self.freezing_point = rng.choice(range(-100, 32))
 
         # Probabilities are different per tree
-        self.probability_disease = random.choice(range(0, 5)) * 0.01
-        self.probability_reproduce = random.choice(range(0, 5)) * 0.01
+        self.probability_disease = rng.choice(PERCENT[:5])
+        self.probability_reproduce = rng.choice(PERCENT[:5])
 
     def stats(self):
         """Return stats for an avocado tree
@@ -55,14 +74,21 @@ class AvocadoTree(Entity):
         """
         return self.height > 0.80
 
-    def change(self, **kwargs):
+    @property
+    def has_food(self):
+        """A living, mature tree with avocados has food (for dinosaurs)
+        """
+        return self.is_mature and self.avocados > 0 and not self.is_dead
+
+    def change(self, rng=random, environment=None, **kwargs):
         """If the avocado tree is less than it's full size, allow it to grow.
            The growth is an equation of the current sunlight and water 
-           conditions.
+           conditions (from the environment for the day).
         """
-        # We should have all arguments, but good to be careful
-        temperature = kwargs.get("temperature", 55)
-        humidity = kwargs.get("humidity", 0.5)
+        # We should have an environment, but good to be careful
+        environment = environment or Environment.create(**kwargs)
+        temperature = environment.temperature
+        humidity = environment.humidity
 
         # Avocado trees grow well in higher humidity, moderate temperatures
         # A diseased tree cannot grow or reproduce
@@ -73,36 +99,31 @@ class AvocadoTree(Entity):
 
         # Avocado Trees can freeze to death, moreso if they are diseased
         if temperature <= self.freezing_point:
-            p = [0.5, 0.5] if self.is_diseased else [0.6, 0.4]
-            self.dead = numpy.random.choice([True, False], p=p)
+            p_death = 0.5 if self.is_diseased else 0.6
+            self.dead = rng.random() < p_death
 
         # A healthy tree can get a disease (but can't get better)
-        self.is_diseased = numpy.random.choice(
-            [True, self.is_diseased],
-            p=[self.probability_disease, 1 - self.probability_disease],
-        )
+        if rng.random() < self.probability_disease:
+            self.is_diseased = True
 
         # Healthy avocado trees that are full grown can produce an avocado or grow!
         if not self.is_dead and not self.is_diseased:
-            self.grow_avocado()
+            self.grow_avocado(rng=rng)
 
-    def grow_avocado(self):
+    def grow_avocado(self, rng=random):
         """A healthy avocado tree can generate a new avocado!
         """
         if self.is_mature:
-            self.avocados += numpy.random.choice(
-                [0, random.choice(range(0, 5))], p=[0.2, 0.8]
-            )
+            avocados = rng.choice(range(0, 5))
+            if rng.random() < 0.8:
+                self.avocados += avocados
 
-    def reproduce(self, **kwargs):
+    def reproduce(self, rng=random, **kwargs):
         """An avocado tree has a small percentage of reproducing if it's over
            a particular height (mature) and the weather is good.
         """
         if self.is_mature and self.happy:
-            return numpy.random.choice(
-                [True, False],
-                p=[self.probability_reproduce, 1 - self.probability_reproduce],
-            )
+            return rng.random() < self.probability_reproduce
         return False
 
 
@@ -116,16 +137,21 @@ class AvocadoNamer(GenericNamer):
     def __repr__(self):
         return self.__str__()
 
-    def generate(self, delim="-"):
-        prefix = self._generate(delim)
+    def generate(self, delim="-", rng=random):
+        prefix = self._generate(delim, rng=rng)
         return "%s%stree" % (prefix, delim)
 
 
+@register(TREE, AvocadoTree, name="avocado tree", color=GREEN)
 class AvocadoTrees(Group):
     """A group of avocado trees
     """
 
-    def __init__(self, number=None):
+    def __init__(self, number=None, **kwargs):
         super().__init__(
-            name="trees", number=number, Entity=AvocadoTree, namer=AvocadoNamer
+            name="trees",
+            number=number,
+            Entity=AvocadoTree,
+            namer=AvocadoNamer,
+            **kwargs
         )
@@ -0,0 +1,563 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+from dinolemma.kernels import (
+    dinosaur_change,
+    tree_change,
+    dinosaur_dead,
+    tree_dead,
+    first_per_key,
+)
+from dinolemma.errors import PlacementError
+from dinolemma.render import EMPTY
+from dinolemma.rng import uniforms
+from dinolemma.threads import KernelPool
+from dinolemma.species import TREE, DINOSAUR
+import numpy
+
+# Seasons in order (each is followed by the next), and for each the range of
+# temperatures (None is the min or max temperature) and chance of humidity
+SEASONS = ["summer", "fall", "winter", "spring"]
+TEMPERATURES = [(56, None), (30, 62), (None, 32), (40, 55)]
+CHANCE_HUMID = numpy.array([0.75, 0.6, 0.1, 0.4])
+
+# left, right, down, up (the order of DinosaurDilemma.get_adjacent_coords)
+DIRECTIONS = numpy.array([(-1, 0), (1, 0), (0, -1), (0, 1)])
+
+DINOSAUR_FIELDS = {
+    "world": numpy.int64,
+    "uid": numpy.int64,
+    "x": numpy.int64,
+    "y": numpy.int64,
+    "size": numpy.float64,
+    "hunger": numpy.float64,
+    "dead": numpy.bool_,
+    "killed": numpy.bool_,
+    "gender": numpy.int8,
+    "freezing_point": numpy.int64,
+    "boiling_point": numpy.int64,
+    "probability_fight": numpy.float64,
+    "probability_reproduce": numpy.float64,
+}
+
+TREE_FIELDS = {
+    "world": numpy.int64,
+    "uid": numpy.int64,
+    "x": numpy.int64,
+    "y": numpy.int64,
+    "height": numpy.float64,
+    "dead": numpy.bool_,
+    "killed": numpy.bool_,
+    "happy": numpy.bool_,
+    "diseased": numpy.bool_,
+    "avocados": numpy.int64,
+    "freezing_point": numpy.int64,
+    "probability_disease": numpy.float64,
+    "probability_reproduce": numpy.float64,
+}
+
+# Counter positions of the draws for an entity on a day (its stream is keyed
+# by world and uid), so each draw has a fixed place regardless of the others
+MOVE, PRIORITY, CHANGE, REPRODUCE, INTERACT, BIRTH, BIRTH_PRIORITY, INIT = (
+    0,
+    1,
+    2,
+    6,
+    7,
+    19,
+    20,
+    21,
+)
+
+
+def _take(arrays, index):
+    return {name: values[index] for name, values in arrays.items()}
+
+
+def _concat(first, second):
+    return {name: numpy.concatenate([first[name], second[name]]) for name in first}
+
+
+def _empty(fields):
+    return {name: numpy.zeros(0, dtype=dtype) for name, dtype in fields.items()}
+
+
+class BatchDilemma:
+    """A BatchDilemma holds K independent worlds, and advances all of them
+       in one vectorized step. Grids have shape (K, N, N) and entities are
+       held as arrays (one per attribute) tagged with their world, so the
+       cost of a day is a fixed number of array operations rather than
+       Python calls per entity. The rules of an interaction are those of
+       DinosaurDilemma (see dinolemma.interactions, e.g., of two fighting
+       dinosaurs far enough apart in strength, the stronger dies), but each
+       phase (climate, movement, change, reproduction, interaction and
+       births) is applied to all entities at once: moves and births that
+       claim the same cell are resolved by a random priority, and an entity
+       killed in an interaction stops interacting for the rest of the day.
+       So a world follows the same rules as DinosaurDilemma.run_day, not the
+       same course (a seed does not give the same world as run_day).
+
+       Randomness is counter based (dinolemma.rng), keyed by the seed, day,
+       world and entity uid, so a world does not depend on how many other
+       worlds are simulated with it.
+    """
+
+    def __init__(
+        self,
+        worlds=8,
+        grid_size=25,
+        number_dinos=None,
+        number_trees=None,
+        days_in_season=90,
+        max_temperature=86,
+        min_temperature=0,
+        seed=0,
+        threads=1,
+    ):
+        self.worlds = worlds
+        self.grid_size = grid_size
+        self.days_in_season = days_in_season
+        self.max_temperature = max_temperature
+        self.min_temperature = min_temperature
+        self.seed = seed
+        self.day = 0
+
+        # Kernels run in chunks on a number of threads (see dinolemma.threads)
+        self.kernels = KernelPool(threads)
+
+        self.codes = numpy.full(
+            (worlds, grid_size, grid_size), EMPTY, dtype=numpy.uint8
+        )
+        self.next_uid = numpy.zeros(worlds, dtype=numpy.int64)
+        self.counts = {
+            name: numpy.zeros(worlds, dtype=numpy.int64)
+            for name in ["births", "deaths", "fights"]
+        }
+        self.season = numpy.zeros(worlds, dtype=numpy.int64)
+        self.days_left_season = numpy.zeros(worlds, dtype=numpy.int64)
+        self.temperature = numpy.zeros(worlds, dtype=numpy.int64)
+        self.humidity = numpy.zeros(worlds, dtype=numpy.float64)
+
+        self.dinosaurs = _empty(DINOSAUR_FIELDS)
+        self.trees = _empty(TREE_FIELDS)
+        self._init_worlds(number_dinos, number_trees)
+        self.newday()
+
+    # Initialization
+
+    def _init_worlds(self, number_dinos, number_trees):
+        """Choose the season, and place entities in each world. A world is
+           initialized from its own generator (seed, world) so it is the same
+           no matter how many worlds there are.
+        """
+        cells = self.grid_size * self.grid_size
+        dinos = []
+        trees = []
+        for world in range(self.worlds):
+            generator = numpy.random.default_rng([self.seed, world])
+            self.season[world] = SEASONS.index(
+                generator.choice(["summer", "spring", "winter", "fall"])
+            )
+            self.days_left_season[world] = generator.integers(self.days_in_season)
+            ndinos = number_dinos or generator.integers(15)
+            ntrees = number_trees or generator.integers(15)
+            if ndinos + ntrees + 10 > cells:
+                raise PlacementError(
+                    "You must increase grid size or decrease entities."
+                )
+
+            chosen = generator.choice(cells, ndinos + ntrees, replace=False)
+            dinos.append((world, chosen[:ndinos]))
+            trees.append((world, chosen[ndinos:]))
+
+        for placements, new in [(dinos, self._new_dinosaurs), (trees, self._new_trees)]:
+            world = numpy.concatenate(
+                [numpy.full(len(c), w, dtype=numpy.int64) for w, c in placements]
+            )
+            chosen = numpy.concatenate([c for _, c in placements]).astype(numpy.int64)
+            new(world, chosen // self.grid_size, chosen % self.grid_size)
+
+    def _assign_uids(self, world):
+        """Assign new uids (per world) to entities being created in world,
+           which must be sorted by world.
+        """
+        first = numpy.searchsorted(world, world)
+        uid = self.next_uid[world] + numpy.arange(len(world)) - first
+        self.next_uid += numpy.bincount(world, minlength=self.worlds)
+        return uid
+
+    def _draw(self, world, uid, counter, rows=1):
+        """Draws from the streams of entities (by world and uid) for today,
+           starting at a counter position. Returns an array (rows, n).
+        """
+        keys = world * (1 << 32) + uid
+        return numpy.array(
+            [uniforms(self.seed, self.day, keys, counter + i) for i in range(rows)]
+        ).reshape(rows, len(keys))
+
+    def _new_dinosaurs(self, world, x, y):
+        """Create new dinosaurs (as in Dinosaur.__init__) at x, y in world
+        """
+        uid = self._assign_uids(world)
+        u = self._draw(world, uid, INIT, rows=7)
+        self.dinosaurs = _concat(
+            self.dinosaurs,
+            {
+                "world": world,
+                "uid": uid,
+                "x": x,
+                "y": y,
+                "size": numpy.floor(u[0] * 100) * 0.01,
+                "hunger": (80 + numpy.floor(u[1] * 20)) * 0.01,
+                "dead": numpy.zeros(len(world), dtype=bool),
+                "killed": numpy.zeros(len(world), dtype=bool),
+                "gender": numpy.searchsorted([0.48, 0.96], u[2], side="right").astype(
+                    numpy.int8
+                ),
+                "freezing_point": -20 + numpy.floor(u[3] * 25).astype(numpy.int64),
+                "boiling_point": 85 + numpy.floor(u[4] * 415).astype(numpy.int64),
+                "probability_fight": numpy.floor(u[5] * 100) * 0.01,
+                "probability_reproduce": numpy.floor(u[6] * 100) * 0.01,
+            },
+        )
+        self.codes[world, x, y] = DINOSAUR
+
+    def _new_trees(self, world, x, y):
+        """Create new avocado trees (as in AvocadoTree.__init__) at x, y
+        """
+        uid = self._assign_uids(world)
+        u = self._draw(world, uid, INIT, rows=5)
+        height = numpy.floor(u[0] * 100) * 0.01
+        self.trees = _concat(
+            self.trees,
+            {
+                "world": world,
+                "uid": uid,
+                "x": x,
+                "y": y,
+                "height": height,
+                "dead": numpy.zeros(len(world), dtype=bool),
+                "killed": numpy.zeros(len(world), dtype=bool),
+                "happy": numpy.ones(len(world), dtype=bool),
+                "diseased": numpy.zeros(len(world), dtype=bool),
+                "avocados": numpy.where(height > 0.80, numpy.floor(u[1] * 5), 0).astype(
+                    numpy.int64
+                ),
+                "freezing_point": -100 + numpy.floor(u[2] * 132).astype(numpy.int64),
+                "probability_disease": numpy.floor(u[3] * 5) * 0.01,
+                "probability_reproduce": numpy.floor(u[4] * 5) * 0.01,
+            },
+        )
+        self.codes[world, x, y] = TREE
+
+    # Climate
+
+    def newday(self):
+        """Advance the day, season and climate of every world
+        """
+        self.day += 1
+        # World k draws from the stream of uid WORLD - k (as int64, -(k + 1))
+        worlds = -numpy.arange(1, self.worlds + 1)
+        u = numpy.array([uniforms(self.seed, self.day, worlds, i) for i in range(4)])
+
+        ended = self.days_left_season == 0
+        self.season = numpy.where(ended, (self.season + 1) % 4, self.season)
+        self.days_left_season = numpy.where(
+            ended, self.days_in_season, self.days_left_season
+        )
+        self.days_left_season -= 1
+
+        low = numpy.array(
+            [self.min_temperature if lo is None else lo for lo, _ in TEMPERATURES]
+        )[self.season]
+        high = numpy.array(
+            [self.max_temperature if hi is None else hi for _, hi in TEMPERATURES]
+        )[self.season]
+        self.temperature = low + numpy.floor(u[0] * (high - low)).astype(numpy.int64)
+
+        low_humidity = (30 + numpy.floor(u[1] * 20)) * 0.01
+        high_humidity = (50 + numpy.floor(u[2] * 30)) * 0.01
+        self.humidity = numpy.where(
+            u[3] < CHANCE_HUMID[self.season], high_humidity, low_humidity
+        )
+
+    # Grid
+
+    def _neighbors(self, world, x, y, direction):
+        """Return the neighbor cell in a direction, and if it is on the grid
+        """
+        dx, dy = DIRECTIONS[direction]
+        nx = x + dx
+        ny = y + dy
+        valid = (nx >= 0) & (nx < self.grid_size) & (ny >= 0) & (ny < self.grid_size)
+        return (
+            numpy.clip(nx, 0, self.grid_size - 1),
+            numpy.clip(ny, 0, self.grid_size - 1),
+            valid,
+        )
+
+    def _open_cells(self, world, x, y):
+        """Return an (n, 4) mask of open adjacent cells
+        """
+        mask = numpy.zeros((len(world), 4), dtype=bool)
+        for direction in range(4):
+            nx, ny, valid = self._neighbors(world, x, y, direction)
+            mask[:, direction] = valid & (self.codes[world, nx, ny] == EMPTY)
+        return mask
+
+    def _choose_cells(self, world, x, y, u, priority):
+        """Choose a random open adjacent cell for each entity, and resolve
+           entities that choose the same cell by priority. Returns the index
+           of the winners, and their cells.
+        """
+        mask = self._open_cells(world, x, y)
+        number_open = mask.sum(axis=1)
+        chosen = numpy.floor(u * number_open)
+        direction = numpy.argmax(numpy.cumsum(mask, axis=1) > chosen[:, None], axis=1)
+        dx, dy = DIRECTIONS[direction].T
+        tx = x + dx
+        ty = y + dy
+
+        candidates = numpy.flatnonzero(number_open > 0)
+        keys = (world * self.grid_size + tx) * self.grid_size + ty
+        winners = candidates[first_per_key(keys[candidates], priority[candidates])]
+        return winners, tx[winners], ty[winners]
+
+    def _index(self, entities):
+        """Return a (K, N, N) grid with the index of each entity (or -1)
+        """
+        index = numpy.full(self.codes.shape, -1, dtype=numpy.int64)
+        index[entities["world"], entities["x"], entities["y"]] = numpy.arange(
+            len(entities["world"])
+        )
+        return index
+
+    def _remove(self, entities, remove):
+        """Remove entities (a mask) from the grid, count them as deaths, and
+           return the entities that remain
+        """
+        self.codes[
+            entities["world"][remove], entities["x"][remove], entities["y"][remove]
+        ] = EMPTY
+        self.counts["deaths"] += numpy.bincount(
+            entities["world"][remove], minlength=self.worlds
+        )
+        return _take(entities, ~remove)
+
+    # Phases
+
+    def move(self):
+        """Every dinosaur moves to a random open adjacent cell (if any)
+        """
+        dinos = self.dinosaurs
+        u = self._draw(dinos["world"], dinos["uid"], MOVE, rows=2)
+        winners, tx, ty = self._choose_cells(
+            dinos["world"], dinos["x"], dinos["y"], u[0], u[1]
+        )
+        world = dinos["world"][winners]
+        self.codes[world, dinos["x"][winners], dinos["y"][winners]] = EMPTY
+        self.codes[world, tx, ty] = DINOSAUR
+        dinos["x"][winners] = tx
+        dinos["y"][winners] = ty
+
+    def change(self):
+        """Every entity changes with the climate of its world
+        """
+        dinos = self.dinosaurs
+        world = dinos["world"]
+        self.kernels.run(
+            dinosaur_change,
+            dinos["hunger"],
+            dinos["size"],
+            dinos["dead"],
+            dinos["freezing_point"],
+            dinos["boiling_point"],
+            self.temperature[world],
+            self._draw(world, dinos["uid"], CHANGE),
+        )
+        trees = self.trees
+        world = trees["world"]
+        self.kernels.run(
+            tree_change,
+            trees["height"],
+            trees["happy"],
+            trees["diseased"],
+            trees["dead"],
+            trees["avocados"],
+            trees["freezing_point"],
+            trees["probability_disease"],
+            self.temperature[world],
+            self.humidity[world],
+            self._draw(world, trees["uid"], CHANGE, rows=4),
+        )
+
+    def reproduce(self):
+        """Return masks of dinosaurs (hybrids) and trees (mature and happy)
+           that reproduce on their own today
+        """
+        dinos = self.dinosaurs
+        u = self._draw(dinos["world"], dinos["uid"], REPRODUCE)[0]
+        dinosaurs = (dinos["gender"] == 2) & (u < dinos["probability_reproduce"])
+
+        trees = self.trees
+        u = self._draw(trees["world"], trees["uid"], REPRODUCE)[0]
+        mature = (trees["height"] > 0.80) & trees["happy"]
+        return dinosaurs, mature & (u < trees["probability_reproduce"])
+
+    def interact(self):
+        """Every dinosaur interacts with its neighbors, one direction at a
+           time. In one direction, each cell is the neighbor of at most one
+           dinosaur, so updates within a direction never conflict.
+        """
+        dinos = self.dinosaurs
+        trees = self.trees
+        dino_index = self._index(dinos)
+        tree_index = self._index(trees)
+        world = dinos["world"]
+        u = self._draw(world, dinos["uid"], INTERACT, rows=12).reshape(4, 3, -1)
+
+        for direction in range(4):
+            nx, ny, valid = self._neighbors(world, dinos["x"], dinos["y"], direction)
+            actor = valid & ~dinos["killed"]
+            eat, trample, fight = u[direction]
+
+            # A dinosaur eats from a mature tree with avocados
+            tree = numpy.where(actor, tree_index[world, nx, ny], -1)
+            has_tree = numpy.flatnonzero(tree >= 0)
+            tree = tree[has_tree]
+            alive = ~trees["killed"][tree]
+            has_tree = has_tree[alive]
+            tree = tree[alive]
+
+            avocados = trees["avocados"][tree]
+            fruit = (trees["height"][tree] > 0.80) & (avocados > 0)
+            eaten = numpy.where(fruit, numpy.floor(eat[has_tree] * avocados), 0)
+            sick = trees["diseased"][tree] & (eaten > 0)
+            dinos["hunger"][has_tree] += numpy.where(sick, -0.1, 0.1) * eaten
+            trees["avocados"][tree] -= eaten.astype(numpy.int64)
+
+            # A small tree can be trampled
+            trampled = (trees["height"][tree] <= 0.10) & (trample[has_tree] < 0.5)
+            trees["killed"][tree[trampled]] = True
+
+            # Two aggressive dinosaurs can fight, and the stronger can die (as in
+            # dinolemma.interactions.dinosaurXdinosaur, ties kill the other)
+            other = numpy.where(actor, dino_index[world, nx, ny], -1)
+            has_other = numpy.flatnonzero(other >= 0)
+            other = other[has_other]
+            hunger = dinos["hunger"][has_other]
+            hunger_other = dinos["hunger"][other]
+            aggressive = (hunger > 0.9) & (hunger_other > 0.9) & ~dinos["killed"][other]
+            p_fight = numpy.minimum(1.0, (hunger + hunger_other) / 2)
+            fought = aggressive & (fight[has_other] < p_fight)
+            self.counts["fights"] += numpy.bincount(
+                world[has_other][fought], minlength=self.worlds
+            )
+            strength = 1 - hunger
+            strength_other = 1 - hunger_other
+            deadly = fought & (numpy.abs(strength - strength_other) > 0.4)
+            loser = numpy.where(strength > strength_other, has_other, other)
+            dinos["killed"][loser[deadly]] = True
+
+    def births(self, dinosaurs, trees):
+        """Resolve the births of the day in one pass. Each parent claims a
+           random open cell next to it, and parents that claim the same cell
+           are resolved by priority (the first to claim it wins). Only births
+           that claimed a cell create an entity.
+        """
+        for parents, new in [
+            (dinosaurs, self._new_dinosaurs),
+            (trees, self._new_trees),
+        ]:
+            entities = self.dinosaurs if new == self._new_dinosaurs else self.trees
+            index = numpy.flatnonzero(parents)
+            world = entities["world"][index]
+            u = self._draw(world, entities["uid"][index], BIRTH, rows=2)
+            winners, tx, ty = self._choose_cells(
+                world, entities["x"][index], entities["y"][index], u[0], u[1]
+            )
+            order = numpy.argsort(world[winners], kind="stable")
+            new(world[winners][order], tx[order], ty[order])
+            self.counts["births"] += numpy.bincount(
+                world[winners], minlength=self.worlds
+            )
+
+    def run_day(self):
+        """Advance every world by one day
+        """
+        self.newday()
+
+        # Entities that died (starved, froze, etc.) are removed on the next day
+        dinos = self.dinosaurs
+        self.dinosaurs = self._remove(
+            dinos, self.kernels.run(dinosaur_dead, dinos["hunger"], dinos["dead"])
+        )
+        trees = self.trees
+        self.trees = self._remove(
+            trees, self.kernels.run(tree_dead, trees["height"], trees["dead"])
+        )
+
+        self.move()
+        self.change()
+        dinosaurs, trees = self.reproduce()
+        self.interact()
+
+        # Entities killed in an interaction don't reproduce, and are removed
+        dinosaurs &= ~self.dinosaurs["killed"]
+        trees &= ~self.trees["killed"]
+        self.births(dinosaurs, trees)
+        self.dinosaurs = self._remove(self.dinosaurs, self.dinosaurs["killed"])
+        self.trees = self._remove(self.trees, self.trees["killed"])
+
+    def run(self, days=100, progress=None):
+        """Run every world for a number of days. A progress
+           (dinolemma.progress.Progress) is updated each day.
+        """
+        for _ in range(days):
+            self.run_day()
+            if progress is not None:
+                progress.update(1, len(self.dinosaurs["uid"]) + len(self.trees["uid"]))
+
+    # Summary
+
+    @property
+    def dinosaur_counts(self):
+        return numpy.bincount(self.dinosaurs["world"], minlength=self.worlds)
+
+    @property
+    def tree_counts(self):
+        return numpy.bincount(self.trees["world"], minlength=self.worlds)
+
+    def grid_codes(self, world):
+        """Return the palette codes (see dinolemma.render) for one world
+        """
+        return self.codes[world].copy()
+
+    def summary(self):
+        """Return a summary (a list of dicts, one per world)
+        """
+        dinosaurs = self.dinosaur_counts
+        trees = self.tree_counts
+        return [
+            {
+                "world": world,
+                "day": self.day,
+                "season": SEASONS[self.season[world]],
+                "days_left_season": int(self.days_left_season[world]),
+                "temperature": int(self.temperature[world]),
+                "humidity": float(self.humidity[world]),
+                "dinosaurs": int(dinosaurs[world]),
+                "trees": int(trees[world]),
+                "births": int(self.counts["births"][world]),
+                "deaths": int(self.counts["deaths"][world]),
+                "fights": int(self.counts["fights"][world]),
+            }
+            for world in range(self.worlds)
+        ]
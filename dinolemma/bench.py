@@ -0,0 +1,256 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+from contextlib import redirect_stdout
+import datetime
+import hashlib
+import json
+import os
+import platform
+import statistics
+import time
+
+# Seeded workloads: (grid size, number of dinosaurs, number of trees)
+WORKLOADS = {
+    "small": (25, 10, 10),
+    "medium": (50, 50, 100),
+    "large": (100, 200, 400),
+}
+
+SEED = 42
+
+# Thresholds (a fraction slower) for a regression of benchmarks that are
+# short, and so noisier than most (others use the threshold given to compare)
+THRESHOLDS = {"init_grid": 0.2, "interact": 0.25}
+
+
+def _simulation(grid_size, number_dinos, number_trees):
+    from dinolemma.game import DinosaurDilemma
+
+    return DinosaurDilemma(
+        grid_size=grid_size,
+        number_dinos=number_dinos,
+        number_trees=number_trees,
+        seed=SEED,
+    )
+
+
+# Each benchmark takes a workload and does any setup (not timed), returning
+# the function to time
+
+
+def bench_run_day(*workload):
+    """Run ten days of a simulation
+    """
+    simulation = _simulation(*workload)
+
+    def run():
+        for _ in range(10):
+            simulation.run_day()
+
+    return run
+
+
+def bench_init_grid(*workload):
+    """Initialize (create and place entities on) the grid
+    """
+    return _simulation(*workload)._init_grid
+
+
+def bench_interact(*workload):
+    """Every dinosaur interacts with its neighbors once
+    """
+    simulation = _simulation(*workload)
+    dinosaurs = list(simulation.dinosaurs.entities.values())
+
+    def run():
+        for dinosaur in dinosaurs:
+            if simulation.dinosaurs.entities.get(dinosaur.name) is dinosaur:
+                rng = simulation.streams.entity(simulation.day, dinosaur.uid)
+                simulation.interact(dinosaur, rng=rng)
+
+    return run
+
+
+def bench_render(*workload):
+    """Render one frame (headless, see dinolemma.render)
+    """
+    from dinolemma.render import grid_codes, scale_codes, to_rgb
+
+    simulation = _simulation(*workload)
+    return lambda: to_rgb(scale_codes(grid_codes(simulation)))
+
+
+def bench_gui(*workload):
+    """Draw the grid as the graphical interface does (without a display)
+    """
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    from dinolemma.gui import draw_grid
+    import pygame
+
+    simulation = _simulation(*workload)
+    size = simulation.grid_size * 11 + 1
+    screen = pygame.Surface((size, size))
+    return lambda: draw_grid(screen, simulation, 10, 10, 1)
+
+
+BENCHMARKS = {
+    "run_day": bench_run_day,
+    "init_grid": bench_init_grid,
+    "interact": bench_interact,
+    "render": bench_render,
+    "gui": bench_gui,
+}
+
+
+def fingerprint():
+    """Return a short key (and the details) identifying this machine and
+       Python, so baselines are only compared on the same setup.
+    """
+    import numpy
+
+    info = {
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "system": platform.system(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "numpy": numpy.__version__,
+    }
+    key = hashlib.sha1(json.dumps(info, sort_keys=True).encode("utf-8"))
+    return key.hexdigest()[:12], info
+
+
+def run_benchmarks(repeats=7, only=None):
+    """Run each benchmark for each workload (repeats times, after a warm up)
+       and return results by name (e.g., run_day/small), with the samples
+       (seconds), the best (least) time, median and median absolute
+       deviation. Benchmarks that need an optional dependency that is
+       missing are skipped.
+    """
+    from importlib.util import find_spec
+
+    results = {}
+    with open(os.devnull, "w") as null, redirect_stdout(null):
+        for benchmark, setup in BENCHMARKS.items():
+            if benchmark == "gui" and not find_spec("pygame"):
+                continue
+            for workload, params in WORKLOADS.items():
+                name = "%s/%s" % (benchmark, workload)
+                if only and not name.startswith(only):
+                    continue
+                samples = []
+                for repeat in range(repeats + 1):
+                    function = setup(*params)
+                    start = time.perf_counter()
+                    function()
+                    if repeat:
+                        samples.append(time.perf_counter() - start)
+                median = statistics.median(samples)
+                results[name] = {
+                    "samples": samples,
+                    "best": min(samples),
+                    "median": median,
+                    "mad": statistics.median(abs(s - median) for s in samples),
+                }
+    return results
+
+
+class BaselineStore:
+    """A BaselineStore is a json file of benchmark results, by machine
+       fingerprint and then version. There is one baseline per version on
+       a machine (saving again replaces it).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.data = {"machines": {}}
+        if os.path.exists(path):
+            with open(path, "r") as filey:
+                self.data = json.loads(filey.read())
+
+    def __str__(self):
+        return "[baseline-store:%s]" % self.path
+
+    def __repr__(self):
+        return self.__str__()
+
+    def save(self, version, results):
+        key, info = fingerprint()
+        machine = self.data["machines"].setdefault(key, {"info": info, "versions": {}})
+        machine["versions"][version] = {
+            "created": datetime.datetime.now().isoformat(),
+            "results": results,
+        }
+        with open(self.path, "w") as filey:
+            filey.write(json.dumps(self.data, indent=4))
+
+    def get(self, version=None):
+        """Return (version, results) of a baseline for this machine, the most
+           recent one if no version is given, or (None, None) if not found.
+        """
+        key, _ = fingerprint()
+        versions = self.data["machines"].get(key, {}).get("versions", {})
+        if version is None and versions:
+            version = max(versions, key=lambda v: versions[v]["created"])
+        if version not in versions:
+            return None, None
+        return version, versions[version]["results"]
+
+
+def compare(baseline, current, threshold=0.1, thresholds=THRESHOLDS):
+    """Compare current results to a baseline. The workloads are fixed, so
+       the best time of each is the least noisy measure of its cost. A
+       benchmark is a regression if its best time is slower by more than
+       its threshold (a fraction, from thresholds or else threshold) plus
+       the noise (twice the relative deviation of the noisier of the two
+       runs). Returns a list of rows.
+    """
+    rows = []
+    for name, result in current.items():
+        limit = thresholds.get(name.split("/")[0], threshold)
+        row = {"name": name, "current": result["best"], "baseline": None}
+        base = baseline.get(name)
+        if not base:
+            row.update({"change": None, "status": "new"})
+            rows.append(row)
+            continue
+
+        noise = 2 * max(base["mad"] / base["median"], result["mad"] / result["median"])
+        change = (result["best"] - base["best"]) / base["best"]
+        status = "ok"
+        if change > limit + noise:
+            status = "REGRESSION"
+        elif change < -(limit + noise):
+            status = "faster"
+        row.update({"baseline": base["best"], "change": change, "status": status})
+        rows.append(row)
+    return rows
+
+
+def print_report(rows):
+    """Print a comparison (of best times) as a table
+    """
+    print(
+        "%-22s %12s %12s %9s  %s" % ("benchmark", "baseline", "current", "change", "")
+    )
+    for row in rows:
+        baseline = "%.2fms" % (row["baseline"] * 1000) if row["baseline"] else "-"
+        change = "%+.1f%%" % (row["change"] * 100) if row["change"] is not None else "-"
+        print(
+            "%-22s %12s %12s %9s  %s"
+            % (
+                row["name"],
+                baseline,
+                "%.2fms" % (row["current"] * 1000),
+                change,
+                row["status"],
+            )
+        )
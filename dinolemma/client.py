@@ -10,11 +10,10 @@ with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 """
 
-from dinolemma.game import DinosaurDilemma
-import dinolemma
+# Only lightweight modules are imported here, the simulation (and numpy)
+# is imported when a command needs it, so --version and --help stay fast
 import argparse
 import sys
-import os
 
 
 def get_parser():
@@ -40,7 +39,356 @@ def get_parser():
         "gui", help="run a Dinosaur Dilemma simulation in the graphical interface"
     )
 
-    for command in [run, gui]:
+    render = subparsers.add_parser(
+        "render", help="run a simulation and export frames without a display"
+    )
+    render.add_argument(
+        "--days",
+        dest="days",
+        help="the number of days to simulate.",
+        type=int,
+        default=100,
+    )
+    render.add_argument(
+        "--every",
+        dest="every",
+        help="record a frame every N days.",
+        type=int,
+        default=1,
+    )
+    render.add_argument(
+        "--outdir",
+        dest="outdir",
+        help="the directory to write png frames to.",
+        default="frames",
+    )
+    render.add_argument(
+        "--gif",
+        dest="gif",
+        help="also write an animated gif to this path (requires Pillow).",
+        default=None,
+    )
+    render.add_argument(
+        "--cell_size",
+        dest="cell_size",
+        help="the width and height of a cell in the image, in pixels.",
+        type=int,
+        default=10,
+    )
+    render.add_argument(
+        "--workers",
+        dest="workers",
+        help="the number of worker processes to encode frames.",
+        type=int,
+        default=None,
+    )
+
+    ensemble = subparsers.add_parser(
+        "ensemble", help="run an ensemble of simulations into a results database"
+    )
+    ensemble.add_argument(
+        "--runs",
+        dest="runs",
+        help="the number of simulations to run.",
+        type=int,
+        default=10,
+    )
+    ensemble.add_argument(
+        "--days",
+        dest="days",
+        help="the number of days to simulate.",
+        type=int,
+        default=100,
+    )
+    ensemble.add_argument(
+        "--workers",
+        dest="workers",
+        help="the number of worker processes.",
+        type=int,
+        default=None,
+    )
+
+    ensemble.add_argument(
+        "--every",
+        dest="every",
+        help="keep the metrics of every Nth day (and the last).",
+        type=int,
+        default=1,
+    )
+    ensemble.add_argument(
+        "--budget",
+        dest="budget",
+        help="keep at most this many regular days per run (widens --every).",
+        type=int,
+        default=None,
+    )
+    ensemble.add_argument(
+        "--spike",
+        dest="spike",
+        help="also keep days when at least this fraction of entities die.",
+        type=float,
+        default=None,
+    )
+    ensemble.add_argument(
+        "--track",
+        dest="track",
+        help="follow a random sample of this many entities of each species for life.",
+        type=int,
+        default=0,
+    )
+    ensemble.add_argument(
+        "--aggregate",
+        dest="aggregate",
+        help="keep only the outcome of each run (no days or entities).",
+        default=False,
+        action="store_true",
+    )
+
+    results = subparsers.add_parser(
+        "results", help="query and summarize a results database"
+    )
+    results.add_argument(
+        "--run",
+        dest="run",
+        help="show the per day metrics for a run (by id).",
+        type=int,
+        default=None,
+    )
+    results.add_argument(
+        "--entities",
+        dest="entities",
+        help="with --run, show the tracked entities instead of the days.",
+        default=False,
+        action="store_true",
+    )
+    results.add_argument(
+        "--list",
+        dest="list_runs",
+        help="list runs, with parameters and final outcomes.",
+        default=False,
+        action="store_true",
+    )
+
+    surrogate = subparsers.add_parser(
+        "surrogate",
+        help="fit a mean field surrogate from a results database, or forecast with it",
+    )
+    surrogate.add_argument(
+        "--model",
+        dest="model",
+        help="the json file to save (or load) the fitted model.",
+        default="dinolemma-surrogate.json",
+    )
+    surrogate.add_argument(
+        "--holdout",
+        dest="holdout",
+        help="the fraction of runs held out to report the error.",
+        type=float,
+        default=0.2,
+    )
+    surrogate.add_argument(
+        "--forecast",
+        dest="forecast",
+        help="forecast counts with a fitted model (instead of fitting).",
+        default=False,
+        action="store_true",
+    )
+    surrogate.add_argument(
+        "--days",
+        dest="days",
+        help="the number of days to forecast.",
+        type=int,
+        default=365,
+    )
+    surrogate.add_argument(
+        "--season",
+        dest="season",
+        help="the season on the first day of the forecast.",
+        choices=["summer", "fall", "winter", "spring"],
+        default="summer",
+    )
+    surrogate.add_argument(
+        "--ndinos",
+        dest="ndinos",
+        help="the number of dinosaurs at the start of the forecast.",
+        type=int,
+        default=10,
+    )
+    surrogate.add_argument(
+        "--ntrees",
+        dest="ntrees",
+        help="the number of avocado trees at the start of the forecast.",
+        type=int,
+        default=10,
+    )
+    surrogate.add_argument(
+        "--grid_size",
+        dest="grid_size",
+        help="the size of the square grid, in units (one dimension).",
+        type=int,
+        default=25,
+    )
+
+    run.add_argument(
+        "--days",
+        dest="days",
+        help="the number of days to simulate.",
+        type=int,
+        default=100,
+    )
+    run.add_argument(
+        "--delay",
+        dest="delay",
+        help="seconds to sleep between days (default 1, or 0 with --progress).",
+        type=float,
+        default=None,
+    )
+    run.add_argument(
+        "--fast-forward",
+        dest="fast_forward",
+        help="run days without delay, in bulk while no interactions are possible.",
+        default=False,
+        action="store_true",
+    )
+    run.add_argument(
+        "--foraging",
+        dest="foraging",
+        help="hungry dinosaurs step toward the nearest tree with avocados.",
+        default=False,
+        action="store_true",
+    )
+    run.add_argument(
+        "--synchronous",
+        dest="synchronous",
+        help="every entity acts at once each day (independent of turn order).",
+        default=False,
+        action="store_true",
+    )
+    run.add_argument(
+        "--threads",
+        dest="threads",
+        help="threads for array updates (fast forward and synchronous days).",
+        type=int,
+        default=1,
+    )
+    run.add_argument(
+        "--quiet",
+        dest="quiet",
+        help="don't print each day (printing is much of the cost of a run).",
+        default=False,
+        action="store_true",
+    )
+    run.add_argument(
+        "--metrics-port",
+        dest="metrics_port",
+        help="serve Prometheus style metrics on this port (localhost).",
+        type=int,
+        default=None,
+    )
+    run.add_argument(
+        "--metrics-file",
+        dest="metrics_file",
+        help="periodically rewrite Prometheus style metrics to this file.",
+        default=None,
+    )
+
+    bench = subparsers.add_parser(
+        "bench", help="run seeded benchmarks, and save or compare to a baseline"
+    )
+    bench.add_argument(
+        "--compare",
+        dest="compare",
+        help="compare to a baseline, and exit non-zero on a regression.",
+        default=False,
+        action="store_true",
+    )
+    bench.add_argument(
+        "--baseline",
+        dest="baseline",
+        help="the version to compare to (defaults to the latest on this machine).",
+        default=None,
+    )
+    bench.add_argument(
+        "--save",
+        dest="save",
+        help="with --compare, also save the results as the current version.",
+        default=False,
+        action="store_true",
+    )
+    bench.add_argument(
+        "--file",
+        dest="file",
+        help="the json file of baselines.",
+        default="dinolemma-bench.json",
+    )
+    bench.add_argument(
+        "--repeats",
+        dest="repeats",
+        help="the number of timed repeats of each benchmark.",
+        type=int,
+        default=7,
+    )
+    bench.add_argument(
+        "--threshold",
+        dest="threshold",
+        help="the slowdown (fraction, beyond noise) that is a regression, for "
+        "benchmarks without their own threshold.",
+        type=float,
+        default=0.1,
+    )
+    bench.add_argument(
+        "--only",
+        dest="only",
+        help="only run benchmarks starting with this name (e.g., run_day).",
+        default=None,
+    )
+
+    serve = subparsers.add_parser(
+        "serve", help="serve simulation sessions over http on localhost"
+    )
+    serve.add_argument(
+        "--port", dest="port", help="the port to serve on.", type=int, default=8080
+    )
+    serve.add_argument(
+        "--workers",
+        dest="workers",
+        help="the number of worker processes to pin sessions to.",
+        type=int,
+        default=4,
+    )
+    serve.add_argument(
+        "--idle",
+        dest="idle",
+        help="seconds before an idle session is evicted to a checkpoint.",
+        type=int,
+        default=300,
+    )
+    serve.add_argument(
+        "--checkpoints",
+        dest="checkpoints",
+        help="the directory for checkpoints of idle sessions.",
+        default=None,
+    )
+
+    for command in [run, ensemble]:
+        command.add_argument(
+            "--progress",
+            dest="progress",
+            help="report throughput and time remaining (to stderr) every N seconds.",
+            type=float,
+            default=None,
+            metavar="N",
+        )
+
+    for command in [ensemble, results, surrogate]:
+        command.add_argument(
+            "--db",
+            dest="db",
+            help="the sqlite database for results.",
+            default="dinolemma-results.db",
+        )
+
+    for command in [run, gui, render, ensemble]:
         command.add_argument(
             "--ndinos",
             dest="ndinos",
@@ -65,6 +413,14 @@ def get_parser():
             default=25,
         )
 
+        command.add_argument(
+            "--seed",
+            dest="seed",
+            help="a seed for reproducible (counter based) random streams.",
+            type=int,
+            default=None,
+        )
+
     return parser
 
 
@@ -79,23 +435,209 @@ def main():
 
     # Show the version and exit
     if args.version:
-        print(dinolemma.__version__)
+        from dinolemma.version import __version__
+
+        print(__version__)
         sys.exit(0)
 
+    # A world that entities can't be placed on is a usage error
+    from dinolemma.errors import PlacementError
+
+    try:
+        run_command(args, parser)
+    except PlacementError as exc:
+        sys.exit(str(exc))
+
+
+def run_command(args, parser):
+    """run the subcommand (args.command) of the client
+    """
+
     # Run text based simulation
     if args.command == "run":
+        from dinolemma.game import DinosaurDilemma
+
+        metrics = None
+        if args.metrics_port or args.metrics_file:
+            from dinolemma.metrics import Metrics, MetricsServer, TextfileExporter
+
+            metrics = Metrics()
+            if args.metrics_port:
+                MetricsServer(metrics, port=args.metrics_port).start()
+            if args.metrics_file:
+                metrics.exporters.append(TextfileExporter(args.metrics_file))
+
         simulation = DinosaurDilemma(
-            grid_size=args.grid_size, number_trees=args.ntrees, number_dinos=args.ndinos
+            grid_size=args.grid_size,
+            number_trees=args.ntrees,
+            number_dinos=args.ndinos,
+            seed=args.seed,
+            metrics=metrics,
+            foraging=args.foraging,
+            synchronous=args.synchronous,
+            threads=args.threads,
+            quiet=args.quiet,
         )
-        simulation.run()
+        progress = None
+        if args.progress:
+            from dinolemma.progress import Progress
+
+            progress = Progress(args.days, interval=args.progress)
+
+        # With progress reports, days are not slowed down by default
+        delay = args.delay
+        if delay is None:
+            delay = 0 if args.progress else 1
+
+        if args.fast_forward:
+            simulation.advance(days=args.days, progress=progress)
+        else:
+            simulation.run(days=args.days, delay=delay, progress=progress)
+        if progress is not None:
+            progress.close()
 
     # Run graphical simulation
     elif args.command == "gui":
         from dinolemma.gui import run_game
 
         run_game(
-            grid_dim=args.grid_size, number_trees=args.ntrees, number_dinos=args.ndinos
+            grid_size=args.grid_size,
+            number_trees=args.ntrees,
+            number_dinos=args.ndinos,
+            seed=args.seed,
+        )
+
+    # Export frames without a display
+    elif args.command == "render":
+        from dinolemma.game import DinosaurDilemma
+        from dinolemma.render import record_frames, export_frames
+
+        simulation = DinosaurDilemma(
+            grid_size=args.grid_size,
+            number_trees=args.ntrees,
+            number_dinos=args.ndinos,
+            seed=args.seed,
         )
+        frames = record_frames(simulation, days=args.days, every=args.every)
+        paths = export_frames(
+            frames,
+            args.outdir,
+            cell_size=args.cell_size,
+            gif=args.gif,
+            workers=args.workers,
+        )
+        print("Wrote %s frames to %s" % (len(paths), args.outdir))
+
+    # Run an ensemble of simulations, writing to a results store
+    elif args.command == "ensemble":
+        from dinolemma.recording import Spike
+        from dinolemma.results import run_ensemble
+
+        recording = {
+            "every": args.every,
+            "budget": args.budget,
+            "triggers": [Spike(fraction=args.spike)] if args.spike else [],
+            "track": args.track,
+            "aggregate": args.aggregate,
+        }
+
+        progress = None
+        if args.progress:
+            from dinolemma.progress import Progress
+
+            progress = Progress(args.runs, unit="runs", interval=args.progress)
+
+        run_ids = run_ensemble(
+            args.db,
+            runs=args.runs,
+            days=args.days,
+            seed=args.seed,
+            workers=args.workers,
+            grid_size=args.grid_size,
+            number_trees=args.ntrees,
+            number_dinos=args.ndinos,
+            progress=progress,
+            recording=recording,
+        )
+        if progress is not None:
+            progress.close()
+        print("Wrote %s runs to %s" % (len(run_ids), args.db))
+
+    # Query and summarize a results store
+    elif args.command == "results":
+        from dinolemma.results import ResultsStore
+
+        store = ResultsStore(args.db)
+        if args.run is not None and args.entities:
+            rows = store.entities(args.run)
+        elif args.run is not None:
+            rows = store.days(args.run)
+        elif args.list_runs:
+            rows = store.runs()
+        else:
+            rows = [store.summary()]
+        for row in rows:
+            print(" ".join("%s=%s" % (key, value) for key, value in row.items()))
+        store.close()
+
+    # Fit a surrogate model from a results store, or forecast with one
+    elif args.command == "surrogate":
+        from dinolemma.surrogate import MeanFieldModel, fit_store
+
+        if args.forecast:
+            model = MeanFieldModel.load(args.model)
+            dinosaurs, trees = model.forecast(
+                args.ndinos,
+                args.ntrees,
+                days=args.days,
+                season=args.season,
+                grid_size=args.grid_size,
+            )
+            for day in range(0, args.days, max(1, args.days // 20)):
+                print(
+                    "day=%s dinosaurs=%.1f trees=%.1f"
+                    % (day + 1, dinosaurs[day], trees[day])
+                )
+        else:
+            model, report = fit_store(args.db, holdout=args.holdout)
+            model.save(args.model)
+            print(" ".join("%s=%s" % (key, value) for key, value in report.items()))
+            print("Wrote model to %s" % args.model)
+
+    # Run benchmarks, saving or comparing to a baseline
+    elif args.command == "bench":
+        from dinolemma.bench import BaselineStore, run_benchmarks, compare, print_report
+        from dinolemma.version import __version__
+
+        store = BaselineStore(args.file)
+        version, baseline = store.get(args.baseline) if args.compare else (None, None)
+        if args.compare and baseline is None:
+            sys.exit("There is no baseline to compare to in %s" % args.file)
+
+        results = run_benchmarks(repeats=args.repeats, only=args.only)
+        if not args.compare or args.save:
+            store.save(__version__, results)
+            print("Saved results for %s to %s" % (__version__, args.file))
+        if not args.compare:
+            print_report(compare({}, results))
+            sys.exit(0)
+
+        print("Comparing %s to baseline %s" % (__version__, version))
+        rows = compare(baseline, results, threshold=args.threshold)
+        print_report(rows)
+        if any(row["status"] == "REGRESSION" for row in rows):
+            sys.exit(1)
+
+    # Serve simulation sessions
+    elif args.command == "serve":
+        from dinolemma.server import SimulationServer
+
+        SimulationServer(
+            port=args.port,
+            workers=args.workers,
+            checkpoints=args.checkpoints,
+            idle=args.idle,
+        ).serve_forever()
 
     else:
         parser.print_help()
@@ -9,40 +9,65 @@ with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
 """
 
 
+from dinolemma.colors import PURPLE
 from dinolemma.interactions import dinosaurXdinosaur, dinosaurXavocado
-from dinolemma.entity import Group, Entity
+from dinolemma.entity import Group, Entity, PERCENT
+from dinolemma.species import register, DINOSAUR, TREE
+from dinolemma.environment import Environment
 from dinolemma.namer import GenericNamer
+from enum import IntEnum
 import random
 import numpy
 
 
+class Gender(IntEnum):
+    """A dinosaur gender is a small integer (shared by all dinosaurs)
+    """
+
+    MALE = 0
+    FEMALE = 1
+    HYBRID = 2
+
+
 class Dinosaur(Entity):
-    def __init__(self, name, can_move=True):
-        super().__init__(name=name, can_move=can_move)
+
+    __slots__ = (
+        "size",
+        "hunger",
+        "dead",
+        "gender",
+        "freezing_point",
+        "boiling_point",
+        "probability_fight",
+        "probability_reproduce",
+    )
+
+    # Interactions for dinosaur finding an AvocadoTree/Dinosaur
+    _interactions = {TREE: dinosaurXavocado, DINOSAUR: dinosaurXdinosaur}
+    tracked = ("hunger", "size")
+
+    def reset(self, name, uid=None, rng=random):
+        super().reset(name, uid=uid, rng=rng)
 
         # Baby dinosaurs don't exist, they just get large enough
-        self.size = random.choice(range(100)) * 0.01
+        self.size = rng.choice(PERCENT)
 
         # 0 is satiated (no hunger), 1 is dead
-        self.hunger = random.choice(range(80, 100)) * 0.01
+        self.hunger = rng.choice(PERCENT[80:])
         self.dead = False
 
         # A hybrid dinosaur (rare) can reproduce without a mate
-        self.gender = numpy.random.choice(
-            ["male", "female", "hybrid"], p=[0.48, 0.48, 0.04]
-        )
+        self.gender = rng.choices(
+            [Gender.MALE, Gender.FEMALE, Gender.HYBRID], weights=[0.48, 0.48, 0.04]
+        )[0]
 
         # At this temperature, there is a 50% chance of freezing or boiling
-        self.freezing_point = random.choice(range(-20, 5))
-        self.boiling_point = random.choice(range(85, 500))
+        self.freezing_point = rng.choice(range(-20, 5))
+        self.boiling_point = rng.choice(range(85, 500))
 
         # Probabilities are different per dinosaur
-        self.probability_fight = random.choice(range(0, 100)) * 0.01
-        self.probability_reproduce = random.choice(range(0, 100)) * 0.01
-
-        # Add interactions for dinosaur finding an AvocadoTree/Dinosaur
-        self._interactions["AvocadoTree"] = dinosaurXavocado
-        self._interactions["Dinosaur"] = dinosaurXdinosaur
+        self.probability_fight = rng.choice(PERCENT)
+        self.probability_reproduce = rng.choice(PERCENT)
 
     def stats(self):
         """Return stats for a dinosaur, primarily the size and hunger
@@ -50,13 +75,25 @@ class Dinosaur(Entity):
         stats = {"hunger": self.hunger, "size": self.size}
         return stats
 
+    @property
+    def is_hybrid(self):
+        """A hybrid dinosaur can reproduce without a mate
+        """
+        return self.gender == Gender.HYBRID
+
     @property
     def is_aggressive(self):
         """Regardless of size, a starving dinosaur is aggressive
         """
         return self.hunger > 0.9
 
-    def reproduce(self, **kwargs):
+    @property
+    def is_hungry(self):
+        """A hungry dinosaur goes looking for food (when foraging)
+        """
+        return self.hunger >= 0.5
+
+    def reproduce(self, rng=random, **kwargs):
         """If a dinosaur is a hybrid, it can reproduce on it's own. Otherwise,
            it requires another dinosaur.
         """
@@ -68,17 +105,13 @@ class Dinosaur(Entity):
             prob_reproduce = (
                 self.probability_reproduce + entity.probability_reproduce
             ) / 2
-            return numpy.random.choice(
-                [self.gender != "hybrid" and self.gender != entity.gender, False],
-                p=[prob_reproduce, 1 - prob_reproduce],
-            )
+            if rng.random() < prob_reproduce:
+                return not self.is_hybrid and self.gender != entity.gender
+            return False
 
         # Case 2: Only a hybrid can reproduce
-        if self.gender == "hybrid":
-            return numpy.random.choice(
-                [True, False],
-                p=[self.probability_reproduce, 1 - self.probability_reproduce],
-            )
+        if self.is_hybrid:
+            return rng.random() < self.probability_reproduce
         return False
 
     @property
@@ -103,23 +136,23 @@ class Dinosaur(Entity):
         """
         return self.hunger >= 1 or self.dead
 
-    def change(self, **kwargs):
-        """The change function should accept any number of variables from
-           the environment, and the entity is free to use them as needed.
-           If no change function is subclassed, the entity does not change
+    def change(self, rng=random, environment=None, **kwargs):
+        """The change function is given the environment for the day (or any
+           number of variables from it), and the entity is free to use them as
+           needed. If no change function is subclassed, the entity does not change
         """
-        # We should have all arguments, but good to be careful
-        temperature = kwargs.get("temperature", 55)
-        humidity = kwargs.get("humidity", 0.5)
+        # We should have an environment, but good to be careful
+        environment = environment or Environment.create(**kwargs)
+        temperature = environment.temperature
 
         # Larger dinosaurs get hungrier faster
         self.hunger = max(0, self.hunger + numpy.power(self.size, 10))
 
         # Dinosaurs can freeze to death (under 10 degrees) or boil
         if temperature <= self.freezing_point:
-            self.dead = random.choice([True, False])
+            self.dead = rng.choice([True, False])
         elif temperature >= self.boiling_point:
-            self.dead = random.choice([True, False])
+            self.dead = rng.choice([True, False])
 
         if not self.is_dead:
 
@@ -151,17 +184,22 @@ class DinosaurNamer(GenericNamer):
     def __repr__(self):
         return self.__str__()
 
-    def generate(self, delim="-"):
-        prefix = self._generate(delim)
-        suffix = self.select(self.suffix)
+    def generate(self, delim="-", rng=random):
+        prefix = self._generate(delim, rng=rng)
+        suffix = self.select(self.suffix, rng=rng)
         return "%s%s" % (prefix, suffix)
 
 
+@register(DINOSAUR, Dinosaur, name="dinosaur", color=PURPLE, capabilities=["move"])
 class Dinosaurs(Group):
     """A group of dinosaurs
     """
 
-    def __init__(self, number=None):
+    def __init__(self, number=None, **kwargs):
         super().__init__(
-            name="dinosaurs", number=number, Entity=Dinosaur, namer=DinosaurNamer
+            name="dinosaurs",
+            number=number,
+            Entity=Dinosaur,
+            namer=DinosaurNamer,
+            **kwargs
         )
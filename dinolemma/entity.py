@@ -9,18 +9,49 @@ with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
 """
 
 from dinolemma.namer import GenericNamer
+from itertools import count
 import random
 
+# Interned percentages (0.00 to 0.99), so that entities initialized from the
+# same percentage share a float object instead of each holding their own
+PERCENT = tuple(x * 0.01 for x in range(100))
+
 
 class Entity:
     """An Entity is a base class for a living thing in the world. An entity
-       that can move is allowed to change location on the grid.
+       that can move is allowed to change location on the grid. Entities
+       use __slots__ (a subclass should declare its own attributes there)
+       so that an instance does not carry a __dict__. The uid is a unique
+       integer (within a simulation) that keys the random stream of the entity.
     """
 
-    def __init__(self, name, can_move=True):
-        self.name = name
+    __slots__ = ("name", "can_move", "uid", "x", "y")
+
+    # Interactions are shared by all instances of a class, keyed by the code
+    # of the second entity (see dinolemma.species), with the function as value
+    _interactions = {}
+
+    # The species code, set when the species is registered
+    code = None
+
+    # Numeric attributes with streaming statistics kept by the simulation
+    tracked = ()
+
+    def __init__(self, name, can_move=True, uid=None, rng=random):
         self.can_move = can_move
-        self._interactions = {}
+        self.reset(name, uid=uid, rng=rng)
+
+    def reset(self, name, uid=None, rng=random):
+        """(Re)initialize the entity with a name and uid, drawing any random
+           attributes from rng. A subclass should extend reset (and not
+           __init__) so that a pooled entity can be reused for a new one.
+           The entity is not on the grid until it is placed.
+        """
+        self.name = name
+        self.uid = uid
+        for attribute in ["x", "y"]:
+            if hasattr(self, attribute):
+                delattr(self, attribute)
 
     def __str__(self):
         return "[%s: %s]" % (self.type, self.name)
@@ -31,8 +62,10 @@ class Entity:
         self.x = x
         self.y = y
 
-    def interact(self, entity):
+    def interact(self, entity, rng=random, quiet=False):
         """Given a second entity, based on its type, interact with it.
+           Any random choices are drawn from rng (the moving entity's stream),
+           and the interaction prints nothing if quiet.
         """
         outcomes = {}
 
@@ -40,24 +73,26 @@ class Entity:
         if not entity:
             return outcomes
 
-        # Is the entity type supported as an interaction?
-        if entity.type in self._interactions:
+        # Is the entity species supported as an interaction?
+        interaction = self._interactions.get(entity.code)
+        if interaction is not None:
 
             # The interaction function expects the moving entity as first argument
             # A dictionary of outcomes should be returned
-            outcomes = self._interactions[entity.type](self, entity)
+            outcomes = interaction(self, entity, rng, quiet=quiet)
         return outcomes
 
-    def reproduce(self, **kwargs):
+    def reproduce(self, rng=random, **kwargs):
         """By default, an entity will not reproduce (this function returns false)
            however the subclass should instantiate the function to have a custom
            reproductive behavior
         """
         return False
 
-    def change(self, **kwargs):
-        """The change function should accept any number of variables from
-           the environment, and the entity is free to use them as needed.
+    def change(self, rng=random, environment=None, **kwargs):
+        """The change function is given the environment for the day (see
+           dinolemma.environment.Environment) or any number of variables from
+           it, and the entity is free to use them as needed.
            If no change function is subclassed, the entity does not change
         """
         pass
@@ -88,32 +123,63 @@ class Group:
     """A group is a generic base class to hold a group of entities.
        An implementing subclass should add a name (e.g., dinosaurs) along
        with a class of entity to implement (e.g., Dinosaur). Custom functions 
-       for interaction based on the names of other groups.
+       for interaction based on the names of other groups. Random choices
+       are drawn from rng, and entity uids from ids (a shared counter, so
+       that uids are unique across the groups of a simulation). Names are
+       recorded in names (a shared dictionary of name to species code) so
+       they are unique across groups too. Removed entities are kept in a
+       pool (of up to pool_size) and reset to create new ones, so births
+       and deaths don't allocate.
     """
 
-    def __init__(self, name, Entity, number=None, namer=None):
-        number = number or random.choice(range(15))
+    # The species code, set when the species is registered
+    code = None
+
+    def __init__(
+        self,
+        name,
+        Entity,
+        number=None,
+        namer=None,
+        rng=random,
+        ids=None,
+        names=None,
+        pool_size=1024,
+    ):
+        number = number or rng.choice(range(15))
         self.entities = {}
+        self.pool = []
+        self.pool_size = pool_size
         namer = namer or GenericNamer
         self.namer = namer()
         self.name = name
         self.Entity = Entity
+        self.ids = ids or count()
+        self.names = names if names is not None else {}
 
-        names = []
         for _ in range(number):
-            name = self.namer.generate()
+            name = self.namer.generate(rng=rng)
 
             # Keep generating name until we get a unique one
-            while name in names:
-                name = self.namer.generate()
+            while name in self.names:
+                name = self.namer.generate(rng=rng)
 
-            names.append(name)
-            self.entities[name] = Entity(name)
+            self.names[name] = self.code
+            self.entities[name] = Entity(name, uid=next(self.ids), rng=rng)
 
-    def new(self, **kwargs):
-        """Create a new entity"""
-        name = self.namer.generate()
-        entity = self.Entity(name, **kwargs)
+    def new(self, rng=random, **kwargs):
+        """Create a new entity (with a unique name), reusing one from the
+           pool if there is one. Either way, the same draws are made.
+        """
+        name = self.namer.generate(rng=rng)
+        while name in self.names:
+            name = self.namer.generate(rng=rng)
+        self.names[name] = self.code
+        if self.pool and not kwargs:
+            entity = self.pool.pop()
+            entity.reset(name, uid=next(self.ids), rng=rng)
+        else:
+            entity = self.Entity(name, uid=next(self.ids), rng=rng, **kwargs)
         self.entities[name] = entity
         return entity
 
@@ -137,14 +203,24 @@ class Group:
             return self.entities[key]
 
     def __delitem__(self, key):
-        del self.entities[key]
+        entity = self.entities.pop(key)
+        self.names.pop(key, None)
+        if len(self.pool) < self.pool_size:
+            self.pool.append(entity)
 
     def __iter__(self, randomize=True):
         """iterator over entities. By default, we randomize the order
         """
-        entities = list(self.entities.keys())
         if randomize:
-            random.shuffle(entities)
+            return self.shuffled()
+        return iter(list(self.entities.values()))
+
+    def shuffled(self, rng=None):
+        """iterate over entities in an order shuffled with rng (the random
+           module by default)
+        """
+        entities = list(self.entities.keys())
+        (rng or random).shuffle(entities)
         for name in entities:
             # For the chance that the iterator was created before removing
             if name in self.entities:
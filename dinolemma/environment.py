@@ -0,0 +1,57 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+from collections import namedtuple
+
+
+class Environment(
+    namedtuple(
+        "Environment",
+        [
+            "humidity",
+            "temperature",
+            "season",
+            "days_in_season",
+            "days_left_season",
+            "dinosaurs",
+            "trees",
+        ],
+    )
+):
+    """The Environment is an immutable snapshot of the climate for a day,
+       created once per day (in newday) and handed to each entity to change.
+       The number of dinosaurs and trees are read from the groups (dinosaurs
+       and trees) when asked for, so they are always current.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def create(cls, humidity=0.5, temperature=55, season=None, **kwargs):
+        """Create an environment from keyword arguments (as returned by
+           DinosaurDilemma.get_environment), with defaults for the climate.
+        """
+        return cls(
+            humidity,
+            temperature,
+            season,
+            kwargs.get("days_in_season"),
+            kwargs.get("days_left_season"),
+            None,
+            None,
+        )
+
+    @property
+    def number_dinos(self):
+        return self.dinosaurs.count if self.dinosaurs is not None else None
+
+    @property
+    def number_trees(self):
+        return self.trees.count if self.trees is not None else None
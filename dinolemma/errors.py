@@ -0,0 +1,17 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+# Errors are kept apart from the modules that raise them (and numpy), so
+# the client can catch them without importing the simulation
+
+
+class PlacementError(ValueError):
+    """Raised when entities can't be placed (e.g., the grid is too small)
+    """
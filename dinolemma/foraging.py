@@ -0,0 +1,160 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+from itertools import chain
+import numpy
+
+# The distance of a cell when there are no sources
+FAR = 2 ** 30
+
+
+class DistanceField:
+    """A DistanceField holds, for every cell of the grid, the number of moves
+       to the nearest source (e.g., a tree with avocados) and which source
+       that is. It is computed from all sources at once by sweeping rows
+       forward and back (and then columns), each a single array operation,
+       which gives the same distances as a breadth first search when moves
+       are between adjacent cells. When a source is added or removed only
+       the cells around it that could change are updated: the window around
+       the source grows until its edge is unaffected, and only the window is
+       swept again.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.distance = numpy.full((size, size), FAR, dtype=numpy.int32)
+        self.owner = numpy.full((size, size), -1, dtype=numpy.int64)
+        self.sources = {}
+
+    def __str__(self):
+        return "[distance-field:%s sources]" % len(self.sources)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __contains__(self, uid):
+        return uid in self.sources
+
+    def build(self, sources):
+        """Compute the field from scratch, for sources (uid to x, y)
+        """
+        self.sources = dict(sources)
+        self.distance[:] = FAR
+        self.owner[:] = -1
+        for uid, (x, y) in self.sources.items():
+            self.distance[x, y] = 0
+            self.owner[x, y] = uid
+        self._spread(0, self.size, 0, self.size)
+
+    def _spread(self, x0, x1, y0, y1):
+        """Sweep a window, so each cell has the least distance through its
+           neighbors (rows forward and back, then columns)
+        """
+        for distance, owner in [
+            (self.distance[x0:x1, y0:y1], self.owner[x0:x1, y0:y1]),
+            (self.distance[x0:x1, y0:y1].T, self.owner[x0:x1, y0:y1].T),
+        ]:
+            rows = len(distance)
+            for previous, row in chain(
+                zip(range(rows - 1), range(1, rows)),
+                zip(range(rows - 1, 0, -1), range(rows - 2, -1, -1)),
+            ):
+                nearer = distance[previous] + 1 < distance[row]
+                numpy.copyto(distance[row], distance[previous] + 1, where=nearer)
+                numpy.copyto(owner[row], owner[previous], where=nearer)
+
+    def _window(self, x, y, radius):
+        return (
+            max(0, x - radius),
+            min(self.size, x + radius + 1),
+            max(0, y - radius),
+            min(self.size, y + radius + 1),
+        )
+
+    def _grow(self, x, y, affected):
+        """Return the smallest window around x, y (doubling the radius) with
+           no cells on its edge for which affected (a function of the window
+           bounds, returning a mask) is True, unless it is the whole grid.
+        """
+        radius = 8
+        while True:
+            x0, x1, y0, y1 = self._window(x, y, radius)
+            mask = affected(x0, x1, y0, y1)
+            edge = numpy.zeros(mask.shape, dtype=bool)
+            if x0 > 0:
+                edge[0] = True
+            if x1 < self.size:
+                edge[-1] = True
+            if y0 > 0:
+                edge[:, 0] = True
+            if y1 < self.size:
+                edge[:, -1] = True
+            if not (mask & edge).any():
+                return (x0, x1, y0, y1), mask
+            radius *= 2
+
+    def add(self, uid, x, y):
+        """Add a source, updating the cells that are now nearer to it
+        """
+        if uid in self.sources:
+            return
+        self.sources[uid] = (x, y)
+
+        def nearer(x0, x1, y0, y1):
+            xs = numpy.abs(numpy.arange(x0, x1) - x)[:, None]
+            ys = numpy.abs(numpy.arange(y0, y1) - y)[None, :]
+            return xs + ys < self.distance[x0:x1, y0:y1]
+
+        (x0, x1, y0, y1), mask = self._grow(x, y, nearer)
+        xs = numpy.abs(numpy.arange(x0, x1) - x)[:, None]
+        ys = numpy.abs(numpy.arange(y0, y1) - y)[None, :]
+        self.distance[x0:x1, y0:y1][mask] = (xs + ys)[mask]
+        self.owner[x0:x1, y0:y1][mask] = uid
+
+    def remove(self, uid):
+        """Remove a source, and recompute the cells it was nearest to from
+           the cells around them
+        """
+        if uid not in self.sources:
+            return
+        x, y = self.sources.pop(uid)
+
+        def owned(x0, x1, y0, y1):
+            return self.owner[x0:x1, y0:y1] == uid
+
+        (x0, x1, y0, y1), mask = self._grow(x, y, owned)
+        self.distance[x0:x1, y0:y1][mask] = FAR
+        self.owner[x0:x1, y0:y1][mask] = -1
+
+        # Sweep the cells it was nearest to, and the cells around them
+        rows = numpy.flatnonzero(mask.any(axis=1))
+        columns = numpy.flatnonzero(mask.any(axis=0))
+        self._spread(
+            max(0, x0 + rows[0] - 1),
+            min(self.size, x0 + rows[-1] + 2),
+            max(0, y0 + columns[0] - 1),
+            min(self.size, y0 + columns[-1] + 2),
+        )
+
+    def toward(self, x, y, coords):
+        """Given a location and the open coordinates around it, return the
+           coordinates that step toward the nearest source. Next to a source
+           (or on it) there is no need to move, so none are returned. If no
+           step gets nearer (there are no sources, or the way is blocked)
+           all coordinates are returned.
+        """
+        here = self.distance[x, y]
+        if here <= 1:
+            return []
+        distances = [self.distance[cx, cy] for cx, cy in coords]
+        best = min(distances, default=FAR)
+        if best >= here:
+            return coords
+        return [coord for coord, d in zip(coords, distances) if d == best]
@@ -8,20 +8,63 @@ with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 """
 
+from contextlib import contextmanager
 from itertools import chain
-from dinolemma.dinosaurs import Dinosaurs
+from dinolemma.dinosaurs import Dinosaurs, Gender
 from dinolemma.avocados import AvocadoTrees
+from dinolemma.environment import Environment
+from dinolemma.foraging import DistanceField
+from dinolemma.errors import PlacementError
+from dinolemma.placement import Placement
+from dinolemma.rng import RandomStreams, uniforms
+from dinolemma.spatial import SpatialIndex
+from dinolemma.species import DINOSAUR, TREE, get_species
+from dinolemma.stats import PopulationStats
+from dinolemma.threads import KernelPool
+from itertools import count
+import gc
+import os
+import pickle
 import random
 import numpy
-import sys
 import time
 
+# Generation thresholds for the garbage collector during a run (see gc)
+GC_THRESHOLD = (50000, 20, 20)
+
+
+@contextmanager
+def collect_less(threshold=GC_THRESHOLD):
+    """Tune the garbage collector for a run: objects that exist at the start
+       (e.g., entities, names and modules) are frozen so collections don't
+       scan them, and collections happen less often. Entities don't make
+       reference cycles (and are pooled), so there is little for the
+       collector to find. The previous settings are restored after. If the
+       threshold is None, the collector is left alone.
+    """
+    if threshold is None:
+        yield
+        return
+    previous = gc.get_threshold()
+    gc.collect()
+    gc.freeze()
+    gc.set_threshold(*threshold)
+    try:
+        yield
+    finally:
+        gc.set_threshold(*previous)
+        gc.unfreeze()
+
 
 class DinosaurDilemma:
     """A dinosaur dilemma simulation contains basic variables to control
        the environment (season, climate) along with probabilities
        for events. Largely, if values are undefined, they are randomly
-       selected from within some range.
+       selected from within some range. If a seed is provided, all randomness
+       comes from counter based streams keyed by (seed, day, entity uid), so
+       a run is reproducible and does not depend on any global random state.
+       If quiet, nothing is printed as the simulation runs (the messages for
+       days and events are not even formatted, which is much of the cost).
     """
 
     def __init__(
@@ -35,34 +78,173 @@ class DinosaurDilemma:
         min_temperature=0,
         grid_size=25,
         verbose=False,
+        quiet=False,
+        seed=None,
+        metrics=None,
+        grid_file=None,
+        tile_size=64,
+        overwrite_grid=False,
+        placement=None,
+        species=None,
+        foraging=False,
+        synchronous=False,
+        threads=1,
     ):
+        # Random streams for the world and entities, day 0 is initialization
+        self.seed = seed
+        self.streams = RandomStreams(seed)
+        self.day = 0
+        self.rng = self.streams.world(self.day)
 
         # Start in a season to determine the weather
         self.days_in_season = days_in_season
-        self.season = random.choice(["summer", "spring", "winter", "fall"]) or season
+        self.season = self.rng.choice(["summer", "spring", "winter", "fall"]) or season
         self.min_temperature = min_temperature
         self.max_temperature = max_temperature
         self.days_left_season = (
-            random.choice(range(self.days_in_season)) or days_left_season
+            self.rng.choice(range(self.days_in_season)) or days_left_season
         )
 
-        # Simulation parameters
+        # Simulation parameters, the grid is in memory unless there is a file
         self.grid_size = grid_size
+        self.grid_file = grid_file
+        self.tile_size = tile_size
+        self.overwrite_grid = overwrite_grid
         self.verbose = verbose
+        self.quiet = quiet
+
+        # Array kernels (fast forward and synchronous days) run in chunks on
+        # a number of threads (see dinolemma.threads)
+        self.kernels = KernelPool(threads)
 
-        # Create a set of dinosaurs and avocado trees
-        self.dinosaurs = Dinosaurs(number_dinos)
-        self.trees = AvocadoTrees(number_trees)
+        # A synchronous day has array phases for dinosaurs and trees only
+        self.synchronous = synchronous
+        if synchronous and (species or foraging):
+            raise ValueError(
+                "A synchronous simulation only has dinosaurs and trees (moving at random)"
+            )
+
+        # Create a set of dinosaurs and avocado trees, and any other species
+        # (a number of each, by code), uids and names are shared
+        self._ids = count()
+        self.names = {}
+        self.dinosaurs = Dinosaurs(
+            number_dinos, rng=self.rng, ids=self._ids, names=self.names
+        )
+        self.trees = AvocadoTrees(
+            number_trees, rng=self.rng, ids=self._ids, names=self.names
+        )
+
+        # Groups by species code, in the order they take turns
+        self.groups = {DINOSAUR: self.dinosaurs, TREE: self.trees}
+        for code, number in (species or {}).items():
+            self.groups[code] = get_species(code).Group(
+                number, rng=self.rng, ids=self._ids, names=self.names
+            )
+
+        # Births requested during a day are queued, and resolved at the end
+        self.births = []
+
+        # Cumulative event counts, timings (seconds) of the last day's phases,
+        # and optional metrics (dinolemma.metrics.Metrics) updated each day
+        self.counts = {"births": 0, "deaths": 0, "fights": 0}
+        self.timings = {}
+        self.metrics = metrics
 
         # Initialize the grid, place dinos and others on it
-        self._init_grid()
+        self.food = None
+        self._init_grid(placement)
+
+        # When foraging, hungry dinosaurs follow a distance field to food
+        if foraging:
+            self.food = DistanceField(self.grid_size)
+            self.food.build(
+                {
+                    entity.uid: (entity.x, entity.y)
+                    for group in self.groups.values()
+                    for entity in group.entities.values()
+                    if getattr(entity, "has_food", False)
+                }
+            )
+
+        # Streaming statistics, updated as entities change, are born and die
+        self.population = PopulationStats()
+        for group in self.groups.values():
+            for entity in group.entities.values():
+                self.population.observe(entity)
 
         # Progress the first day to set temperature, etc.
         self.newday()
 
+    # Checkpoints
+
+    def __getstate__(self):
+        """Prepare the simulation to be pickled. The unseeded random stream
+           (the random module) and metrics are not saved, and the shared uid
+           counter is saved as the next uid.
+        """
+        state = self.__dict__.copy()
+        state["rng"] = self.rng if self.seed is not None else None
+        state["metrics"] = None
+        state["_ids"] = next(self._ids)
+        self._ids = count(state["_ids"])
+        for group in self.groups.values():
+            group.ids = self._ids
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault("quiet", False)
+        self.rng = self.rng or self.streams.world(self.day)
+        self._ids = count(state["_ids"])
+        for group in self.groups.values():
+            group.ids = self._ids
+
+    def save(self, path):
+        """Save a checkpoint of the simulation to a file (pickle)
+        """
+        with open(path, "wb") as filey:
+            pickle.dump(self, filey, protocol=pickle.HIGHEST_PROTOCOL)
+        return path
+
+    @classmethod
+    def load(cls, path, grid_file=None):
+        """Load a simulation from a checkpoint file. A world in a file (see
+           dinolemma.grid.MemmapGrid) is reopened where it was, or from
+           grid_file (e.g., if it was moved with the checkpoint).
+        """
+        with open(path, "rb") as filey:
+            simulation = pickle.load(filey)
+        if grid_file:
+            simulation.reopen_grid(grid_file)
+        elif getattr(simulation.grid, "data", True) is None:
+            raise FileNotFoundError(
+                "The world file %s is missing, pass grid_file" % simulation.grid.path
+            )
+        return simulation
+
+    def reopen_grid(self, grid_file):
+        """Reopen the world of the simulation from a file (a MemmapGrid of
+           the same size), rebuilding its codes from the entities
+        """
+        from dinolemma.grid import MemmapGrid
+
+        self.grid = MemmapGrid(
+            grid_file,
+            self.grid_size,
+            tile=self.tile_size,
+            dtype=self.grid.dtype,
+            entities=[
+                entity
+                for group in self.groups.values()
+                for entity in group.entities.values()
+            ],
+        )
+        self.grid_file = grid_file
+
     # Interactions
 
-    def interact(self, entity):
+    def interact(self, entity, rng=random):
         """Given an entity, find other entities around it (and have them interact).
            This is run during a simulation directly after an entity moves.
         """
@@ -70,11 +252,17 @@ class DinosaurDilemma:
 
         # Since the entity is the one moving, it is considered acting on the neighbor
         for neighbor in neighbors:
-            outcomes = entity.interact(neighbor)
+            outcomes = entity.interact(neighbor, rng=rng, quiet=self.quiet)
+            self.population.update(entity)
+            self.population.update(neighbor)
+            self.update_food(neighbor)
+
+            if "fight" in outcomes:
+                self.counts["fights"] += 1
 
             # Reproduction with the neighbor (only possible for dinosaurs)
             if "reproduce" in outcomes:
-                self.reproduce(entity)
+                self.reproduce(entity, rng=rng)
 
             # A dinosaur kills another dinosaur, or an avocado tree
             if "death" in outcomes:
@@ -88,16 +276,18 @@ class DinosaurDilemma:
            and list of entities.
         """
         name = entity.name
+        self.population.forget(entity)
+        self.counts["deaths"] += 1
 
-        # Remove from the grid, if added
+        # Remove from the grid (and spatial index, and food), if added
         if hasattr(entity, "x"):
             self.grid[entity.x, entity.y] = None
+            self.index.remove(entity)
+            if self.food is not None:
+                self.food.remove(entity.uid)
 
-        # Remove from the entities list
-        if name.endswith("tree"):
-            del self.trees[name]
-        else:
-            del self.dinosaurs[name]
+        # Remove from the entities of its group
+        del self.groups[entity.code][name]
 
     def get_neighbors(self, x, y):
         """Given an x and y coordinate, find all adjacent entities
@@ -105,51 +295,109 @@ class DinosaurDilemma:
         neighbors = []
         for coord in self.get_adjacent_coords(x, y):
             cx, cy = coord
-            if self.grid[cx, cy]:
+            name = self.grid[cx, cy]
 
-                name = self.grid[cx, cy]
-
-                # For each neighbor, currently if it ends in tree, it's a tree
-                if name.endswith("tree"):
-                    neighbors.append(self.trees[name])
-                else:
-                    neighbors.append(self.dinosaurs[name])
+            # Each neighbor is found in the group for its species code
+            if name:
+                neighbors.append(self.groups[self.names[name]].entities[name])
 
         return neighbors
 
-    def reproduce(self, parent):
+    def update_food(self, entity):
+        """When foraging, add an entity that has food (e.g., a tree with
+           avocados) to the food distance field, or remove it if it has none
+        """
+        if self.food is None:
+            return
+        has_food = getattr(entity, "has_food", False) and entity.on_grid
+        if has_food and entity.uid not in self.food:
+            self.food.add(entity.uid, entity.x, entity.y)
+        elif not has_food and entity.uid in self.food:
+            self.food.remove(entity.uid)
+
+    def nearest(self, entity, k=1, codes=None, where=None):
+        """Return the k nearest other entities to an entity as a list of
+           (distance, entity), optionally only of species codes and for which
+           where (a function of the other entity) is True. This is a query of
+           the spatial index (dinolemma.spatial), and does not scan entities.
+        """
+
+        def other(candidate):
+            return candidate is not entity and (where is None or where(candidate))
+
+        return self.index.nearest(entity.x, entity.y, k=k, codes=codes, where=other)
+
+    def reproduce(self, parent, rng=random):
         """Given that an entity reproduces (via interaction) or on its own,
-           this function generates the new entity (depending on the parent
-           type) and places it on the grid.
+           queue the birth with the parent's location and random stream.
+           Births are resolved at the end of the day (resolve_births) so
+           that an offspring is only created if there is space for it.
         """
-        if parent.name.endswith("tree"):
-            offspring = self.trees.new()
-        else:
-            offspring = self.dinosaurs.new()
+        self.births.append((parent, parent.x, parent.y, rng))
+
+    def resolve_births(self):
+        """Resolve the births queued during the day in one pass. Requests are
+           handled in order of parent uid (ties in the order requested), and
+           each claims a random open cell next to where the parent was. The
+           offspring (depending on the parent type) is only created if a cell
+           was claimed, and random choices (including the offspring attributes)
+           are drawn from the parent's stream. A parent that died later in
+           the day (e.g., in a fight) gives no birth. Returns the new offspring.
+        """
+        # Dead parents are dropped before any offspring is created, as a new
+        # entity can reuse a dead one (see Group.new)
+        births = [
+            birth
+            for birth in self.births
+            if self.groups[birth[0].code].entities.get(birth[0].name) is birth[0]
+        ]
+        births.sort(key=lambda birth: birth[0].uid)
+        self.births = []
+        born = []
 
-        # Place the new offspring on the board
-        coords = self.get_open_coords(parent.x, parent.y)
+        for parent, x, y, rng in births:
+            coords = self.get_open_coords(x, y)
 
-        # Cramped dinos can't reproduce
-        if coords:
-            x, y = random.choice(coords)
+            # Cramped dinos can't reproduce
+            if not coords:
+                if not self.quiet:
+                    print("%s is too cramped to reproduce!" % parent)
+                continue
+
+            x, y = rng.choice(coords)
+            offspring = self.groups[parent.code].new(rng=rng)
+
+            # Place the new offspring on the board (claiming the cell)
             self._move(offspring, x, y)
-            print("Joy! Welcome %s to the world at (%s,%s)" % (offspring, x, y))
-        else:
-            print("%s is too cramped to reproduce!" % parent)
-            self.remove(offspring)
+            self.population.observe(offspring)
+            self.counts["births"] += 1
+            if not self.quiet:
+                print("Joy! Welcome %s to the world at (%s,%s)" % (offspring, x, y))
+            born.append(offspring)
+        return born
 
-    def change(self, entity):
+    def change(self, entity, rng=random):
         """After moving, an entity can change depending on it's environment.
            Each entity should have a change function that accepts any or all
            current environment variables.
         """
-        entity.change(**self.get_environment())
+        entity.change(rng=rng, environment=self.environment)
+        self.population.update(entity)
+        self.update_food(entity)
+
+    def stats(self):
+        """Return streaming statistics for the population, by entity type
+           (e.g., Dinosaur) and tracked attribute (e.g., hunger). Each has the
+           count, mean, variance and std, a fixed bin histogram, and
+           approximate quantiles. These are maintained as entities change,
+           so getting them does not require a scan of the population.
+        """
+        return self.population.export()
 
     def summary(self, return_summary=False):
         """Print a summary of the season, day, and general weather for the 
            simulation. If return summary is True, instead return as text
-           for rendering elsewhere.
+           for rendering elsewhere. A quiet simulation prints nothing.
         """
         if return_summary:
             return (
@@ -165,6 +413,8 @@ class DinosaurDilemma:
                     self.humidity,
                 )
             )
+        if self.quiet:
+            return
 
         print(
             "There are %s days left in the %s season."
@@ -178,23 +428,85 @@ class DinosaurDilemma:
 
     # Grid and movement
 
-    def _init_grid(self):
+    def _init_grid(self, placement=None):
         """Initialize the grid, meaning creating it, ensuring it's large 
-           enough, and placing dinosaurs and avocado trees on it
+           enough, and placing dinosaurs and avocado trees on it. Cells are
+           sampled (see dinolemma.placement) so initialization scales with
+           the number of entities, not cells. A placement can give, by group
+           name (dinosaurs or trees), the coordinates of the group (an array
+           of x, y for each entity) or a density map (a grid_size x grid_size
+           array of weights) to sample them from.
+        """
+        placement = placement or {}
+
+        # We must have enough spots on the grid, should be 10 more (a grid in
+        # a file only lists its free cells a tile of cells at a time)
+        chunk = self.tile_size ** 2 if self.grid_file else None
+        engine = Placement(self.grid_size, rng=self.rng, chunk=chunk)
+        engine.reserve(sum(group.count for group in self.groups.values()))
+
+        # Entity positions are indexed for queries (see dinolemma.spatial)
+        self.index = SpatialIndex(self.grid_size)
+
+        # A grid in a file (dinolemma.grid.MemmapGrid) can be larger than memory.
+        # An existing world is only replaced with overwrite_grid, it is reopened
+        # with the entities on it (see load)
+        if self.grid_file:
+            from dinolemma.grid import MemmapGrid
+
+            if os.path.exists(self.grid_file) and not self.overwrite_grid:
+                raise FileExistsError(
+                    "%s exists: reopen its world from a checkpoint "
+                    "(DinosaurDilemma.load), or pass overwrite_grid=True"
+                    % self.grid_file
+                )
+            self.grid = MemmapGrid(
+                self.grid_file, self.grid_size, tile=self.tile_size, overwrite=True
+            )
+
+        # Otherwise initialize a grid for the simulation (empty is None)
+        else:
+            self.grid = numpy.empty(
+                shape=(self.grid_size, self.grid_size), dtype=object
+            )
+
+        # Allocate each a distinct location on the grid
+        for group in self.groups.values():
+            entities = list(group.entities.values())
+            where = placement.get(group.name)
+            if where is None:
+                cells = engine.sample(len(entities))
+            elif numpy.shape(where) == self.grid.shape:
+                cells = engine.density(len(entities), where)
+            else:
+                cells = engine.coordinates(where)
+                if len(cells) != len(entities):
+                    raise PlacementError(
+                        "There must be coordinates for each of %s" % group
+                    )
+            for entity, (x, y) in zip(entities, cells):
+                self._move(entity, x, y)
+
+    def turn_order(self):
+        """Return the order of turns for the day: each group in turn (e.g.,
+           dinosaurs and then trees), each shuffled. On a grid stored in tiles
+           (in a file) each group is then ordered by tile, so the day walks
+           the file in order (entities in the same tile keep their shuffled
+           order).
         """
-        # Initialize a grid for the simulation (empty is None)
-        self.grid = numpy.empty(shape=(self.grid_size, self.grid_size), dtype=object)
-        choices = [x[0] for x in list(numpy.ndenumerate(self.grid))]
-        random.shuffle(choices)
+        groups = [(g, g.shuffled(self.rng)) for g in self.groups.values()]
+        if not hasattr(self.grid, "tile_of"):
+            return chain(*[entities for _, entities in groups])
+
+        def by_tile(group, entities):
+            entities = sorted(entities, key=lambda e: self.grid.tile_of(e.x, e.y))
+            for entity in entities:
 
-        # We must have enough spots on the grid, should be 10 more
-        if self.dinosaurs.count + self.trees.count + 10 > len(choices):
-            sys.exit("You must increase grid size or decrease entities.")
+                # An entity could be removed (e.g., killed) before its turn
+                if group.entities.get(entity.name) is entity:
+                    yield entity
 
-        # Allocate each a location on the grid
-        for entity in chain(self.dinosaurs, self.trees):
-            x, y = choices.pop()
-            self._move(entity, x, y)
+        return chain(*[by_tile(group, entities) for group, entities in groups])
 
     def _move(self, entity, x, y):
         """Handle assigning an entity to a new spot, along with assigning the
@@ -214,22 +526,27 @@ class DinosaurDilemma:
 
         entity.set_location(x, y)
         self.grid[x, y] = entity.name
+        self.index.update(entity)
+        self.update_food(entity)
 
-    def move(self, entity):
+    def move(self, entity, rng=random):
         """Given an entity, move it in the grid. This means that if there
            are surrounding (other) entities after the move, we interact with
            them (even if the second entity has not moved yet!) This makes
            the simulation more interesting, as a single entity can have 
-           multiple interactions per turn.
+           multiple interactions per turn. When foraging, a hungry entity only
+           steps toward the nearest food (and stays next to it).
         """
         if entity.can_move:
 
             # return a list of open coordinates we can move to
             coords = self.get_open_coords(entity.x, entity.y)
+            if self.food is not None and getattr(entity, "is_hungry", False):
+                coords = self.food.toward(entity.x, entity.y, coords)
 
             # The entity is surrounded if none to choose from!
             if coords:
-                x, y = random.choice(coords)
+                x, y = rng.choice(coords)
                 self._move(entity, x, y)
 
     def get_open_coords(self, x, y):
@@ -260,7 +577,8 @@ class DinosaurDilemma:
     # Climate
 
     def get_environment(self):
-        """A general function that returns a lookup of the environment
+        """A general function that returns a lookup of the environment (as a
+           new dictionary, the environment for the day is self.environment)
         """
         environ = {
             "humidity": self.humidity,
@@ -279,27 +597,27 @@ class DinosaurDilemma:
         """
         chance_humid = 0.5
         if self.season == "winter":
-            self.temperature = random.choice(range(self.min_temperature, 32))
+            self.temperature = self.rng.choice(range(self.min_temperature, 32))
             chance_humid = 0.1
         elif self.season == "fall":
-            self.temperature = random.choice(range(30, 62))
+            self.temperature = self.rng.choice(range(30, 62))
             chance_humid = 0.6
         elif self.season == "spring":
-            self.temperature = random.choice(range(40, 55))
+            self.temperature = self.rng.choice(range(40, 55))
             chance_humid = 0.4
         elif self.season == "summer":
-            self.temperature = random.choice(range(56, self.max_temperature))
+            self.temperature = self.rng.choice(range(56, self.max_temperature))
             chance_humid = 0.75
         self.set_humidity(chance_humid)
 
     def set_humidity(self, chance_humid):
         """Determine the humidity, a percentage value.
         """
-        low_humidity = random.choice(range(30, 50)) * 0.01
-        high_humidity = random.choice(range(50, 80)) * 0.01
-        self.humidity = numpy.random.choice(
-            [low_humidity, high_humidity], p=[1 - chance_humid, chance_humid]
-        )
+        low_humidity = self.rng.choice(range(30, 50)) * 0.01
+        high_humidity = self.rng.choice(range(50, 80)) * 0.01
+        self.humidity = low_humidity
+        if self.rng.random() < chance_humid:
+            self.humidity = high_humidity
 
     # Time
 
@@ -316,49 +634,564 @@ class DinosaurDilemma:
         """For each new day, these is a different value for water and sunlight,
            depending on the season.
         """
-        # 1. Adjust day and season, and climate
+        # 1. Adjust day and season, and climate (from the stream for the day)
+        self.day += 1
+        self.rng = self.streams.world(self.day)
         if self.days_left_season == 0:
             self.season = self.next_season()
             self.days_left_season = self.days_in_season
 
         self.days_left_season -= 1
         self.set_climate()
+        self.environment = Environment(
+            self.humidity,
+            self.temperature,
+            self.season,
+            self.days_in_season,
+            self.days_left_season,
+            self.dinosaurs,
+            self.trees,
+        )
         self.summary()
 
-    def run(self, days=100, verbose=False, delay=1):
+    def count_entities(self):
+        """Return the number of entities (of every species) on the grid
+        """
+        return sum(group.count for group in self.groups.values())
+
+    def run(
+        self, days=100, verbose=False, delay=1, gc_threshold=GC_THRESHOLD, progress=None
+    ):
         """After the grid is initialized and we've set the initial client, 
            run the simulation for a certain number of days. Also add a delay
-           (seconds) to sleep between days
+           (seconds) to sleep between days. The garbage collector is tuned
+           for the run (see collect_less), unless gc_threshold is None. A
+           progress (dinolemma.progress.Progress) is updated each day, and
+           metrics exporters are flushed at the end.
         """
         self.verbose = verbose
 
-        for day in range(days):
-            print("\nDAY %s" % day)
-            self.run_day()
-            time.sleep(delay)
+        with collect_less(gc_threshold):
+            try:
+                for day in range(days):
+                    if not self.quiet:
+                        print("\nDAY %s" % day)
+                    self.run_day()
+                    if progress is not None:
+                        progress.update(1, self.count_entities())
+                    time.sleep(delay)
+            finally:
+                if self.metrics is not None:
+                    self.metrics.flush()
 
     def run_day(self):
         """manually run a day (an alternative to "run"). This function
            also returns a data structure that can be used to update some
            graphical rendering of the result.
         """
+        if self.synchronous:
+            return self.run_day_synchronous()
+
+        # Each phase of the day is timed (e.g., for metrics)
+        start = time.perf_counter()
         self.newday()
+        self.timings["newday"] = time.perf_counter() - start
+        start += self.timings["newday"]
 
         # order here is randomized. We move, change, and then interact
-        for entity in chain(self.dinosaurs, self.trees):
+        for entity in self.turn_order():
 
             # An entity could have died on a previous term (starve or fight)
             if entity.is_dead:
-                print("DEAD: %s" % entity)
+                if not self.quiet:
+                    print("DEAD: %s" % entity)
                 self.remove(entity)
                 continue
 
-            self.move(entity)
-            self.change(entity)
+            # Each entity draws from its own stream for the day
+            rng = self.streams.entity(self.day, entity.uid)
+            self.move(entity, rng=rng)
+            self.change(entity, rng=rng)
 
             # Does the entity reproduce on its own?
-            if entity.reproduce():
-                self.reproduce(entity)
+            if entity.reproduce(rng=rng):
+                self.reproduce(entity, rng=rng)
 
             # Have the entity interact with its neighbors
-            self.interact(entity)
+            self.interact(entity, rng=rng)
+
+        self.timings["entities"] = time.perf_counter() - start
+        start += self.timings["entities"]
+
+        # Offspring are placed once everyone has had a turn
+        self.resolve_births()
+        self.timings["births"] = time.perf_counter() - start
+
+        if self.metrics is not None:
+            self.metrics.update(self)
+
+    def run_day_synchronous(self):
+        """Run a day in which every entity acts at once. Each phase (moving,
+           changing, reproducing and interacting) reads the state left by the
+           previous phase (arrays, by attribute) and writes a new one, so an
+           entity never sees what another did in the same phase, and the
+           result does not depend on the order of entities. Moves to the same
+           cell, and claims on the same avocados, are resolved by a priority
+           draw (see dinolemma.synchronous). The new state is then written to
+           the entities and grid, those killed are removed, and births are
+           resolved as usual. Every phase is an array operation, so this is
+           the reference for engines that evaluate a day in parallel. The
+           rules of interactions are those of run_day (e.g., the stronger of
+           two fighting dinosaurs dies), but as entities act at once, a day
+           is not the same as one of run_day (with the same seed).
+        """
+        from dinolemma.kernels import dinosaur_change, tree_change
+        from dinolemma import synchronous as sync
+
+        start = time.perf_counter()
+        self.newday()
+        self.timings["newday"] = time.perf_counter() - start
+        start += self.timings["newday"]
+
+        # Entities that died on a previous day are removed
+        for group in self.groups.values():
+            for entity in list(group.entities.values()):
+                if entity.is_dead:
+                    if not self.quiet:
+                        print("DEAD: %s" % entity)
+                    self.remove(entity)
+
+        # The state at the start of the day
+        dinos = list(self.dinosaurs.entities.values())
+        trees = list(self.trees.entities.values())
+        previous = _gather(dinos, FAST_FORWARD_DINOSAUR)
+        t = _gather(trees, FAST_FORWARD_TREE)
+        uids = previous["uid"]
+
+        # Dinosaurs move to cells that were open at the start of the day
+        occupied = sync.Cells(
+            self.grid_size,
+            numpy.concatenate([previous["x"], t["x"]]),
+            numpy.concatenate([previous["y"], t["y"]]),
+        )
+        priority = self._draws(uids, sync.PRIORITY)
+        winners, x, y = sync.choose_cells(
+            self.grid_size,
+            previous["x"],
+            previous["y"],
+            occupied,
+            self._draws(uids, sync.MOVE),
+            priority,
+        )
+        d = {name: values.copy() for name, values in previous.items()}
+        d["x"][winners] = x
+        d["y"][winners] = y
+
+        # Each entity changes (from its own state) and can reproduce
+        self.kernels.run(
+            dinosaur_change,
+            d["hunger"],
+            d["size"],
+            d["dead"],
+            d["freezing_point"],
+            d["boiling_point"],
+            self.temperature,
+            self._draws(uids, sync.CHANGE)[None],
+        )
+        self.kernels.run(
+            tree_change,
+            t["height"],
+            t["happy"],
+            t["is_diseased"],
+            t["dead"],
+            t["avocados"],
+            t["freezing_point"],
+            t["probability_disease"],
+            self.temperature,
+            self.humidity,
+            numpy.array([self._draws(t["uid"], sync.CHANGE + i) for i in range(4)]),
+        )
+        parents = (d["gender"] == Gender.HYBRID) & (
+            self._draws(uids, sync.REPRODUCE) < d["probability_reproduce"]
+        )
+        tree_parents = (
+            (t["height"] > 0.80)
+            & t["happy"]
+            & (self._draws(t["uid"], sync.REPRODUCE) < t["probability_reproduce"])
+        )
+
+        # Dinosaurs interact with their neighbors after moving and changing
+        hunger, eaten, killed, killed_trees, fights = sync.interact(
+            self.grid_size,
+            d,
+            t,
+            numpy.array([self._draws(uids, sync.INTERACT + i) for i in range(12)]),
+            priority,
+        )
+        d["hunger"] += hunger
+        t["avocados"] -= eaten
+        self.counts["fights"] += fights
+
+        # Swap in the new state: dinosaurs move on the grid, entities update
+        self.grid[previous["x"][winners], previous["y"][winners]] = None
+        self.grid[x, y] = d["name"][winners]
+        _scatter(dinos, d, FAST_FORWARD_DINOSAUR)
+        _scatter(trees, t, FAST_FORWARD_TREE)
+        for i in winners:
+            self.index.update(dinos[i])
+        for entity in chain(dinos, trees):
+            self.population.update(entity)
+
+        # Those killed are removed, and the others can have offspring
+        for entity in chain(
+            [dinos[i] for i in numpy.flatnonzero(killed)],
+            [trees[i] for i in numpy.flatnonzero(killed_trees)],
+        ):
+            self.remove(entity)
+        for entities, uids, mask in [
+            (dinos, uids, parents & ~killed),
+            (trees, t["uid"], tree_parents & ~killed_trees),
+        ]:
+            for i in numpy.flatnonzero(mask):
+                self.reproduce(entities[i], rng=self._stream(uids[i], sync.BIRTH))
+        self.timings["entities"] = time.perf_counter() - start
+        start += self.timings["entities"]
+
+        self.resolve_births()
+        self.timings["births"] = time.perf_counter() - start
+
+        if self.metrics is not None:
+            self.metrics.update(self)
+
+    # Fast forward
+
+    def quiet_days(self, dinos=None, trees=None):
+        """Return the number of days in which no dinosaur can meet another
+           entity, so no interactions are possible. A dinosaur moves at most
+           one cell a day, so one at (manhattan) distance d from a tree can't
+           be next to it for d - 2 days, and two dinosaurs at distance d for
+           (d - 2) // 2 days. dinos and trees are arrays of (x, y) locations
+           (by default, of all entities of species that move, and all others).
+           Without dinosaurs, every day is quiet (None is returned). Entities
+           are bucketed (see _near_distance) so the cost is linear in their
+           number, and when none are near the result is a lower bound.
+        """
+        if dinos is None:
+            dinos, trees = [], []
+            for code, group in self.groups.items():
+                moves = "move" in get_species(code).capabilities
+                (dinos if moves else trees).extend(
+                    (e.x, e.y) for e in group.entities.values()
+                )
+        dinos = numpy.asarray(dinos).reshape(-1, 2)
+        trees = numpy.asarray(trees).reshape(-1, 2)
+        if not len(dinos):
+            return None
+
+        # Only entities in nearby buckets are compared. Pairs further apart
+        # than a bucket can only give a bound, so we return at least that
+        quiet = self.grid_size * 2
+        if len(dinos) > 1:
+            distance = _near_distance(dinos, dinos, QUIET_CELL, same=True)
+            quiet = min(quiet, (distance - 2) // 2)
+        if len(trees):
+            distance = _near_distance(dinos, trees, QUIET_CELL)
+            quiet = min(quiet, distance - 2)
+        return max(0, int(quiet))
+
+    def _draws(self, uids, counters):
+        """Return a draw for each entity today, at a position (counter) of its
+           stream, the same as the entity's own stream would give.
+        """
+        if self.seed is None:
+            return numpy.random.random(len(uids))
+        return uniforms(self.seed, self.day, uids, counters)
+
+    def _stream(self, uid, counter):
+        """Return the stream for an entity today, after counter draws
+        """
+        rng = self.streams.entity(self.day, int(uid))
+        if self.seed is not None:
+            rng.counter = int(counter)
+        return rng
+
+    def fast_forward(self, days):
+        """Advance up to days days in bulk, for as long as no interactions
+           are possible (see quiet_days). Entities are gathered into arrays
+           (one per attribute) and each day dinosaurs move, and all entities
+           change with the climate, as array operations (dinolemma.kernels).
+           Deaths and births are handled as usual. Every draw comes from the
+           same position of the entity's stream as in run_day, so a seeded
+           run is the same as stepping normally. Returns the days advanced.
+           The kernels are for dinosaurs and trees (that move at random), so
+           a simulation with other species, or foraging, is not fast forwarded
+           (nor is a synchronous one, which has different rules).
+        """
+        from dinolemma.kernels import (
+            dinosaur_change,
+            dinosaur_dead,
+            tree_change,
+            tree_dead,
+        )
+
+        if set(self.groups) != {DINOSAUR, TREE} or self.food is not None:
+            return 0
+        if self.synchronous:
+            return 0
+        if self.quiet_days() == 0:
+            return 0
+
+        dinos = list(self.dinosaurs.entities.values())
+        trees = list(self.trees.entities.values())
+        d = _gather(dinos, FAST_FORWARD_DINOSAUR)
+        t = _gather(trees, FAST_FORWARD_TREE)
+        advanced = 0
+
+        while advanced < days:
+            quiet = self.quiet_days(
+                numpy.stack([d["x"], d["y"]], axis=1),
+                numpy.stack([t["x"], t["y"]], axis=1),
+            )
+            if quiet == 0:
+                break
+            start = time.perf_counter()
+            self.newday()
+
+            # Entities that died on a previous day are removed
+            dead = self.kernels.run(dinosaur_dead, d["hunger"], d["dead"])
+            dead_trees = self.kernels.run(tree_dead, t["height"], t["dead"])
+            if dead.any() or dead_trees.any():
+                _scatter(dinos, d, FAST_FORWARD_DINOSAUR, numpy.flatnonzero(dead))
+                _scatter(trees, t, FAST_FORWARD_TREE, numpy.flatnonzero(dead_trees))
+                for entity in chain(
+                    [dinos[i] for i in numpy.flatnonzero(dead)],
+                    [trees[i] for i in numpy.flatnonzero(dead_trees)],
+                ):
+                    if not self.quiet:
+                        print("DEAD: %s" % entity)
+                    self.remove(entity)
+                dinos = [e for e, gone in zip(dinos, dead) if not gone]
+                trees = [e for e, gone in zip(trees, dead_trees) if not gone]
+                d = {name: values[~dead] for name, values in d.items()}
+                t = {name: values[~dead_trees] for name, values in t.items()}
+
+            # Dinosaurs move to a random adjacent cell (all of them are open)
+            x, y = d["x"], d["y"]
+            inside = numpy.stack(
+                [x > 0, x < self.grid_size - 1, y > 0, y < self.grid_size - 1], axis=1
+            )
+            number_open = inside.sum(axis=1)
+            moves = number_open > 0
+            u = self._draws(d["uid"], numpy.zeros(len(x), dtype=numpy.int64))
+            choice = numpy.floor(u * number_open)[:, None]
+            direction = numpy.argmax(numpy.cumsum(inside, axis=1) > choice, axis=1)
+            d["x"] = numpy.where(moves, x + DIRECTIONS[direction, 0], x)
+            d["y"] = numpy.where(moves, y + DIRECTIONS[direction, 1], y)
+            self.grid[x[moves], y[moves]] = None
+            self.grid[d["x"][moves], d["y"][moves]] = d["name"][moves]
+
+            # Dinosaurs change (with a draw if freezing or boiling), and a
+            # hybrid can reproduce
+            counter = moves.astype(numpy.int64)
+            self.kernels.run(
+                dinosaur_change,
+                d["hunger"],
+                d["size"],
+                d["dead"],
+                d["freezing_point"],
+                d["boiling_point"],
+                self.temperature,
+                self._draws(d["uid"], counter)[None],
+            )
+            counter += (self.temperature <= d["freezing_point"]) | (
+                self.temperature >= d["boiling_point"]
+            )
+            hybrid = d["gender"] == Gender.HYBRID
+            parents = hybrid & (
+                self._draws(d["uid"], counter) < d["probability_reproduce"]
+            )
+            for i in numpy.flatnonzero(parents):
+                dinos[i].set_location(int(d["x"][i]), int(d["y"][i]))
+                self.reproduce(dinos[i], rng=self._stream(d["uid"][i], counter[i] + 1))
+
+            # Trees change: a draw to freeze (if cold), for disease, and two
+            # for avocados (if it is healthy and mature)
+            counter = (self.temperature <= t["freezing_point"]).astype(numpy.int64)
+            zeros = numpy.zeros(len(counter), dtype=numpy.int64)
+            self.kernels.run(
+                tree_change,
+                t["height"],
+                t["happy"],
+                t["is_diseased"],
+                t["dead"],
+                t["avocados"],
+                t["freezing_point"],
+                t["probability_disease"],
+                self.temperature,
+                self.humidity,
+                numpy.array(
+                    [self._draws(t["uid"], zeros + i) for i in [0]]
+                    + [self._draws(t["uid"], counter + i) for i in [0, 1, 2]]
+                ).reshape(4, -1),
+            )
+            mature = t["height"] > 0.80
+            healthy = (
+                ~self.kernels.run(tree_dead, t["height"], t["dead"]) & ~t["is_diseased"]
+            )
+            counter += 1 + 2 * (healthy & mature)
+            parents = (
+                mature
+                & t["happy"]
+                & (self._draws(t["uid"], counter) < t["probability_reproduce"])
+            )
+            for i in numpy.flatnonzero(parents):
+                self.reproduce(trees[i], rng=self._stream(t["uid"][i], counter[i] + 1))
+
+            # Offspring are placed as usual, and join the arrays
+            for offspring in self.resolve_births():
+                if offspring.code == TREE:
+                    trees.append(offspring)
+                    t = _concat(t, _gather([offspring], FAST_FORWARD_TREE))
+                else:
+                    dinos.append(offspring)
+                    d = _concat(d, _gather([offspring], FAST_FORWARD_DINOSAUR))
+
+            advanced += 1
+            if self.metrics is not None:
+                self.timings = {"fast_forward": time.perf_counter() - start}
+                self.metrics.update(self)
+
+        # Write the state back to the entities (and where dinosaurs moved to)
+        _scatter(dinos, d, FAST_FORWARD_DINOSAUR)
+        _scatter(trees, t, FAST_FORWARD_TREE)
+        for entity in chain(dinos, trees):
+            self.population.update(entity)
+        for entity in dinos:
+            self.index.update(entity)
+        return advanced
+
+    def advance(self, days=100, gc_threshold=GC_THRESHOLD, progress=None):
+        """Run a number of days as fast as possible, fast forwarding while no
+           interactions are possible, and stepping normally otherwise. A
+           progress (dinolemma.progress.Progress) is updated as days pass,
+           and metrics exporters are flushed at the end.
+        """
+        # After a busy day, wait (longer each time) before trying again
+        wait = 1
+        with collect_less(gc_threshold):
+            try:
+                while days > 0:
+                    advanced = self.fast_forward(days)
+                    if advanced:
+                        wait = 1
+                    else:
+                        for _ in range(min(wait, days)):
+                            self.run_day()
+                        advanced = min(wait, days)
+                        wait = min(wait * 2, 32)
+                    days -= advanced
+                    if progress is not None:
+                        progress.update(advanced, advanced * self.count_entities())
+            finally:
+                if self.metrics is not None:
+                    self.metrics.flush()
+
+
+# Directions to adjacent cells (in the order of get_adjacent_coords)
+DIRECTIONS = numpy.array([(-1, 0), (1, 0), (0, -1), (0, 1)])
+
+# The size (in cells) of buckets for finding entities near each other, when
+# checking for quiet days. Nearby pairs are exact, and others are at least a
+# bucket apart (so a few quiet days), which fast_forward checks again daily.
+QUIET_CELL = 4
+
+# The attributes (and types) of entities that fast_forward updates in bulk
+FAST_FORWARD_DINOSAUR = [
+    ("name", object),
+    ("uid", numpy.int64),
+    ("x", numpy.int64),
+    ("y", numpy.int64),
+    ("hunger", float),
+    ("size", float),
+    ("dead", bool),
+    ("gender", numpy.int64),
+    ("freezing_point", numpy.int64),
+    ("boiling_point", numpy.int64),
+    ("probability_reproduce", float),
+]
+
+FAST_FORWARD_TREE = [
+    ("uid", numpy.int64),
+    ("x", numpy.int64),
+    ("y", numpy.int64),
+    ("height", float),
+    ("happy", bool),
+    ("is_diseased", bool),
+    ("dead", bool),
+    ("avocados", numpy.int64),
+    ("freezing_point", numpy.int64),
+    ("probability_disease", float),
+    ("probability_reproduce", float),
+]
+
+
+def _gather(entities, fields):
+    """Gather attributes of entities into arrays, by name
+    """
+    return {
+        name: numpy.array([getattr(e, name) for e in entities], dtype=dtype)
+        for name, dtype in fields
+    }
+
+
+def _concat(arrays, more):
+    return {name: numpy.concatenate([arrays[name], more[name]]) for name in arrays}
+
+
+def _scatter(entities, arrays, fields, index=None):
+    """Write arrays back to the attributes of entities (or those in index)
+    """
+    index = range(len(entities)) if index is None else index
+    for name, dtype in fields:
+        if name in ["name", "uid"]:
+            continue
+        values = arrays[name].tolist()
+        for i in index:
+            setattr(entities[i], name, values[i])
+
+
+def _near_distance(points, others, cell, same=False):
+    """Return the least (manhattan) distance from points to others (arrays
+       of x, y), among pairs in the same or adjacent cell x cell buckets.
+       Any other pair is more than cell apart, so if no pair is that near,
+       cell + 1 is returned (a lower bound). If same, points and others are
+       the same array, and a point is not paired with itself.
+    """
+    width = int(max(points.max(), others.max())) // cell + 3
+    keys = (others[:, 0] // cell + 1) * width + others[:, 1] // cell + 1
+    order = numpy.argsort(keys, kind="stable")
+    keys = keys[order]
+
+    least = cell + 1
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            target = (points[:, 0] // cell + 1 + dx) * width + (
+                points[:, 1] // cell + 1 + dy
+            )
+            start = numpy.searchsorted(keys, target, "left")
+            number = numpy.searchsorted(keys, target, "right") - start
+            total = number.sum()
+            if not total:
+                continue
+
+            # Every pair of a point, and an entity in the bucket
+            i = numpy.repeat(numpy.arange(len(points)), number)
+            offset = numpy.arange(total) - numpy.repeat(
+                numpy.cumsum(number) - number, number
+            )
+            j = order[numpy.repeat(start, number) + offset]
+            if same:
+                i, j = i[i != j], j[i != j]
+            if len(i):
+                least = min(least, numpy.abs(points[i] - others[j]).sum(axis=1).min())
+    return least
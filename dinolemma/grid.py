@@ -0,0 +1,167 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+import numpy
+import os
+
+
+class MemmapGrid:
+    """A MemmapGrid is an occupancy grid stored in a file (numpy.memmap) so
+       that a world can be larger than memory. It looks like the in memory
+       grid to the simulation: indexing with (x, y) returns the name of the
+       entity there (or None), and setting a name (or None) places it. Each
+       cell holds a compact integer code (0 is empty), and the names for codes
+       are kept in memory, so memory use scales with entities, not cells. A
+       code is released (for reuse) when no cell holds it any more, so it is
+       the entities on the grid that count, not every entity ever born.
+
+       The file is laid out in square tiles (tile x tile cells), one after the
+       other, so the cells around an entity are close together on disk. The
+       file is the live world, and is not copied. An existing world file (of
+       the same size) is reopened instantly, and the codes of names rebuilt
+       from the entities on it (only their cells are read), a file that is
+       not a world of this size is only replaced with overwrite. The grid
+       can also be pickled (e.g., with a simulation checkpoint) without its
+       cells, and is mapped again when unpickled (if the file is still there,
+       see DinosaurDilemma.load to reopen a world file that was moved).
+    """
+
+    def __init__(
+        self, path, size, tile=64, dtype=numpy.uint32, entities=None, overwrite=False
+    ):
+        self.path = os.path.abspath(path)
+        self.size = size
+        self.tile = tile
+        self.tiles = -(-size // tile)
+        self.dtype = numpy.dtype(dtype)
+        self.names = {}
+        self.codes = {}
+        self.cells = {}
+        self.free = []
+        if os.path.exists(self.path) and not overwrite:
+            self.data = self._map("r+")
+            self.rebuild(entities or [])
+        else:
+            self.data = self._map("w+")
+
+    def __str__(self):
+        return "[memmap-grid:%s]" % self.path
+
+    def __repr__(self):
+        return self.__str__()
+
+    def _map(self, mode):
+        """Map the file, which must be a world of this size unless it is
+           created (mode w+)
+        """
+        nbytes = self.tiles ** 2 * self.tile ** 2 * self.dtype.itemsize
+        if mode != "w+" and os.path.getsize(self.path) != nbytes:
+            raise FileExistsError(
+                "%s is not a world of %sx%s cells (in tiles of %s), pass "
+                "overwrite=True to replace it"
+                % (self.path, self.size, self.size, self.tile)
+            )
+        return numpy.memmap(
+            self.path,
+            dtype=self.dtype,
+            mode=mode,
+            shape=(self.tiles, self.tiles, self.tile, self.tile),
+        )
+
+    def __getstate__(self):
+        self.flush()
+        state = self.__dict__.copy()
+        del state["data"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.data = self._map("r+") if os.path.exists(self.path) else None
+
+    @property
+    def shape(self):
+        return (self.size, self.size)
+
+    def flush(self):
+        self.data.flush()
+
+    def tile_of(self, x, y):
+        """Return the index of the tile (in file order) for a cell
+        """
+        return (x // self.tile) * self.tiles + y // self.tile
+
+    def _index(self, key):
+        x, y = key
+        return (x // self.tile, y // self.tile, x % self.tile, y % self.tile)
+
+    def rebuild(self, entities):
+        """Rebuild the codes of names from the entities on a reopened grid:
+           each entity (with a name, x and y) takes the code of its cell. The
+           entities must be all of those on the world (e.g., from a checkpoint),
+           as other cells are not read. Codes below the largest are free.
+        """
+        self.names, self.codes, self.cells = {}, {}, {}
+        for entity in entities:
+            code = int(self.data[self._index((entity.x, entity.y))])
+            if not code or code in self.names:
+                raise ValueError("%s is not on the world in %s" % (entity, self.path))
+            self.names[code] = entity.name
+            self.codes[entity.name] = code
+            self.cells[code] = 1
+        self.free = [
+            code
+            for code in range(max(self.names, default=0), 0, -1)
+            if code not in self.names
+        ]
+
+    def _code(self, name):
+        """Return the code for a name (or None), assigning a new code if needed,
+           and count one more cell holding it
+        """
+        if name is None:
+            return 0
+        code = self.codes.get(name)
+        if code is None:
+            code = self.free.pop() if self.free else len(self.codes) + 1
+            self.codes[name] = code
+            self.names[code] = name
+        self.cells[code] = self.cells.get(code, 0) + 1
+        return code
+
+    def _release(self, codes):
+        """Count one less cell holding each code, and release codes (and their
+           names) that no cell holds
+        """
+        for code in codes:
+            if not code:
+                continue
+            self.cells[code] -= 1
+            if not self.cells[code]:
+                del self.cells[code]
+                del self.codes[self.names.pop(code)]
+                self.free.append(code)
+
+    def __getitem__(self, key):
+        codes = self.data[self._index(key)]
+        if numpy.ndim(codes) == 0:
+            return self.names.get(int(codes))
+        return numpy.array([self.names.get(int(c)) for c in codes.flat], dtype=object)
+
+    def __setitem__(self, key, names):
+        index = self._index(key)
+        old = numpy.ravel(self.data[index]).tolist()
+        if numpy.ndim(names) == 0:
+            code = self._code(names)
+            if code and len(old) > 1:
+                self.cells[code] += len(old) - 1
+            self.data[index] = code
+        else:
+            self.data[index] = [self._code(name) for name in names]
+        self._release(old)
@@ -8,8 +8,10 @@ with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 """
 
-from dinolemma.colors import BLACK, WHITE, GREEN, PURPLE, LIGHT_PURPLE, YELLOW
+from dinolemma.colors import BLACK, WHITE, GREEN, LIGHT_PURPLE, YELLOW
 from dinolemma.game import DinosaurDilemma
+from dinolemma.render import grid_codes
+from dinolemma.viewport import Viewport
 import sys
 
 try:
@@ -76,13 +78,40 @@ def button(
     return clicked
 
 
-def run_game(grid_size=25, number_trees=None, number_dinos=None, grid_dim=30):
-    """run the gui game. Currently, parameters are hard set to ensure that
-       dimensions work out okay. This could be modified to be more dynamic
+def draw_view(screen, viewport, codes, top=0, left=0):
+    """Draw the visible part of a grid of palette codes (see
+       dinolemma.render.grid_codes) through a viewport, at top, left
+    """
+    image = viewport.render(codes)
+    surface = pygame.surfarray.make_surface(image.transpose(1, 0, 2))
+    screen.blit(surface, (left, top))
+
+
+def draw_grid(screen, simulation, width, height, margin):
+    """Draw the cells of the simulation grid on the screen, each a width by
+       height rectangle separated by a margin.
+    """
+    pitch = width + margin
+    size = simulation.grid_size * pitch
+    viewport = Viewport(
+        simulation.grid_size, size, size, cell=pitch, margin=margin / pitch
+    )
+    draw_view(screen, viewport, grid_codes(simulation))
+
+
+def run_game(
+    grid_size=25, number_trees=None, number_dinos=None, grid_dim=30, seed=None
+):
+    """run the gui game. The grid is shown through a viewport of at most
+       MAX_VIEW pixels, so large worlds can be panned (drag with the right
+       button, or the arrow keys) and zoomed (the mouse wheel, or + and -,
+       0 to see the whole world). Zoomed out, the world is shown as an
+       overview colored by density.
 
        Parameters
        ==========
        grid_dim: the width and height of a square in the grid
+       seed: an optional seed for a reproducible simulation
     """
     # Set the WIDTH and HEIGHT of each grid location
     WIDTH = HEIGHT = grid_dim
@@ -90,19 +119,34 @@ def run_game(grid_size=25, number_trees=None, number_dinos=None, grid_dim=30):
     # This sets the margin between each cell
     MARGIN = 5
     TEXT_AREA = 200
+    MAX_VIEW = 800
 
     # Create the simulation
     simulation = DinosaurDilemma(
-        grid_size=grid_size, number_trees=number_trees, number_dinos=number_dinos
+        grid_size=grid_size,
+        number_trees=number_trees,
+        number_dinos=number_dinos,
+        seed=seed,
     )
 
     # Initialize pygame
     pygame.init()
 
-    # Set the HEIGHT and WIDTH of the screen
-    SIZE = grid_size * (WIDTH + MARGIN) + MARGIN
+    # Set the HEIGHT and WIDTH of the screen, the grid is seen in a viewport
+    SIZE = min(grid_size * (WIDTH + MARGIN) + MARGIN, MAX_VIEW)
     WINDOW_SIZE = [SIZE, SIZE + TEXT_AREA]
     screen = pygame.display.set_mode(WINDOW_SIZE)
+    viewport = Viewport(
+        grid_size,
+        SIZE,
+        SIZE,
+        cell=min(WIDTH + MARGIN, SIZE / grid_size),
+        margin=MARGIN / (WIDTH + MARGIN),
+    )
+
+    # The palette codes of the grid are only updated when the day changes
+    shown = None
+    codes = None
 
     # Set title of screen
     pygame.display.set_caption("Dinosaur Dilemma")
@@ -123,28 +167,16 @@ def run_game(grid_size=25, number_trees=None, number_dinos=None, grid_dim=30):
            we define this as a subfunction of run_gui to share the function
            local variables.
         """
+        nonlocal shown, codes
+
         # Set the screen background, display text
         screen.fill(BLACK)
 
-        # Draw the grid
-        for row in range(simulation.grid_size):
-            for column in range(simulation.grid_size):
-                color = WHITE
-                if simulation.grid[row][column] is not None:
-                    if simulation.grid[row][column].endswith("tree"):
-                        color = GREEN
-                    else:
-                        color = PURPLE
-                pygame.draw.rect(
-                    screen,
-                    color,
-                    [
-                        (MARGIN + WIDTH) * column + MARGIN,
-                        (MARGIN + HEIGHT) * row + MARGIN,
-                        WIDTH,
-                        HEIGHT,
-                    ],
-                )
+        # Draw the visible part of the grid
+        if shown != (id(simulation), simulation.day):
+            codes = grid_codes(simulation)
+            shown = (id(simulation), simulation.day)
+        draw_view(screen, viewport, codes)
 
         # Update the message to the viewer
         summary = simulation.summary(return_summary=True).split("\n")
@@ -153,7 +185,15 @@ def run_game(grid_size=25, number_trees=None, number_dinos=None, grid_dim=30):
             ["Click to progress to next day..."],
             screen,
             SIZE / 2,
-            SIZE + 150,
+            SIZE + 130,
+            color=LIGHT_PURPLE,
+        )
+        show_text(
+            ["wheel or +/- to zoom, right drag or arrows to pan"],
+            screen,
+            SIZE / 2,
+            SIZE + 160,
+            font_size=16,
             color=LIGHT_PURPLE,
         )
 
@@ -182,18 +222,49 @@ def run_game(grid_size=25, number_trees=None, number_dinos=None, grid_dim=30):
         pygame.display.flip()
         return simulation
 
+    # Keys to pan (a fraction of the view) and zoom
+    step = SIZE // 10
+    pan_keys = {
+        pygame.K_LEFT: (-step, 0),
+        pygame.K_RIGHT: (step, 0),
+        pygame.K_UP: (0, -step),
+        pygame.K_DOWN: (0, step),
+    }
+    zoom_keys = {pygame.K_PLUS: 1.25, pygame.K_EQUALS: 1.25, pygame.K_MINUS: 0.8}
+
     # -------- Main Program Loop -----------
     while not done:
 
-        for event in pygame.event.get():  # User did something
+        # Handle every waiting event, and then draw once
+        events = pygame.event.get()
+        for event in events:  # User did something
             if event.type == pygame.QUIT:  # If user clicked close
                 done = True  # Flag that we are done so we exit this loop
 
-            # Right now, use any click to progress the game
+            # A left click on the grid progresses the game, the wheel zooms
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                simulation.run_day()
-
+                if event.button == 1 and event.pos[1] < SIZE:
+                    simulation.run_day()
+                elif event.button in (4, 5) and event.pos[1] < SIZE:
+                    factor = 1.25 if event.button == 4 else 0.8
+                    viewport.zoom(factor, *event.pos)
+
+            # Dragging with the right button pans
+            elif event.type == pygame.MOUSEMOTION and event.buttons[2]:
+                viewport.pan(-event.rel[0], -event.rel[1])
+
+            elif event.type == pygame.KEYDOWN:
+                if event.key in pan_keys:
+                    viewport.pan(*pan_keys[event.key])
+                elif event.key in zoom_keys:
+                    viewport.zoom(zoom_keys[event.key])
+                elif event.key == pygame.K_0:
+                    viewport.reset()
+
+        if events and not done:
             simulation = update_grid(screen, simulation)
+        else:
+            clock.tick(60)
 
     # Don't hang on exit.
     pygame.quit()
@@ -0,0 +1,85 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+import numpy
+
+# Vectorized versions of the per entity rules in Dinosaur and AvocadoTree,
+# for engines that hold entities as arrays. Each kernel updates its arrays in
+# place, so it can be handed views (e.g., a chunk of a larger array). Random
+# draws are passed in (u), one row per draw, so the caller decides where
+# they come from (see dinolemma.rng.uniforms).
+
+
+def dinosaur_change(hunger, size, dead, freezing_point, boiling_point, temperature, u):
+    """The vectorized Dinosaur.change. Larger dinosaurs get hungrier faster,
+       a dinosaur can freeze or boil (50% chance), and one that is still
+       alive grows. u is one row of draws (for freezing or boiling).
+    """
+    numpy.maximum(hunger + numpy.power(size, 10), 0, out=hunger)
+
+    extreme = (temperature <= freezing_point) | (temperature >= boiling_point)
+    dead[:] = numpy.where(extreme, u[0] < 0.5, dead)
+
+    alive = ~dinosaur_dead(hunger, dead)
+    growth = 1 / numpy.maximum(1, numpy.power(temperature, 2))
+    size[:] = numpy.where(alive, numpy.minimum(0, size + growth), size)
+
+
+def tree_change(
+    height,
+    happy,
+    diseased,
+    dead,
+    avocados,
+    freezing_point,
+    probability_disease,
+    temperature,
+    humidity,
+    u,
+):
+    """The vectorized AvocadoTree.change. A tree grows in moderate weather
+       (if it is not diseased), can freeze, can become diseased, and a
+       healthy mature tree can grow avocados. u has four rows of draws (for
+       freezing, disease, the number of avocados, and if they grow).
+    """
+    grow = (temperature > 40) & (temperature < 65) & ~diseased
+    height[:] = numpy.where(
+        grow, numpy.maximum(1, height + numpy.power(humidity, 10)), height
+    )
+    happy[:] = grow
+
+    freeze = temperature <= freezing_point
+    dead[:] = numpy.where(freeze, u[0] < numpy.where(diseased, 0.5, 0.6), dead)
+    diseased |= u[1] < probability_disease
+
+    fruit = ~tree_dead(height, dead) & ~diseased & (height > 0.80) & (u[3] < 0.8)
+    avocados += numpy.where(fruit, (u[2] * 5).astype(avocados.dtype), 0)
+
+
+def dinosaur_dead(hunger, dead):
+    """A dinosaur is dead if hunger is 1 or more, or it has died
+    """
+    return (hunger >= 1) | dead
+
+
+def tree_dead(height, dead):
+    """A tree is dead if it has no height, or it has died
+    """
+    return (height <= 0) | dead
+
+
+def first_per_key(keys, priority):
+    """Resolve conflicting claims (e.g., to the same cell): return the index
+       of the winner (lowest priority) for each unique key
+    """
+    order = numpy.lexsort((priority, keys))
+    first = numpy.ones(len(order), dtype=bool)
+    first[1:] = keys[order][1:] != keys[order][:-1]
+    return order[first]
@@ -0,0 +1,184 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import bisect
+import os
+import threading
+import time
+
+# Upper bounds (seconds) of the buckets for phase timing histograms
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+
+
+class Histogram:
+    """A Prometheus style histogram with fixed buckets
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            lines.append('%s_bucket{%sle="%s"} %s' % (name, labels, bound, cumulative))
+        labels = "{%s}" % labels.rstrip(",") if labels else ""
+        lines.append("%s_sum%s %s" % (name, labels, self.sum))
+        lines.append("%s_count%s %s" % (name, labels, self.count))
+        return lines
+
+
+class Metrics:
+    """Metrics for a long running simulation: days simulated and days per
+       second, entity counts by type, births, deaths and fights, and a timing
+       histogram for each phase of run_day. A simulation with metrics calls
+       update once at the end of each day, which only reads counters that
+       the simulation keeps anyway, so metrics can be left on.
+    """
+
+    def __init__(self, prefix="dinolemma"):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.days = 0
+        self.days_per_second = 0.0
+        self.entities = {}
+        self.counts = {}
+        self.phases = {}
+        self._last = None
+        self.exporters = []
+
+    def update(self, simulation):
+        """Update metrics from a simulation at the end of a day
+        """
+        now = time.time()
+        with self.lock:
+            self.days += 1
+
+            # Days per second is smoothed (exponential moving average), from
+            # the first rate measured
+            if self._last is not None and now > self._last:
+                rate = 1.0 / (now - self._last)
+                if self.days_per_second:
+                    rate = 0.9 * self.days_per_second + 0.1 * rate
+                self.days_per_second = rate
+            self._last = now
+
+            # Entities of every species, by type (e.g., Dinosaur)
+            self.entities = {
+                group.Entity.__name__: group.count
+                for group in simulation.groups.values()
+            }
+            self.counts = dict(simulation.counts)
+            for phase, seconds in simulation.timings.items():
+                if phase not in self.phases:
+                    self.phases[phase] = Histogram()
+                self.phases[phase].observe(seconds)
+
+        for exporter in self.exporters:
+            exporter.update(self)
+
+    def flush(self):
+        """Have every exporter write the latest metrics (e.g., at the end of
+           a run), regardless of their interval
+        """
+        for exporter in self.exporters:
+            exporter.flush(self)
+
+    def render(self):
+        """Render metrics in the Prometheus text exposition format
+        """
+        name = self.prefix
+        with self.lock:
+            lines = [
+                "# TYPE %s_days_total counter" % name,
+                "%s_days_total %s" % (name, self.days),
+                "# TYPE %s_days_per_second gauge" % name,
+                "%s_days_per_second %s" % (name, self.days_per_second),
+                "# TYPE %s_uptime_seconds gauge" % name,
+                "%s_uptime_seconds %s" % (name, time.time() - self.started),
+                "# TYPE %s_entities gauge" % name,
+            ]
+            for entity_type, count in self.entities.items():
+                lines.append('%s_entities{type="%s"} %s' % (name, entity_type, count))
+            for event, count in self.counts.items():
+                lines.append("# TYPE %s_%s_total counter" % (name, event))
+                lines.append("%s_%s_total %s" % (name, event, count))
+            lines.append("# TYPE %s_phase_seconds histogram" % name)
+            for phase, histogram in self.phases.items():
+                lines += histogram.render(
+                    "%s_phase_seconds" % name, 'phase="%s",' % phase
+                )
+        return "\n".join(lines) + "\n"
+
+
+class TextfileExporter:
+    """Periodically (at most every interval seconds) rewrite a textfile with
+       the metrics, e.g., for the node exporter textfile collector. The file
+       is replaced atomically so a reader never sees a partial file.
+    """
+
+    def __init__(self, path, interval=15):
+        self.path = path
+        self.interval = interval
+        self._written = 0
+
+    def update(self, metrics):
+        if time.time() - self._written >= self.interval:
+            self.flush(metrics)
+
+    def flush(self, metrics):
+        """Write the metrics now
+        """
+        self._written = time.time()
+        tmp = "%s.tmp" % self.path
+        with open(tmp, "w") as filey:
+            filey.write(metrics.render())
+        os.replace(tmp, self.path)
+
+
+class MetricsServer:
+    """Serve metrics over http (on localhost by default) from a daemon thread.
+       Rendering only happens when the endpoint is scraped.
+    """
+
+    def __init__(self, metrics, port=9100, host="127.0.0.1"):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -8,7 +8,7 @@ with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 """
 
-from random import choice
+import random
 
 
 class GenericNamer:
@@ -190,26 +190,27 @@ class GenericNamer:
             "chip",
         ]
 
-    def _generate(self, delim="-", length=4):
+    def _generate(self, delim="-", length=4, rng=random):
         """Generate a dino name. Inspiration from Haikunator, but much more
            poorly implemented ;) We also don't allow for use of any descriptor
            or noun more than once.
         """
-        descriptor = self.select(self.descriptors)
-        noun = self.select(self.nouns)
+        descriptor = self.select(self.descriptors, rng=rng)
+        noun = self.select(self.nouns, rng=rng)
         return delim.join([descriptor, noun])
 
-    def generate(self, delim="-"):
-        return self._generate(delim)
+    def generate(self, delim="-", rng=random):
+        return self._generate(delim, rng=rng)
 
-    def select(self, select_from):
-        """ select an element from a list using random.choice
+    def select(self, select_from, rng=random):
+        """ select an element from a list using rng.choice
         
             Parameters
             ==========
             should be a list of things to select from
+            rng: the random stream to select with (defaults to random)
         """
         if len(select_from) <= 0:
             return ""
 
-        return choice(select_from)
+        return rng.choice(select_from)
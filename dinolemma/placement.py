@@ -0,0 +1,144 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+from dinolemma.errors import PlacementError
+import random
+import numpy
+
+
+class Placement:
+    """A Placement chooses distinct cells of a size x size grid for entities,
+       without listing every cell. Cells are sampled (without replacement)
+       as flat indices, with rejection of cells already taken while the grid
+       is sparse, and from a partial permutation of the free cells when it
+       is dense (more than dense of the cells are taken). If chunk is set
+       (e.g., for a grid larger than memory) the free cells are only listed
+       chunk cells at a time. Cells can also be placed in bulk from
+       coordinates, or sampled from a density map. All draws come from rng
+       (the random module, or a seeded stream).
+    """
+
+    def __init__(self, size, rng=random, dense=0.25, chunk=None):
+        self.size = size
+        self.cells = size * size
+        self.rng = rng
+        self.dense = dense
+        self.chunk = chunk
+        self.taken = set()
+
+    def __str__(self):
+        return "[placement:%sx%s]" % (self.size, self.size)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def _cells(self, flat):
+        self.taken.update(flat)
+        return [divmod(int(index), self.size) for index in flat]
+
+    def reserve(self, number, spare=10):
+        """Check that number more entities fit, with spare cells to spare
+        """
+        if len(self.taken) + number + spare > self.cells:
+            raise PlacementError("You must increase grid size or decrease entities.")
+
+    def sample(self, number):
+        """Return number distinct free cells, as a list of (x, y)
+        """
+        self.reserve(number, spare=0)
+        if len(self.taken) + number > self.dense * self.cells:
+            return self._permutation(number)
+
+        flat = []
+        chosen = set()
+        while len(flat) < number:
+            index = int(self.rng.random() * self.cells)
+            if index not in self.taken and index not in chosen:
+                chosen.add(index)
+                flat.append(index)
+        return self._cells(flat)
+
+    def _permutation(self, number):
+        """Choose number free cells with a partial (Fisher-Yates) shuffle of
+           the free cells, which only draws once per chosen cell.
+        """
+        if self.chunk:
+            return self._chunks(number)
+        free = numpy.ones(self.cells, dtype=bool)
+        free[list(self.taken)] = False
+        free = numpy.flatnonzero(free)
+        for i in range(number):
+            j = i + int(self.rng.random() * (len(free) - i))
+            free[i], free[j] = free[j], free[i]
+        return self._cells(free[:number].tolist())
+
+    def _chunks(self, number):
+        """Choose number free cells one chunk (of flat indices) at a time, so
+           memory scales with a chunk and not the grid. How many cells come
+           from each chunk is drawn first (a multivariate hypergeometric of
+           the free cells per chunk), then the cells within each chunk, and
+           the chosen cells are shuffled.
+        """
+        chunks = -(-self.cells // self.chunk)
+        starts = numpy.arange(chunks, dtype=numpy.int64) * self.chunk
+        sizes = numpy.minimum(self.chunk, self.cells - starts)
+        taken = numpy.sort(numpy.fromiter(self.taken, numpy.int64, len(self.taken)))
+        bounds = numpy.searchsorted(taken, numpy.append(starts, self.cells))
+
+        generator = numpy.random.default_rng(int(self.rng.random() * 2 ** 63))
+        counts = generator.multivariate_hypergeometric(
+            sizes - numpy.diff(bounds), number
+        )
+        flat = [numpy.zeros(0, dtype=numpy.int64)]
+        for i in numpy.flatnonzero(counts):
+            free = numpy.ones(sizes[i], dtype=bool)
+            free[taken[bounds[i] : bounds[i + 1]] - starts[i]] = False
+            free = numpy.flatnonzero(free) + starts[i]
+            flat.append(generator.choice(free, counts[i], replace=False))
+        flat = numpy.concatenate(flat)
+        generator.shuffle(flat)
+        return self._cells(flat.tolist())
+
+    def coordinates(self, coords):
+        """Place entities at the given coordinates, an array of (x, y), which
+           must be on the grid, distinct, and free.
+        """
+        coords = numpy.asarray(coords, dtype=numpy.int64).reshape(-1, 2)
+        if ((coords < 0) | (coords >= self.size)).any():
+            raise PlacementError("Coordinates must be on the grid.")
+        flat = coords[:, 0] * self.size + coords[:, 1]
+        if len(numpy.unique(flat)) < len(flat) or self.taken.intersection(
+            flat.tolist()
+        ):
+            raise PlacementError("Coordinates must be distinct and free.")
+        return self._cells(flat.tolist())
+
+    def density(self, number, density):
+        """Sample number distinct free cells with probability proportional to
+           a density map (a size x size array of non-negative weights). Each
+           cell with weight w gets the key log(u) / w (for a uniform u), and
+           the cells with the largest keys are chosen (Efraimidis-Spirakis).
+        """
+        weights = numpy.asarray(density, dtype=float).reshape(-1)
+        if weights.shape[0] != self.cells or (weights < 0).any():
+            raise PlacementError(
+                "A density map must be %sx%s and non-negative" % (self.size, self.size)
+            )
+        weights = weights.copy()
+        weights[list(self.taken)] = 0
+        candidates = numpy.flatnonzero(weights > 0)
+        if len(candidates) < number:
+            raise PlacementError("The density map has too few free cells.")
+
+        generator = numpy.random.default_rng(int(self.rng.random() * 2 ** 63))
+        keys = numpy.log(generator.random(len(candidates))) / weights[candidates]
+        chosen = numpy.argpartition(-keys, number - 1)[:number] if number else []
+        chosen = sorted(chosen, key=lambda i: -keys[i])
+        return self._cells(candidates[chosen].tolist())
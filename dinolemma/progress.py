@@ -0,0 +1,107 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+import sys
+import time
+
+
+def format_seconds(seconds):
+    """Format seconds as h:mm:ss (or m:ss under an hour)
+    """
+    seconds = int(round(seconds))
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if hours:
+        return "%d:%02d:%02d" % (hours, minutes, seconds)
+    return "%d:%02d" % (minutes, seconds)
+
+
+class Progress:
+    """A Progress reports how far a long run has got: the rate (units, e.g.,
+       days, per second), entity updates per second, and the time remaining.
+       Updates only add to counters and compare the clock to a deadline, so
+       they cost next to nothing per day; a report is written at most once
+       per interval (seconds). On a terminal the report is one line that is
+       rewritten in place, otherwise (e.g., a log file) a line is appended
+       each interval. Rates are over the last interval, and the time
+       remaining uses the rate over the whole run.
+    """
+
+    def __init__(self, total, unit="days", interval=1.0, stream=None):
+        self.total = total
+        self.unit = unit
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.tty = hasattr(self.stream, "isatty") and self.stream.isatty()
+        self.done = 0
+        self.entities = 0
+        self.start = time.perf_counter()
+        self.deadline = self.start + interval
+        self.last = (self.start, 0, 0)
+
+    def __str__(self):
+        return "[progress:%s/%s %s]" % (self.done, self.total, self.unit)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def update(self, number=1, entities=0):
+        """Record that number units are done, with entities updated in them
+        """
+        self.done += number
+        self.entities += entities
+        now = time.perf_counter()
+        if now >= self.deadline:
+            self.report(now)
+
+    def report(self, now=None):
+        """Write a report of progress (since the last, and overall)
+        """
+        now = now or time.perf_counter()
+        then, done, entities = self.last
+        elapsed = max(now - then, 1e-9)
+        rate = (self.done - done) / elapsed
+        updates = (self.entities - entities) / elapsed
+        overall = self.done / max(now - self.start, 1e-9)
+
+        line = "%s/%s %s | %.1f %s/s | %.0f updates/s | elapsed %s" % (
+            self.done,
+            self.total,
+            self.unit,
+            rate,
+            self.unit,
+            updates,
+            format_seconds(now - self.start),
+        )
+        if self.done < self.total and overall > 0:
+            line += " | eta %s" % format_seconds((self.total - self.done) / overall)
+
+        if self.tty:
+            self.stream.write("\r\033[K" + line)
+        else:
+            self.stream.write("progress: " + line + "\n")
+        self.stream.flush()
+        self.last = (now, self.done, self.entities)
+        self.deadline = now + self.interval
+
+    def close(self):
+        """Write a final report (and end the line on a terminal)
+        """
+        if self.last[1] != self.done or self.done == 0:
+            self.report()
+        if self.tty:
+            self.stream.write("\n")
+            self.stream.flush()
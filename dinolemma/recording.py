@@ -0,0 +1,184 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+from dinolemma.results import day_metrics
+from dinolemma.species import DINOSAUR, TREE
+import math
+import random
+
+# The attribute recorded (as value) for a tracked entity, by species code
+TRACKED = {DINOSAUR: "hunger", TREE: "height"}
+
+
+class Spike:
+    """A trigger for days with a spike in events (deaths, births or fights):
+       the day is recorded if there were at least minimum events, and at
+       least fraction of the number of entities at the start of the day.
+    """
+
+    def __init__(self, event="deaths", fraction=0.1, minimum=5):
+        self.event = event
+        self.fraction = fraction
+        self.minimum = minimum
+
+    def __str__(self):
+        return "[spike:%s>%s]" % (self.event, self.fraction)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __call__(self, counts, population):
+        return counts[self.event] >= max(self.minimum, self.fraction * population)
+
+
+class Recorder:
+    """A Recorder decides what a run keeps, so a large or long run can be
+       recorded without keeping everything:
+
+       every: the per day metrics are kept every Nth day (and the first and
+           last day)
+       budget: the most regular days to keep, every is widened to fit
+       triggers: functions of (the day's events, entities at the start of
+           the day), e.g., Spike, a day is also kept if any is True
+       track: the number of entities of each species to follow for life.
+           A reservoir sample (of every entity that ever lived) is kept, so
+           each has the same chance to be tracked, and the ones that drop
+           out of the sample are forgotten. Tracked entities are recorded
+           every day they are alive.
+       aggregate: keep no days or entities, only the outcome of the run
+
+       The recorder draws from its own random generator (seeded by seed), so
+       recording does not change the simulation.
+    """
+
+    def __init__(
+        self, every=1, budget=None, triggers=None, track=0, aggregate=False, seed=None
+    ):
+        self.every = max(1, every)
+        self.budget = budget
+        self.triggers = triggers or []
+        self.track = 0 if aggregate else track
+        self.aggregate = aggregate
+        self.random = random.Random(seed)
+        self.days = []
+        self.reservoir = {}
+        self.seen = {}
+        self.lives = {}
+        self.following = {}
+        self.newest = -1
+
+    def __str__(self):
+        return "[recorder:every %s, %s days]" % (self.every, len(self.days))
+
+    def __repr__(self):
+        return self.__str__()
+
+    def start(self, simulation, days):
+        """Start recording a simulation that will run for a number of days,
+           with its state at the start (day 1)
+        """
+        self.number_days = days
+        self.step = 0
+        if self.budget:
+            self.every = max(self.every, math.ceil(days / self.budget))
+        self.before = (dict(simulation.counts), simulation.count_entities())
+        if self.track:
+            self._sample(simulation)
+            self._follow(simulation)
+        if not self.aggregate:
+            self.days.append(day_metrics(simulation))
+
+    def record(self, simulation):
+        """Record a day of the simulation (after it has run)
+        """
+        counts, population = self.before
+        self.before = (dict(simulation.counts), simulation.count_entities())
+        events = {key: simulation.counts[key] - counts[key] for key in counts}
+        step = self.step
+        self.step += 1
+
+        # New entities are only looked for on days with births
+        if self.track:
+            if events["births"]:
+                self._sample(simulation)
+            self._follow(simulation)
+        if self.aggregate:
+            return
+
+        if (
+            (step + 1) % self.every == 0
+            or step == self.number_days - 1
+            or any(trigger(events, population) for trigger in self.triggers)
+        ):
+            self.days.append(day_metrics(simulation))
+
+    def _sample(self, simulation):
+        """Offer entities that are new (uids are increasing) to the reservoir
+           of their species
+        """
+        newest = self.newest
+        for code, group in simulation.groups.items():
+            reservoir = self.reservoir.setdefault(code, [])
+            for entity in group.entities.values():
+                if entity.uid <= self.newest:
+                    continue
+                newest = max(newest, entity.uid)
+                self.seen[code] = self.seen.get(code, 0) + 1
+                if len(reservoir) < self.track:
+                    reservoir.append(entity.uid)
+                else:
+                    slot = self.random.randrange(self.seen[code])
+                    if slot >= self.track:
+                        continue
+                    dropped = reservoir[slot]
+                    self.lives.pop(dropped, None)
+                    self.following.pop(dropped, None)
+                    reservoir[slot] = entity.uid
+                self.lives[entity.uid] = []
+                self.following[entity.uid] = entity
+        self.newest = newest
+
+    def _follow(self, simulation):
+        """Record each tracked entity that is still alive. Entities are
+           pooled, so one that has died may now have another uid.
+        """
+        for uid, entity in list(self.following.items()):
+            group = simulation.groups[entity.code]
+            if entity.uid != uid or group.entities.get(entity.name) is not entity:
+                del self.following[uid]
+                continue
+            self.lives[uid].append(
+                (
+                    simulation.day,
+                    uid,
+                    entity.code,
+                    entity.x,
+                    entity.y,
+                    getattr(entity, TRACKED.get(entity.code, ""), None),
+                )
+            )
+
+    def policy(self):
+        """Return what the recorder keeps (after start, with every widened to
+           fit the budget), a json serializable dictionary for the run
+        """
+        return {
+            "every": self.every,
+            "budget": self.budget,
+            "triggers": [str(trigger) for trigger in self.triggers],
+            "track": self.track,
+            "aggregate": self.aggregate,
+        }
+
+    @property
+    def entities(self):
+        """The rows of tracked entities, (day, uid, species, x, y, value)
+        """
+        return [row for uid in sorted(self.lives) for row in self.lives[uid]]
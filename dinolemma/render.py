@@ -0,0 +1,202 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+from dinolemma.colors import BLACK, WHITE
+from dinolemma.species import SPECIES
+from multiprocessing import Pool
+import numpy
+import struct
+import sys
+import zlib
+import os
+
+# The built in species are registered (with their colors) when imported
+import dinolemma.avocados
+import dinolemma.dinosaurs
+
+# Palette codes for a rendered grid: empty, the margin, and otherwise the
+# code of the species (e.g., TREE or DINOSAUR, see dinolemma.species)
+EMPTY = 0
+MARGIN = 255
+
+
+def palette():
+    """Return the palette (a row of rgb for each code) for rendered grids
+    """
+    colors = numpy.zeros((256, 3), dtype=numpy.uint8)
+    colors[EMPTY] = WHITE
+    colors[MARGIN] = BLACK
+    for code, species in SPECIES.items():
+        colors[code] = species.color
+    return colors
+
+
+def grid_codes(simulation):
+    """Given a simulation, return a (grid_size, grid_size) array of palette
+       codes, one per cell. We walk the entities (and not the grid) so the
+       cost is proportional to the population, not the size of the world.
+    """
+    codes = numpy.full(simulation.grid.shape, EMPTY, dtype=numpy.uint8)
+    for code, group in simulation.groups.items():
+        coords = [(e.x, e.y) for e in group.entities.values() if e.on_grid]
+        if coords:
+            xs, ys = zip(*coords)
+            codes[xs, ys] = code
+    return codes
+
+
+def scale_codes(codes, cell_size=10, margin=1):
+    """Scale a grid of palette codes up to an image, where each cell is a
+       cell_size square separated by a margin, the same layout as the gui.
+    """
+    block = cell_size + margin
+
+    def axis(length):
+        index = numpy.arange(length * block + margin) - margin
+        inside = (index >= 0) & (index % block < cell_size)
+        return numpy.clip(index // block, 0, length - 1), inside
+
+    rows, inside_rows = axis(codes.shape[0])
+    cols, inside_cols = axis(codes.shape[1])
+    image = codes[rows][:, cols]
+    image[~(inside_rows[:, None] & inside_cols[None, :])] = MARGIN
+    return image
+
+
+def to_rgb(image):
+    """Convert an image of palette codes into an RGB (height, width, 3) array
+    """
+    return palette()[image]
+
+
+def write_png(path, image):
+    """Write an image of palette codes to an indexed (palette) png, using
+       only the standard library. Every row is stored without a filter.
+    """
+    height, width = image.shape
+    raw = numpy.zeros((height, width + 1), dtype=numpy.uint8)
+    raw[:, 1:] = image
+
+    def chunk(kind, data):
+        body = kind + data
+        return (
+            struct.pack(">I", len(data))
+            + body
+            + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+        )
+
+    with open(path, "wb") as filey:
+        filey.write(b"\x89PNG\r\n\x1a\n")
+        filey.write(
+            chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0))
+        )
+        filey.write(chunk(b"PLTE", palette().tobytes()))
+        filey.write(chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)))
+        filey.write(chunk(b"IEND", b""))
+    return path
+
+
+def write_gif(path, images, duration=200):
+    """Write a list of palette code images to an animated gif. This requires
+       Pillow, duration is the time to show each frame (milliseconds).
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        sys.exit("You must install Pillow to export an animated gif.")
+
+    colors = palette().flatten().tolist()
+    frames = []
+    for image in images:
+        frame = Image.fromarray(image, mode="P")
+        frame.putpalette(colors)
+        frames.append(frame)
+
+    frames[0].save(
+        path, save_all=True, append_images=frames[1:], duration=duration, loop=0
+    )
+    return path
+
+
+def record_frames(simulation, days=100, every=1, select=None):
+    """Run a simulation for some number of days, and record the palette codes
+       for the selected days. By default we record every day, or every Nth
+       (every) day, or only the days in select. Returns a list of (day, codes).
+    """
+    select = set(select) if select is not None else None
+    frames = []
+    for day in range(days):
+        simulation.run_day()
+        if select is not None and day not in select:
+            continue
+        if select is None and day % every != 0:
+            continue
+        frames.append((day, grid_codes(simulation)))
+    return frames
+
+
+def _render_batch(batch):
+    """Render a batch of frames to png (run in a worker)
+    """
+    paths = []
+    for path, codes, cell_size, margin in batch:
+        paths.append(write_png(path, scale_codes(codes, cell_size, margin)))
+    return paths
+
+
+def export_frames(
+    frames,
+    outdir,
+    prefix="day",
+    cell_size=10,
+    margin=1,
+    gif=None,
+    duration=200,
+    workers=None,
+    batch_size=25,
+):
+    """Export recorded frames (from record_frames) to a sequence of png
+       images in outdir. If gif is defined, frames are also written to an
+       animated gif at that path. Frames are encoded in batches, and if
+       workers is greater than 1, from a pool of processes.
+
+       Parameters
+       ==========
+       frames: a list of (day, codes) from record_frames
+       outdir: the output directory for png images (created if needed)
+       workers: the number of worker processes (None or 1 runs in serial)
+       batch_size: the number of frames to hand a worker at once
+    """
+    if not os.path.exists(outdir):
+        os.makedirs(outdir)
+
+    width = len(str(max([day for day, _ in frames] or [0])))
+    jobs = [
+        (
+            os.path.join(outdir, "%s-%s.png" % (prefix, str(day).zfill(width))),
+            codes,
+            cell_size,
+            margin,
+        )
+        for day, codes in frames
+    ]
+    batches = [jobs[i : i + batch_size] for i in range(0, len(jobs), batch_size)]
+
+    if workers and workers > 1:
+        with Pool(workers) as pool:
+            results = pool.map(_render_batch, batches)
+    else:
+        results = [_render_batch(batch) for batch in batches]
+    paths = [path for result in results for path in result]
+
+    if gif and frames:
+        images = [scale_codes(codes, cell_size, margin) for _, codes in frames]
+        write_gif(gif, images, duration=duration)
+    return paths
@@ -0,0 +1,355 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+from contextlib import redirect_stdout
+from itertools import chain
+from multiprocessing import Pool
+import datetime
+import json
+import os
+import sqlite3
+
+# The DinosaurDilemma constructor arguments recorded for a run, with the
+# values the simulation used (see run_parameters)
+PARAMETERS = [
+    "seed",
+    "days_left_season",
+    "season",
+    "days_in_season",
+    "number_dinos",
+    "number_trees",
+    "max_temperature",
+    "min_temperature",
+    "grid_size",
+]
+
+# Metrics recorded for each day of a run. Days are numbered from 1, the state
+# of a simulation when it starts (before the first day is run)
+METRICS = [
+    "season",
+    "temperature",
+    "humidity",
+    "dinosaurs",
+    "trees",
+    "mean_hunger",
+    "mean_height",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    created TEXT,
+    days INTEGER,
+    seed INTEGER,
+    days_left_season INTEGER,
+    season TEXT,
+    days_in_season INTEGER,
+    number_dinos INTEGER,
+    number_trees INTEGER,
+    max_temperature INTEGER,
+    min_temperature INTEGER,
+    grid_size INTEGER,
+    recording TEXT
+);
+CREATE TABLE IF NOT EXISTS days (
+    run_id INTEGER,
+    day INTEGER,
+    season TEXT,
+    temperature INTEGER,
+    humidity REAL,
+    dinosaurs INTEGER,
+    trees INTEGER,
+    mean_hunger REAL,
+    mean_height REAL,
+    PRIMARY KEY (run_id, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS entities (
+    run_id INTEGER,
+    uid INTEGER,
+    day INTEGER,
+    species INTEGER,
+    x INTEGER,
+    y INTEGER,
+    value REAL,
+    PRIMARY KEY (run_id, uid, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS outcomes (
+    run_id INTEGER PRIMARY KEY,
+    days INTEGER,
+    dinosaurs INTEGER,
+    trees INTEGER
+);
+"""
+
+
+class ResultsStore:
+    """A ResultsStore is a local sqlite database of runs (parameters, and
+       the recording policy as json), per day metrics, tracked entities,
+       and final outcomes. It is meant to have a single writer: workers hand
+       their results to the process that owns the store, which writes them
+       in bulk, one transaction per batch. The database uses write ahead
+       logging so it can be read while written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+        # Stores written before runs had a recording policy get the column
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(runs)")]
+        if "recording" not in columns:
+            with self.db:
+                self.db.execute("ALTER TABLE runs ADD COLUMN recording TEXT")
+
+    def __str__(self):
+        return "[results-store:%s]" % self.path
+
+    def __repr__(self):
+        return self.__str__()
+
+    def add_runs(self, results):
+        """Add a batch of results in one transaction. Each result is a tuple
+           of (params, days, outcome, entities) as returned by run_replicate
+           (entities can be left out). Returns the list of new run ids.
+        """
+        created = datetime.datetime.now().isoformat()
+        columns = ["created"] + PARAMETERS + ["days", "recording"]
+        insert_run = "INSERT INTO runs (%s) VALUES (%s)" % (
+            ", ".join(columns),
+            ", ".join("?" * len(columns)),
+        )
+        insert_day = "INSERT INTO days VALUES (%s)" % ", ".join(
+            "?" * (len(METRICS) + 2)
+        )
+
+        run_ids = []
+        with self.db:
+            for params, days, outcome, *entities in results:
+                cursor = self.db.execute(
+                    insert_run,
+                    [created]
+                    + [params.get(name) for name in PARAMETERS]
+                    + [outcome["days"], json.dumps(params.get("recording"))],
+                )
+                run_id = cursor.lastrowid
+                self.db.executemany(
+                    insert_day, ((run_id,) + tuple(day) for day in days)
+                )
+                self.db.executemany(
+                    "INSERT INTO entities VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        (run_id, uid, day, species, x, y, value)
+                        for day, uid, species, x, y, value in chain(*entities)
+                    ),
+                )
+                self.db.execute(
+                    "INSERT INTO outcomes VALUES (?, ?, ?, ?)",
+                    (run_id, outcome["days"], outcome["dinosaurs"], outcome["trees"]),
+                )
+                run_ids.append(run_id)
+        return run_ids
+
+    def runs(self):
+        """Return a list of runs (as dictionaries) with their outcomes, and
+           recording policy (a dictionary, or None if it is not known)
+        """
+        cursor = self.db.execute(
+            "SELECT runs.*, outcomes.dinosaurs, outcomes.trees FROM runs "
+            "LEFT JOIN outcomes ON runs.id = outcomes.run_id ORDER BY runs.id"
+        )
+        names = [column[0] for column in cursor.description]
+        names[-2:] = ["final_dinosaurs", "final_trees"]
+        runs = [dict(zip(names, row)) for row in cursor]
+        for run in runs:
+            run["recording"] = json.loads(run["recording"] or "null")
+        return runs
+
+    def days(self, run_id):
+        """Return the per day metrics for a run, a list of dictionaries
+        """
+        cursor = self.db.execute(
+            "SELECT * FROM days WHERE run_id = ? ORDER BY day", (run_id,)
+        )
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+    def entities(self, run_id, uid=None):
+        """Return the days of tracked entities for a run (or one entity, by
+           uid), a list of dictionaries
+        """
+        query = "SELECT * FROM entities WHERE run_id = ?"
+        args = (run_id,)
+        if uid is not None:
+            query += " AND uid = ?"
+            args += (uid,)
+        cursor = self.db.execute(query + " ORDER BY uid, day", args)
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+    def summary(self):
+        """Summarize the outcomes across all runs
+        """
+        row = self.db.execute(
+            "SELECT COUNT(*), AVG(days), AVG(dinosaurs), MIN(dinosaurs), "
+            "MAX(dinosaurs), AVG(trees), MIN(trees), MAX(trees), "
+            "SUM(dinosaurs = 0) FROM outcomes"
+        ).fetchone()
+        names = [
+            "runs",
+            "mean_days",
+            "mean_dinosaurs",
+            "min_dinosaurs",
+            "max_dinosaurs",
+            "mean_trees",
+            "min_trees",
+            "max_trees",
+            "extinct_dinosaurs",
+        ]
+        summary = dict(zip(names, row))
+        summary["days"] = self.db.execute("SELECT COUNT(*) FROM days").fetchone()[0]
+        return summary
+
+    def close(self):
+        self.db.close()
+
+
+def day_metrics(simulation):
+    """Return the tuple of METRICS for the current day of a simulation
+    """
+    stats = simulation.stats()
+    hunger = stats.get("Dinosaur", {}).get("hunger", {}).get("mean")
+    height = stats.get("AvocadoTree", {}).get("height", {}).get("mean")
+    return (
+        simulation.day,
+        simulation.season,
+        int(simulation.temperature),
+        float(simulation.humidity),
+        simulation.dinosaurs.count,
+        simulation.trees.count,
+        hunger if simulation.dinosaurs.count else None,
+        height if simulation.trees.count else None,
+    )
+
+
+def run_parameters(simulation):
+    """Return the PARAMETERS of a run as the simulation used them, so values
+       that were left to chance (e.g., the season and number of entities)
+       are recorded too. The season and days left in it are as of day 1,
+       when a simulation starts.
+    """
+    return {
+        "seed": simulation.seed,
+        "days_left_season": simulation.days_left_season,
+        "season": simulation.season,
+        "days_in_season": simulation.days_in_season,
+        "number_dinos": simulation.dinosaurs.count,
+        "number_trees": simulation.trees.count,
+        "max_temperature": simulation.max_temperature,
+        "min_temperature": simulation.min_temperature,
+        "grid_size": simulation.grid_size,
+    }
+
+
+def run_replicate(params):
+    """Run one simulation (in a worker) for params["days"] days, with the
+       rest of params passed to DinosaurDilemma, except params["recording"]
+       (arguments for a dinolemma.recording.Recorder, by default every day
+       is kept). The simulation is quiet, and any other output is discarded. Returns (params, days,
+       outcome, entities), where params has the values the simulation used,
+       and the recording policy (see Recorder.policy).
+    """
+    from dinolemma.game import DinosaurDilemma
+    from dinolemma.recording import Recorder
+
+    params = dict(params)
+    number_days = params.pop("days", 100)
+    recorder = Recorder(seed=params.get("seed"), **params.pop("recording", {}))
+
+    updates = 0
+    with open(os.devnull, "w") as null, redirect_stdout(null):
+        simulation = DinosaurDilemma(quiet=True, **params)
+        params.update(run_parameters(simulation))
+        recorder.start(simulation, number_days)
+        params["recording"] = recorder.policy()
+        for _ in range(number_days):
+            simulation.run_day()
+            recorder.record(simulation)
+            updates += simulation.count_entities()
+
+    outcome = {
+        "days": number_days,
+        "dinosaurs": simulation.dinosaurs.count,
+        "trees": simulation.trees.count,
+        "updates": updates,
+    }
+    return params, recorder.days, outcome, recorder.entities
+
+
+def run_ensemble(
+    path,
+    runs=10,
+    days=100,
+    seed=None,
+    workers=None,
+    batch_size=10,
+    progress=None,
+    recording=None,
+    **kwargs
+):
+    """Run an ensemble of simulations, and write results to a ResultsStore
+       at path. Each run uses seed + i (if a seed is given) and any other
+       DinosaurDilemma arguments in kwargs. Runs are done by a pool of
+       workers, and the calling process is the single writer, adding
+       results in batches of batch_size runs per transaction. What each run
+       keeps is set by recording (arguments for a Recorder, see
+       dinolemma.recording), and a progress (dinolemma.progress.Progress,
+       of runs) is updated as runs finish.
+    """
+    jobs = []
+    for i in range(runs):
+        params = dict(kwargs, days=days)
+        params["seed"] = seed + i if seed is not None else None
+        if recording:
+            params["recording"] = recording
+        jobs.append(params)
+
+    store = ResultsStore(path)
+    run_ids = []
+    batch = []
+
+    # If a run fails, the workers are stopped (and the store closed)
+    pool = Pool(workers) if workers and workers > 1 else None
+    try:
+        results = (
+            pool.imap_unordered(run_replicate, jobs)
+            if pool
+            else map(run_replicate, jobs)
+        )
+        for result in results:
+            batch.append(result)
+            if progress is not None:
+                progress.update(1, result[2]["updates"])
+            if len(batch) >= batch_size:
+                run_ids += store.add_runs(batch)
+                batch = []
+        run_ids += store.add_runs(batch)
+    except BaseException:
+        if pool:
+            pool.terminate()
+        raise
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        store.close()
+    return run_ids
@@ -0,0 +1,142 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+import numpy
+import random
+
+# Streams are counter based: the n-th draw of the stream for (seed, day, uid)
+# is a hash (splitmix64) of the key and n, so a draw never depends on how many
+# other entities drew before it, or in which process or thread they did. An
+# engine reproduces a seeded run_day exactly only if it makes the same draws
+# at the same positions, in the same phases: fast forward (advance) and
+# threads do. Synchronous days and dinolemma.batch have their own positions
+# and phases, so they are reproducible for a seed (and any number of threads
+# or worlds), but are not the same as run_day.
+MASK = 0xFFFFFFFFFFFFFFFF
+GOLDEN = 0x9E3779B97F4A7C15
+
+# The uid used for world (not entity) randomness, e.g., climate and order
+WORLD = MASK
+
+
+def _mix(z):
+    """The splitmix64 finalizer for a Python integer
+    """
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9 & MASK
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EB & MASK
+    return z ^ (z >> 31)
+
+
+def _mix_array(z):
+    """The splitmix64 finalizer for a numpy uint64 array (wraps on overflow)
+    """
+    z = (z ^ (z >> numpy.uint64(30))) * numpy.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> numpy.uint64(27))) * numpy.uint64(0x94D049BB133111EB)
+    return z ^ (z >> numpy.uint64(31))
+
+
+def day_key(seed, day):
+    """Derive the key shared by all streams on a given day
+    """
+    key = _mix((seed & MASK) ^ GOLDEN)
+    return _mix((key + (day & MASK)) & MASK)
+
+
+def stream_key(seed, day, uid):
+    """Derive the key for the stream of an entity (uid) on a given day
+    """
+    return _mix((day_key(seed, day) + (uid & MASK)) & MASK)
+
+
+def uniforms(seed, day, uids, counter=0):
+    """Vectorized draws for many entities at once: return the draw at position
+       counter of the stream for each uid, as a float64 array in [0, 1). This
+       is bit for bit the same as Stream(seed, day, uid) at that position.
+       The counter can also be an array (a position for each uid).
+    """
+    with numpy.errstate(over="ignore"):
+        uids = numpy.asarray(uids, dtype=numpy.int64).astype(numpy.uint64)
+        keys = _mix_array(numpy.uint64(day_key(seed, day)) + uids)
+        counter = numpy.asarray(counter, dtype=numpy.int64).astype(numpy.uint64)
+        values = _mix_array(keys + (counter + numpy.uint64(1)) * numpy.uint64(GOLDEN))
+    return (values >> numpy.uint64(11)).astype(numpy.float64) * (1.0 / (1 << 53))
+
+
+class Stream:
+    """A Stream is a counter based source of random numbers for one entity on
+       one day. It provides the subset of the random module interface that
+       the simulation uses (random, choice, choices and shuffle), so it can be
+       handed to entities in place of the module.
+    """
+
+    __slots__ = ("key", "counter")
+
+    def __init__(self, seed, day, uid):
+        self.key = stream_key(seed, day, uid)
+        self.counter = 0
+
+    def random(self):
+        """Return the next float in [0, 1)
+        """
+        self.counter += 1
+        value = _mix((self.key + self.counter * GOLDEN) & MASK)
+        return (value >> 11) * (1.0 / (1 << 53))
+
+    def choice(self, seq):
+        """Choose an element from a non-empty sequence
+        """
+        return seq[int(self.random() * len(seq))]
+
+    def choices(self, population, weights=None, k=1):
+        """Choose k elements (with replacement) optionally with weights
+        """
+        if weights is None:
+            return [self.choice(population) for _ in range(k)]
+        total = sum(weights)
+        selected = []
+        for _ in range(k):
+            value = self.random() * total
+            for item, weight in zip(population, weights):
+                value -= weight
+                if value < 0:
+                    break
+            selected.append(item)
+        return selected
+
+    def shuffle(self, x):
+        """Shuffle a list in place (Fisher-Yates)
+        """
+        for i in reversed(range(1, len(x))):
+            j = int(self.random() * (i + 1))
+            x[i], x[j] = x[j], x[i]
+
+
+class RandomStreams:
+    """RandomStreams hands out the random stream for the world or an entity on
+       a given day. Without a seed, every stream is the global random module,
+       so an unseeded simulation behaves as it always has.
+    """
+
+    def __init__(self, seed=None):
+        self.seed = seed
+
+    def world(self, day):
+        """Return the stream for world level randomness (e.g., climate)
+        """
+        if self.seed is None:
+            return random
+        return Stream(self.seed, day, WORLD)
+
+    def entity(self, day, uid):
+        """Return the stream for an entity (by uid) on a day
+        """
+        if self.seed is None:
+            return random
+        return Stream(self.seed, day, uid)
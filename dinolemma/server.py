@@ -0,0 +1,308 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Pipe, Process
+from urllib.parse import urlparse, parse_qs
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+
+# The DinosaurDilemma arguments a client can set when creating a session
+# (others, like grid_file, would let a client write to the server's files)
+SESSION_PARAMETERS = [
+    "seed",
+    "days_left_season",
+    "season",
+    "days_in_season",
+    "number_dinos",
+    "number_trees",
+    "max_temperature",
+    "min_temperature",
+    "grid_size",
+    "foraging",
+    "synchronous",
+]
+
+
+def session_parameters(body):
+    """Parse the (json) body of a request to create a session, and return
+       the DinosaurDilemma arguments. A ValueError (or TypeError) is raised
+       if it is not a json object of SESSION_PARAMETERS.
+    """
+    params = json.loads(body or b"{}")
+    if not isinstance(params, dict):
+        raise TypeError("The body must be a json object")
+    unknown = sorted(set(params) - set(SESSION_PARAMETERS))
+    if unknown:
+        raise ValueError("Unknown parameters %s" % ", ".join(unknown))
+    return params
+
+
+def snapshot(simulation, grid=True):
+    """Return a json serializable snapshot of a simulation. The grid is
+       a list of rows of codes (0 empty, 1 tree, 2 dinosaur).
+    """
+    from dinolemma.render import grid_codes
+
+    result = {
+        "day": simulation.day,
+        "season": simulation.season,
+        "days_left_season": simulation.days_left_season,
+        "temperature": int(simulation.temperature),
+        "humidity": float(simulation.humidity),
+        "dinosaurs": simulation.dinosaurs.count,
+        "trees": simulation.trees.count,
+        "counts": simulation.counts,
+        "summary": simulation.summary(return_summary=True),
+    }
+    if grid:
+        result["grid"] = grid_codes(simulation).tolist()
+    return result
+
+
+class Worker:
+    """A Worker holds the sessions pinned to one process. In memory sessions
+       that have been idle for more than idle seconds are evicted to a
+       checkpoint (in checkpoints) and transparently loaded on next use.
+    """
+
+    def __init__(self, checkpoints, idle=300):
+        self.checkpoints = checkpoints
+        self.idle = idle
+        self.sessions = {}
+        self.used = {}
+
+    def checkpoint(self, session_id):
+        return os.path.join(self.checkpoints, "%s.pkl" % session_id)
+
+    def get(self, session_id):
+        """Get a session, loading it from a checkpoint if it was evicted
+        """
+        from dinolemma.game import DinosaurDilemma
+
+        if session_id not in self.sessions:
+            path = self.checkpoint(session_id)
+            if not os.path.exists(path):
+                raise KeyError(session_id)
+            self.sessions[session_id] = DinosaurDilemma.load(path)
+            os.remove(path)
+        self.used[session_id] = time.time()
+        return self.sessions[session_id]
+
+    def evict(self):
+        """Checkpoint and drop sessions that have been idle too long
+        """
+        now = time.time()
+        for session_id, used in list(self.used.items()):
+            if now - used > self.idle and session_id in self.sessions:
+                self.sessions.pop(session_id).save(self.checkpoint(session_id))
+                del self.used[session_id]
+
+    def handle(self, command, session_id, params):
+        """Handle one command for a session, and return a result
+        """
+        from dinolemma.game import DinosaurDilemma
+
+        if command == "create":
+            self.sessions[session_id] = DinosaurDilemma(**params)
+            self.used[session_id] = time.time()
+            return snapshot(self.sessions[session_id], grid=False)
+
+        if command == "delete":
+            self.sessions.pop(session_id, None)
+            self.used.pop(session_id, None)
+            path = self.checkpoint(session_id)
+            if os.path.exists(path):
+                os.remove(path)
+            return {"deleted": session_id}
+
+        simulation = self.get(session_id)
+        if command == "step":
+            for _ in range(int(params.get("days", 1))):
+                simulation.run_day()
+            return snapshot(simulation, grid=params.get("grid", False))
+
+        if command == "snapshot":
+            return snapshot(simulation)
+        raise ValueError("Unknown command %s" % command)
+
+    def serve(self, connection):
+        """The worker process loop: handle commands from the connection,
+           and check for idle sessions whenever there is nothing to do.
+        """
+        with open(os.devnull, "w") as null:
+            sys.stdout = null
+            while True:
+                if not connection.poll(min(self.idle, 5)):
+                    self.evict()
+                    continue
+                message = connection.recv()
+                if message is None:
+                    break
+                try:
+                    connection.send((True, self.handle(*message)))
+                except Exception as exc:
+                    connection.send((False, "%s: %s" % (type(exc).__name__, exc)))
+                self.evict()
+
+
+def _serve(connection, checkpoints, idle):
+    """The target of a worker process. Interrupts (Ctrl+C) are left to the
+       server, which shuts workers down in order.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    Worker(checkpoints, idle).serve(connection)
+
+
+class SimulationServer:
+    """A SimulationServer creates, steps, snapshots and deletes simulation
+       sessions (by id) over http on localhost. Each session is pinned to
+       one of a pool of worker processes (the least loaded when it is
+       created), so a heavy world only delays sessions on its own worker.
+       Requests to different workers are handled concurrently.
+
+       POST   /sessions                 create (json body: SESSION_PARAMETERS)
+       GET    /sessions                 list session ids
+       POST   /sessions/<id>/step       step ?days=N (&grid=1 for the grid)
+       GET    /sessions/<id>            snapshot (including the grid)
+       DELETE /sessions/<id>            delete
+    """
+
+    def __init__(
+        self, port=8080, host="127.0.0.1", workers=4, checkpoints=None, idle=300
+    ):
+        self.checkpoints = checkpoints or tempfile.mkdtemp(prefix="dinolemma-")
+        if not os.path.exists(self.checkpoints):
+            os.makedirs(self.checkpoints)
+
+        self.workers = []
+        for _ in range(workers):
+            parent, child = Pipe()
+            process = Process(
+                target=_serve, args=(child, self.checkpoints, idle), daemon=True
+            )
+            process.start()
+            self.workers.append((parent, threading.Lock(), process))
+
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+
+    def call(self, worker, command, session_id, params=None):
+        """Send a command to a worker and wait for the result
+        """
+        connection, lock, _ = self.workers[worker]
+        with lock:
+            connection.send((command, session_id, params or {}))
+            return connection.recv()
+
+    def create(self, params):
+        session_id = uuid.uuid4().hex
+        with self.lock:
+            loads = [0] * len(self.workers)
+            for worker in self.sessions.values():
+                loads[worker] += 1
+            worker = loads.index(min(loads))
+            self.sessions[session_id] = worker
+        ok, result = self.call(worker, "create", session_id, params)
+        if not ok:
+            with self.lock:
+                del self.sessions[session_id]
+            return ok, result
+        result["id"] = session_id
+        return ok, result
+
+    def request(self, command, session_id, params=None):
+        worker = self.sessions.get(session_id)
+        if worker is None:
+            return False, "KeyError: %s" % session_id
+        ok, result = self.call(worker, command, session_id, params)
+        if ok and command == "delete":
+            with self.lock:
+                self.sessions.pop(session_id, None)
+        return ok, result
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def respond(self, ok, result):
+                status = 200 if ok else (404 if result.startswith("KeyError") else 400)
+                body = json.dumps(result if ok else {"error": result}).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def route(self):
+                url = urlparse(self.path)
+                parts = [part for part in url.path.split("/") if part]
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                if not parts or parts[0] != "sessions":
+                    return None, None, query
+                return (parts[1] if len(parts) > 1 else None), parts[2:], query
+
+            def do_GET(self):
+                session_id, action, _ = self.route()
+                if session_id is None:
+                    return self.respond(True, {"sessions": list(server.sessions)})
+                self.respond(*server.request("snapshot", session_id))
+
+            def do_POST(self):
+                session_id, action, query = self.route()
+
+                # A malformed body or query is a bad request (400)
+                try:
+                    if session_id is None:
+                        length = int(self.headers.get("Content-Length") or 0)
+                        params = session_parameters(self.rfile.read(length))
+                        return self.respond(*server.create(params))
+                    if action == ["step"]:
+                        params = {
+                            "days": int(query.get("days", 1)),
+                            "grid": query.get("grid") in ["1", "true"],
+                        }
+                        return self.respond(*server.request("step", session_id, params))
+                except (ValueError, TypeError) as exc:
+                    return self.respond(False, "%s: %s" % (type(exc).__name__, exc))
+                self.respond(False, "Unknown action %s" % "/".join(action))
+
+            def do_DELETE(self):
+                session_id, _, _ = self.route()
+                self.respond(*server.request("delete", session_id))
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def serve_forever(self):
+        host, port = self.httpd.server_address[:2]
+        print("Serving simulations on http://%s:%s" % (host, port))
+        try:
+            self.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        self.shutdown()
+
+    def shutdown(self):
+        for connection, lock, process in self.workers:
+            with lock:
+                connection.send(None)
+            process.join()
+        self.httpd.server_close()
@@ -0,0 +1,156 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+import heapq
+
+
+class SpatialIndex:
+    """A SpatialIndex holds the positions of entities in a uniform grid of
+       buckets (cell x cell squares of the world), by species code, so that
+       queries only look at the buckets around a point instead of every
+       entity. The simulation keeps it in sync as entities are placed, move,
+       are born and are removed. Distances are manhattan (the number of
+       moves between cells), and ties are broken by uid, so results are
+       reproducible.
+    """
+
+    def __init__(self, size, cell=8):
+        self.size = size
+        self.cell = cell
+        self.buckets = {}
+        self.keys = {}
+        self.codes = set()
+
+    def __str__(self):
+        return "[spatial-index:%s]" % len(self.keys)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, entity):
+        return entity.uid in self.keys
+
+    def _key(self, entity):
+        return (entity.code, entity.x // self.cell, entity.y // self.cell)
+
+    def update(self, entity):
+        """Add an entity (on the grid), or move it to the bucket for its
+           current location if it has changed
+        """
+        key = self._key(entity)
+        if self.keys.get(entity.uid) != key:
+            self.remove(entity)
+            self.buckets.setdefault(key, {})[entity.uid] = entity
+            self.keys[entity.uid] = key
+            self.codes.add(entity.code)
+
+    def remove(self, entity):
+        """Remove an entity (if it is indexed)
+        """
+        key = self.keys.pop(entity.uid, None)
+        if key is not None:
+            bucket = self.buckets[key]
+            del bucket[entity.uid]
+            if not bucket:
+                del self.buckets[key]
+
+    def _entities(self, codes, bx, by):
+        for code in codes:
+            bucket = self.buckets.get((code, bx, by))
+            if bucket:
+                yield from bucket.values()
+
+    def _codes(self, codes):
+        if codes is None:
+            return self.codes
+        if isinstance(codes, int):
+            return [codes]
+        return codes
+
+    def nearest(self, x, y, k=1, codes=None, where=None):
+        """Return (up to) the k nearest entities to x, y, as a list of
+           (distance, entity), optionally only of species codes (a code or
+           list of codes) and for which where (a function of the entity)
+           is True. Buckets are searched in rings around the point, until
+           no entity further out could be nearer.
+        """
+        codes = self._codes(codes)
+        bx, by = x // self.cell, y // self.cell
+        rings = self.size // self.cell + 1
+        found = []
+
+        for ring in range(rings + 1):
+            for cx in range(bx - ring, bx + ring + 1):
+                for cy in range(by - ring, by + ring + 1):
+                    if max(abs(cx - bx), abs(cy - by)) != ring:
+                        continue
+                    for entity in self._entities(codes, cx, cy):
+                        if where is None or where(entity):
+                            distance = abs(entity.x - x) + abs(entity.y - y)
+                            found.append((distance, entity.uid, entity))
+
+            # Anything outside the rings searched is at least this far away
+            bound = (
+                min(
+                    x - (bx - ring) * self.cell,
+                    (bx + ring + 1) * self.cell - 1 - x,
+                    y - (by - ring) * self.cell,
+                    (by + ring + 1) * self.cell - 1 - y,
+                )
+                + 1
+            )
+            if len(found) >= k and heapq.nsmallest(k, found)[-1][0] < bound:
+                break
+
+        return [(distance, entity) for distance, _, entity in heapq.nsmallest(k, found)]
+
+    def within(self, x, y, radius, codes=None, where=None):
+        """Return the entities within a (manhattan) radius of x, y, as a
+           sorted list of (distance, entity)
+        """
+        codes = self._codes(codes)
+        found = []
+        for cx in range((x - radius) // self.cell, (x + radius) // self.cell + 1):
+            for cy in range((y - radius) // self.cell, (y + radius) // self.cell + 1):
+                for entity in self._entities(codes, cx, cy):
+                    distance = abs(entity.x - x) + abs(entity.y - y)
+                    if distance <= radius and (where is None or where(entity)):
+                        found.append((distance, entity.uid, entity))
+        return [(distance, entity) for distance, _, entity in sorted(found)]
+
+    def count(self, x0, y0, x1, y1, codes=None):
+        """Count the entities in a region (from x0, y0 to x1, y1 inclusive).
+           Buckets entirely inside the region are counted without looking
+           at their entities.
+        """
+        codes = self._codes(codes)
+        total = 0
+        for cx in range(x0 // self.cell, x1 // self.cell + 1):
+            for cy in range(y0 // self.cell, y1 // self.cell + 1):
+                inside = (
+                    cx * self.cell >= x0
+                    and (cx + 1) * self.cell - 1 <= x1
+                    and cy * self.cell >= y0
+                    and (cy + 1) * self.cell - 1 <= y1
+                )
+                for code in codes:
+                    bucket = self.buckets.get((code, cx, cy), {})
+                    if inside:
+                        total += len(bucket)
+                        continue
+                    total += sum(
+                        1
+                        for e in bucket.values()
+                        if x0 <= e.x <= x1 and y0 <= e.y <= y1
+                    )
+        return total
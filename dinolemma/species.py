@@ -0,0 +1,59 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+from collections import namedtuple
+
+# A species is a Group (and Entity) class registered under an integer code
+Species = namedtuple(
+    "Species", ["code", "name", "Group", "Entity", "color", "capabilities"]
+)
+
+# Registered species, by code. 0 is an empty cell, and 255 is reserved
+# (e.g., for the margin of a rendered grid)
+SPECIES = {}
+
+# Codes of the built in species
+TREE = 1
+DINOSAUR = 2
+
+
+def register(code, Entity, color, name=None, capabilities=()):
+    """Register a Group subclass (used as a class decorator) as a species
+       with an integer code, the class of its entities, a color (rgb, for
+       rendering), a name, and capabilities (e.g., "move" for a species
+       that moves). The code is set on the Group and Entity classes, so a simulation can
+       look up the group of any entity (or name on the grid) by its code.
+       Interactions are given by the Entity class (_interactions, keyed by
+       the code of the other species), as functions of the two entities,
+       rng and quiet (see dinolemma.interactions).
+    """
+    if not 0 < code < 255:
+        raise ValueError("A species code must be between 1 and 254.")
+
+    def decorator(Group):
+        if code in SPECIES and SPECIES[code].Group is not Group:
+            raise ValueError(
+                "Species code %s is already %s" % (code, SPECIES[code].name)
+            )
+        Group.code = Entity.code = code
+        SPECIES[code] = Species(
+            code, name or Group.__name__, Group, Entity, color, tuple(capabilities)
+        )
+        return Group
+
+    return decorator
+
+
+def get_species(code):
+    """Return a registered species by code
+    """
+    if code not in SPECIES:
+        raise ValueError("There is no species with code %s" % code)
+    return SPECIES[code]
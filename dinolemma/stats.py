@@ -0,0 +1,239 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+import math
+
+# Fixed histogram bins (low, high, number of bins) per tracked attribute,
+# values outside of the range are counted as underflow or overflow
+BINS = {
+    "hunger": (0, 1, 20),
+    "size": (0, 1, 20),
+    "height": (0, 1, 20),
+    "avocados": (0, 100, 20),
+}
+
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+class RunningStats:
+    """Online mean and variance (Welford), with support for removing a value
+       that was previously added (so a changed value is a remove and an add).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def remove(self, value):
+        if self.count <= 1:
+            self.__init__()
+            return
+        self.count -= 1
+        delta = value - self.mean
+        self.mean -= delta / self.count
+        self.m2 = max(0.0, self.m2 - delta * (value - self.mean))
+
+    @property
+    def variance(self):
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+class Histogram:
+    """A histogram with fixed, equal width bins between low and high
+    """
+
+    def __init__(self, low, high, bins):
+        self.low = low
+        self.high = high
+        self.width = (high - low) / bins
+        self.counts = [0] * bins
+        self.underflow = 0
+        self.overflow = 0
+
+    def _update(self, value, count):
+        if value < self.low:
+            self.underflow += count
+        elif value >= self.high:
+            self.overflow += count
+        else:
+            self.counts[int((value - self.low) / self.width)] += count
+
+    def add(self, value):
+        self._update(value, 1)
+
+    def remove(self, value):
+        self._update(value, -1)
+
+    @property
+    def edges(self):
+        return [self.low + i * self.width for i in range(len(self.counts) + 1)]
+
+
+class QuantileSketch:
+    """An approximate quantile sketch (in the style of DDSketch). Values are
+       counted in logarithmic buckets, so any quantile is returned within a
+       relative error (accuracy) of the true value. Because buckets are only
+       counts, values can be removed as well as added.
+    """
+
+    def __init__(self, accuracy=0.01):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+
+    def _bucket(self, value):
+        return int(math.ceil(math.log(abs(value)) / self.log_gamma))
+
+    def _update(self, value, count):
+        self.count += count
+        if value == 0:
+            self.zeros += count
+            return
+        store = self.positive if value > 0 else self.negative
+        bucket = self._bucket(value)
+        store[bucket] = store.get(bucket, 0) + count
+        if not store[bucket]:
+            del store[bucket]
+
+    def add(self, value):
+        self._update(value, 1)
+
+    def remove(self, value):
+        self._update(value, -1)
+
+    def _value(self, bucket):
+        return 2 * self.gamma ** bucket / (1 + self.gamma)
+
+    def quantile(self, q):
+        """Return the approximate value at quantile q (0 to 1)
+        """
+        if self.count <= 0:
+            return None
+        rank = q * (self.count - 1)
+
+        seen = 0
+        for bucket in sorted(self.negative, reverse=True):
+            seen += self.negative[bucket]
+            if seen > rank:
+                return -self._value(bucket)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for bucket in sorted(self.positive):
+            seen += self.positive[bucket]
+            if seen > rank:
+                return self._value(bucket)
+        return self._value(max(self.positive))
+
+
+class Summary:
+    """A Summary holds the streaming statistics for one attribute
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.running = RunningStats()
+        self.histogram = Histogram(*BINS.get(name, (0, 1, 20)))
+        self.sketch = QuantileSketch()
+
+    def add(self, value):
+        self.running.add(value)
+        self.histogram.add(value)
+        self.sketch.add(value)
+
+    def remove(self, value):
+        self.running.remove(value)
+        self.histogram.remove(value)
+        self.sketch.remove(value)
+
+    def export(self):
+        return {
+            "count": self.running.count,
+            "mean": self.running.mean,
+            "variance": self.running.variance,
+            "std": self.running.std,
+            "histogram": {
+                "edges": self.histogram.edges,
+                "counts": list(self.histogram.counts),
+                "underflow": self.histogram.underflow,
+                "overflow": self.histogram.overflow,
+            },
+            "quantiles": {q: self.sketch.quantile(q) for q in QUANTILES},
+        }
+
+
+class PopulationStats:
+    """PopulationStats maintains streaming statistics for the tracked
+       attributes of each entity type (Entity.tracked). The simulation calls
+       observe when an entity is born, update when it may have changed, and
+       forget when it is removed, so the cost is proportional to the changes
+       in a day, and never requires a scan of the population.
+    """
+
+    def __init__(self):
+        self.summaries = {}
+        self.values = {}
+
+    def observe(self, entity):
+        """Record the current values of an entity (replacing the last ones)
+        """
+        values = tuple(float(getattr(entity, name)) for name in entity.tracked)
+        last = self.values.get(entity.uid)
+        if last == values:
+            return
+
+        summaries = self.summaries.get(entity.type)
+        if summaries is None:
+            summaries = [Summary(name) for name in entity.tracked]
+            self.summaries[entity.type] = summaries
+
+        for i, summary in enumerate(summaries):
+            if last is not None:
+                summary.remove(last[i])
+            summary.add(values[i])
+        self.values[entity.uid] = values
+
+    def update(self, entity):
+        """Update the values of an entity that is already observed (an entity
+           that has been forgotten, e.g., killed during its turn, is skipped)
+        """
+        if entity.uid in self.values:
+            self.observe(entity)
+
+    def forget(self, entity):
+        """Remove the last recorded values of an entity
+        """
+        last = self.values.pop(entity.uid, None)
+        if last is None:
+            return
+        for i, summary in enumerate(self.summaries[entity.type]):
+            summary.remove(last[i])
+
+    def export(self):
+        """Export statistics, by entity type and then attribute
+        """
+        return {
+            entity_type: {summary.name: summary.export() for summary in summaries}
+            for entity_type, summaries in self.summaries.items()
+        }
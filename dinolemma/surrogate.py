@@ -0,0 +1,271 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+from dinolemma.batch import SEASONS
+import json
+import numpy
+
+# The features of the per capita daily growth rate of each species: an
+# intercept for each season, and the density (per grid cell) of each species
+FEATURES = SEASONS + ["dinosaur_density", "tree_density"]
+
+
+def season_schedule(season, days_left_season, days_in_season, days):
+    """Return the season (index in SEASONS) of each of the next days, using
+       the same clock as DinosaurDilemma.newday.
+    """
+    index = SEASONS.index(season)
+    schedule = []
+    for _ in range(days):
+        if days_left_season == 0:
+            index = (index + 1) % len(SEASONS)
+            days_left_season = days_in_season
+        days_left_season -= 1
+        schedule.append(index)
+    return schedule
+
+
+def daily_seasons(run, days):
+    """Return the season (index in SEASONS) of every day of a run, from the
+       first recorded day to the last, as stores can keep only some days
+       (see dinolemma.recording). If the first day is day 1 the clock is
+       run from the recorded parameters (which are as of day 1), otherwise
+       each recorded season is carried forward to the next recorded day.
+    """
+    first, last = days[0]["day"], days[-1]["day"]
+    clock = [run.get(name) for name in ["days_left_season", "days_in_season"]]
+    if first == 1 and run.get("season") in SEASONS and None not in clock:
+        return [SEASONS.index(run["season"])] + season_schedule(
+            run["season"], run["days_left_season"], run["days_in_season"], last - 1
+        )
+    seasons = []
+    for day, end in zip(days, [day["day"] for day in days[1:]] + [last + 1]):
+        seasons += [SEASONS.index(day["season"])] * (end - day["day"])
+    return seasons
+
+
+def load_runs(store):
+    """Load the recorded runs from a ResultsStore, as a list of dictionaries
+       with the run id, grid size, the recorded days and their counts, and
+       the season of every day from the first recorded day to the last.
+    """
+    runs = []
+    for run in store.runs():
+        days = store.days(run["id"])
+        if not days:
+            continue
+        runs.append(
+            {
+                "id": run["id"],
+                "grid_size": run["grid_size"],
+                "days": [day["day"] for day in days],
+                "seasons": daily_seasons(run, days),
+                "dinosaurs": [day["dinosaurs"] for day in days],
+                "trees": [day["trees"] for day in days],
+            }
+        )
+    return runs
+
+
+class MeanFieldModel:
+    """A MeanFieldModel is an aggregate (surrogate) model of the population:
+       instead of entities, it steps the number of dinosaurs and trees, with
+       a per capita daily growth rate for each species that is linear in the
+       FEATURES (the season, and the density of each species). The rates are
+       fitted by least squares from recorded agent based runs, so a forecast
+       is a few array operations per day for any number of scenarios at once.
+       It predicts expected counts, not the spread between runs.
+    """
+
+    def __init__(self, dinosaur_rates=None, tree_rates=None):
+        self.dinosaur_rates = numpy.zeros(len(FEATURES))
+        self.tree_rates = numpy.zeros(len(FEATURES))
+        if dinosaur_rates is not None:
+            self.dinosaur_rates = numpy.asarray(dinosaur_rates, dtype=float)
+        if tree_rates is not None:
+            self.tree_rates = numpy.asarray(tree_rates, dtype=float)
+
+    def __str__(self):
+        return "[mean-field-model]"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def features(self, seasons, dinosaurs, trees, grid_size):
+        """Return the feature matrix (n, FEATURES) for arrays of seasons and
+           counts (of length n). seasons can also be the share of days in
+           each season, (n, SEASONS).
+        """
+        cells = numpy.asarray(grid_size, dtype=float) ** 2
+        seasons = numpy.asarray(seasons)
+        X = numpy.zeros((len(seasons), len(FEATURES)))
+        if seasons.ndim == 2:
+            X[:, : len(SEASONS)] = seasons
+        else:
+            X[numpy.arange(len(seasons)), seasons] = 1
+        X[:, len(SEASONS)] = dinosaurs / cells
+        X[:, len(SEASONS) + 1] = trees / cells
+        return X
+
+    def fit(self, runs):
+        """Fit the growth rates from recorded runs (see load_runs). Each pair
+           of consecutive recorded days where a species is present is one
+           observation of its per capita growth. If days were skipped, the
+           growth is taken per day (the root of the growth over the gap),
+           with the share of each season over the gap, and the densities
+           of the first day.
+        """
+        X = {"dinosaurs": [], "trees": []}
+        y = {"dinosaurs": [], "trees": []}
+        for run in runs:
+            days = numpy.array(run["days"])
+            dinosaurs = numpy.array(run["dinosaurs"], dtype=float)
+            trees = numpy.array(run["trees"], dtype=float)
+
+            # Days in each season so far (from the first day), for the gaps
+            so_far = numpy.cumsum(numpy.eye(len(SEASONS))[run["seasons"]], axis=0)
+            start, end = days[:-1] - days[0], days[1:] - days[0]
+            gaps = (end - start)[:, None]
+            shares = (so_far[end] - so_far[start]) / gaps
+
+            features = self.features(
+                shares, dinosaurs[:-1], trees[:-1], run["grid_size"]
+            )
+            for name, counts in [("dinosaurs", dinosaurs), ("trees", trees)]:
+                present = counts[:-1] > 0
+                growth = counts[1:][present] / counts[:-1][present]
+                X[name].append(features[present])
+                y[name].append(growth ** (1 / gaps[present, 0]) - 1)
+
+        rates = {}
+        for name in ["dinosaurs", "trees"]:
+            if X[name]:
+                A = numpy.concatenate(X[name])
+                b = numpy.concatenate(y[name])
+                rates[name] = numpy.linalg.lstsq(A, b, rcond=None)[0]
+        self.dinosaur_rates = rates.get("dinosaurs", self.dinosaur_rates)
+        self.tree_rates = rates.get("trees", self.tree_rates)
+        return self
+
+    def predict(self, dinosaurs, trees, seasons, grid_size=25):
+        """Predict the counts for n scenarios at once. dinosaurs and trees
+           are the starting counts (length n), and seasons is the season
+           index for each day to predict, shape (days, n) or (days,) if
+           shared. Returns two arrays of shape (days, n).
+        """
+        dinosaurs = numpy.array(dinosaurs, dtype=float, ndmin=1)
+        trees = numpy.array(trees, dtype=float, ndmin=1)
+        seasons = numpy.asarray(seasons)
+        if seasons.ndim == 1:
+            seasons = numpy.repeat(seasons[:, None], len(dinosaurs), axis=1)
+        cells = numpy.asarray(grid_size, dtype=float) ** 2
+        grid_size = numpy.broadcast_to(grid_size, dinosaurs.shape)
+
+        predicted = numpy.zeros((2, len(seasons), len(dinosaurs)))
+        for day, season in enumerate(seasons):
+            X = self.features(season, dinosaurs, trees, grid_size)
+            dinosaurs = numpy.clip(dinosaurs * (1 + X @ self.dinosaur_rates), 0, cells)
+            trees = numpy.clip(trees * (1 + X @ self.tree_rates), 0, cells)
+            predicted[:, day] = dinosaurs, trees
+        return predicted[0], predicted[1]
+
+    def forecast(
+        self,
+        dinosaurs,
+        trees,
+        days=365,
+        season="summer",
+        days_left_season=90,
+        days_in_season=90,
+        grid_size=25,
+    ):
+        """Forecast the counts of one scenario (as DinosaurDilemma arguments)
+           for a number of days. Returns two arrays of length days.
+        """
+        seasons = season_schedule(season, days_left_season, days_in_season, days)
+        predicted = self.predict(dinosaurs, trees, seasons, grid_size)
+        return predicted[0][:, 0], predicted[1][:, 0]
+
+    def evaluate(self, runs):
+        """Evaluate the model against recorded (held out) runs. Each run is
+           predicted day by day from its counts on the first day, with its
+           seasons, and compared on the recorded days. Returns the mean
+           absolute error (per recorded day, and at the end) for each species.
+        """
+        errors = {
+            "dinosaurs": [],
+            "trees": [],
+            "final_dinosaurs": [],
+            "final_trees": [],
+        }
+        for run in runs:
+            dinosaurs, trees = self.predict(
+                run["dinosaurs"][0],
+                run["trees"][0],
+                run["seasons"][1:],
+                run["grid_size"],
+            )
+            recorded = numpy.array(run["days"][1:], dtype=int) - run["days"][0] - 1
+            for name, predicted in [("dinosaurs", dinosaurs), ("trees", trees)]:
+                actual = numpy.array(run[name][1:], dtype=float)
+                if not len(actual):
+                    continue
+                error = numpy.abs(predicted[recorded, 0] - actual)
+                errors[name].append(error.mean())
+                errors["final_" + name].append(error[-1])
+
+        report = {"runs": len(runs)}
+        for name, values in errors.items():
+            report["mae_" + name] = float(numpy.mean(values)) if values else None
+        return report
+
+    def save(self, path):
+        with open(path, "w") as filey:
+            filey.write(
+                json.dumps(
+                    {
+                        "features": FEATURES,
+                        "dinosaur_rates": self.dinosaur_rates.tolist(),
+                        "tree_rates": self.tree_rates.tolist(),
+                    },
+                    indent=4,
+                )
+            )
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as filey:
+            data = json.loads(filey.read())
+        return cls(data["dinosaur_rates"], data["tree_rates"])
+
+
+def fit_store(path, holdout=0.2):
+    """Fit a MeanFieldModel from the runs in a ResultsStore at path, holding
+       out the last fraction (holdout) of runs to evaluate it. Returns the
+       model and the evaluation report.
+    """
+    from dinolemma.results import ResultsStore
+
+    store = ResultsStore(path)
+    runs = load_runs(store)
+    store.close()
+    if not runs:
+        raise ValueError("There are no recorded runs in %s" % path)
+
+    held_out = int(round(len(runs) * holdout))
+    if len(runs) > 1:
+        held_out = min(max(held_out, 1), len(runs) - 1)
+    else:
+        held_out = 0
+    training = runs[: len(runs) - held_out]
+    model = MeanFieldModel().fit(training)
+    report = model.evaluate(runs[len(runs) - held_out :] if held_out else training)
+    report["training_runs"] = len(training)
+    return model, report
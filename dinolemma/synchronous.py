@@ -0,0 +1,153 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+from dinolemma.kernels import first_per_key
+import numpy
+
+# The phases of a synchronous day (see DinosaurDilemma.run_day_synchronous)
+# read the state of the previous phase and write a new one, so no entity
+# sees the changes of another in the same phase, and the result does not
+# depend on the order of entities. Conflicts are resolved explicitly: claims
+# of the same cell (or of the same avocados) go to the lowest priority draw.
+# The rules of an interaction are those of dinolemma.interactions (e.g., of
+# two fighting dinosaurs, the stronger dies), but as entities don't see each
+# other's changes within a phase, a day is not the same as DinosaurDilemma.run_day.
+
+# left, right, down, up (the order of DinosaurDilemma.get_adjacent_coords)
+DIRECTIONS = numpy.array([(-1, 0), (1, 0), (0, -1), (0, 1)])
+
+# Counter positions of the draws for an entity on a day (the same as in
+# dinolemma.batch), so each draw has a fixed place regardless of the others
+MOVE, PRIORITY, CHANGE, REPRODUCE, INTERACT, BIRTH = 0, 1, 2, 6, 7, 19
+
+
+class Cells:
+    """A lookup of the entity (by index) in each occupied cell, from arrays
+       of x and y. Cells are kept as sorted keys, so a lookup is a binary
+       search and memory scales with entities, not the size of the grid.
+    """
+
+    def __init__(self, size, x, y):
+        self.size = size
+        keys = numpy.asarray(x) * size + numpy.asarray(y)
+        self.order = numpy.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+
+    def __str__(self):
+        return "[cells:%s]" % len(self.keys)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def find(self, x, y):
+        """Return the index of the entity in each cell (x, y), or -1 if the
+           cell is empty (or not on the grid)
+        """
+        inside = (x >= 0) & (x < self.size) & (y >= 0) & (y < self.size)
+        if not len(self.keys):
+            return numpy.full(len(x), -1, dtype=numpy.int64)
+        keys = x * self.size + y
+        position = numpy.minimum(
+            numpy.searchsorted(self.keys, keys), len(self.keys) - 1
+        )
+        found = inside & (self.keys[position] == keys)
+        return numpy.where(found, self.order[position], -1)
+
+
+def choose_cells(size, x, y, occupied, u, priority):
+    """Each entity at x, y chooses a random (u) adjacent cell on the grid
+       that is not occupied (a Cells of every entity). Entities that choose
+       the same cell are resolved by priority (the lowest wins), and the
+       others stay. Returns the index of the winners, and their cells.
+    """
+    mask = numpy.zeros((len(x), 4), dtype=bool)
+    for direction, (dx, dy) in enumerate(DIRECTIONS):
+        nx, ny = x + dx, y + dy
+        inside = (nx >= 0) & (nx < size) & (ny >= 0) & (ny < size)
+        mask[:, direction] = inside & (occupied.find(nx, ny) < 0)
+
+    number_open = mask.sum(axis=1)
+    chosen = numpy.floor(u * number_open)
+    direction = numpy.argmax(numpy.cumsum(mask, axis=1) > chosen[:, None], axis=1)
+    tx = x + DIRECTIONS[direction, 0]
+    ty = y + DIRECTIONS[direction, 1]
+
+    candidates = numpy.flatnonzero(number_open > 0)
+    keys = tx * size + ty
+    winners = candidates[first_per_key(keys[candidates], priority[candidates])]
+    return winners, tx[winners], ty[winners]
+
+
+def interact(size, dinos, trees, u, priority):
+    """Every dinosaur interacts with its neighbors (in each direction),
+       reading the state of dinos and trees (arrays, by attribute) without
+       changing it. A dinosaur eats from a mature tree with avocados (the
+       claims on a tree are granted by priority, up to the avocados it has),
+       can trample a small tree, and two aggressive dinosaurs can fight (the
+       stronger can die). u has three rows (eat, trample and fight) for each
+       direction. Returns the change in hunger of each dinosaur, avocados
+       eaten from each tree, the dinosaurs and trees killed (masks) and the
+       number of fights.
+    """
+    number = len(dinos["x"])
+    dino_cells = Cells(size, dinos["x"], dinos["y"])
+    tree_cells = Cells(size, trees["x"], trees["y"])
+    killed_dinos = numpy.zeros(number, dtype=bool)
+    killed_trees = numpy.zeros(len(trees["x"]), dtype=bool)
+    fights = 0
+    claims = []
+
+    u = u.reshape(4, 3, number)
+    for direction, (dx, dy) in enumerate(DIRECTIONS):
+        eat, trample, fight = u[direction]
+        nx, ny = dinos["x"] + dx, dinos["y"] + dy
+
+        # A dinosaur claims avocados from a mature tree, and can trample one
+        tree = tree_cells.find(nx, ny)
+        actor = numpy.flatnonzero(tree >= 0)
+        tree = tree[actor]
+        avocados = trees["avocados"][tree]
+        fruit = (trees["height"][tree] > 0.80) & (avocados > 0)
+        demand = numpy.where(fruit, numpy.floor(eat[actor] * avocados), 0)
+        claims.append((actor, tree, demand.astype(numpy.int64)))
+        trampled = (trees["height"][tree] <= 0.10) & (trample[actor] < 0.5)
+        killed_trees[tree[trampled]] = True
+
+        # Two aggressive dinosaurs can fight, and the stronger (less hungry) can
+        # die, as in dinolemma.interactions.dinosaurXdinosaur
+        other = dino_cells.find(nx, ny)
+        actor = numpy.flatnonzero(other >= 0)
+        other = other[actor]
+        hunger = dinos["hunger"][actor]
+        hunger_other = dinos["hunger"][other]
+        p_fight = numpy.minimum(1.0, (hunger + hunger_other) / 2)
+        fought = (hunger > 0.9) & (hunger_other > 0.9) & (fight[actor] < p_fight)
+        fights += int(fought.sum())
+        deadly = fought & (numpy.abs(hunger - hunger_other) > 0.4)
+        loser = numpy.where(hunger < hunger_other, actor, other)
+        killed_dinos[loser[deadly]] = True
+
+    # Claims on a tree are granted in order of priority, while avocados last
+    actor, tree, demand = [numpy.concatenate(c) for c in zip(*claims)]
+    order = numpy.lexsort((priority[actor], tree))
+    actor, tree, demand = actor[order], tree[order], demand[order]
+    before = numpy.cumsum(demand) - demand
+    first = numpy.ones(len(tree), dtype=bool)
+    first[1:] = tree[1:] != tree[:-1]
+    before -= before[first][numpy.cumsum(first) - 1]
+    granted = numpy.clip(trees["avocados"][tree] - before, 0, demand)
+
+    # Avocados from a diseased tree make a dinosaur hungrier
+    sick = trees["is_diseased"][tree] & (granted > 0)
+    hunger = numpy.zeros(number)
+    numpy.add.at(hunger, actor, numpy.where(sick, -0.1, 0.1) * granted)
+    eaten = numpy.zeros(len(trees["x"]), dtype=numpy.int64)
+    numpy.add.at(eaten, tree, granted)
+    return hunger, eaten, killed_dinos, killed_trees, fights
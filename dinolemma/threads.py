@@ -0,0 +1,81 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy
+import os
+
+# Entities per chunk, so the arrays a kernel touches for a chunk (about a
+# dozen, of 8 bytes per entity) fit in a core's cache
+CHUNK_SIZE = 8192
+
+
+class KernelPool:
+    """A KernelPool runs the vectorized kernels (dinolemma.kernels) for
+       arrays of entities in chunks on a pool of threads. numpy releases the
+       GIL for array operations, so chunks run on several cores at once,
+       without the cost of starting processes or copying arrays. Kernels
+       update their arrays in place, and each chunk is a view, so the
+       chunks write straight into the arrays. With one worker (or fewer
+       entities than a chunk) the kernel is called directly.
+    """
+
+    def __init__(self, workers=None, chunk_size=CHUNK_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.executor = None
+
+    def __str__(self):
+        return "[kernel-pool:%s workers]" % self.workers
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["executor"] = None
+        return state
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def run(self, kernel, *args):
+        """Run kernel(*args), where the number of entities is the length of
+           the first argument. Any array argument with an axis for entities
+           (the last) is split into chunks, and other arguments (e.g., the
+           temperature) are given to every chunk. If the kernel returns an
+           array (e.g., a death check), the chunks are joined.
+        """
+        number = numpy.shape(args[0])[-1]
+        if self.workers < 2 or number <= self.chunk_size:
+            return kernel(*args)
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.workers)
+
+        def chunk(start):
+            end = start + self.chunk_size
+            return kernel(
+                *[
+                    arg[..., start:end]
+                    if isinstance(arg, numpy.ndarray)
+                    and arg.ndim
+                    and arg.shape[-1] == number
+                    else arg
+                    for arg in args
+                ]
+            )
+
+        results = list(self.executor.map(chunk, range(0, number, self.chunk_size)))
+        if results[0] is None:
+            return None
+        return numpy.concatenate(results, axis=-1)
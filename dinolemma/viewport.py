@@ -0,0 +1,164 @@
+"""
+
+Copyright (C) 2020 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+
+from dinolemma.render import EMPTY, MARGIN, palette
+import math
+import numpy
+
+# The largest cell (in pixels) we zoom in to, and the smallest cell that
+# is drawn with a margin around it
+MAX_CELL = 64
+MIN_MARGIN_CELL = 4
+
+
+def block_reduce(codes, block, colors=None):
+    """Reduce a grid of palette codes to blocks (block x block cells), and
+       return an image of (rows, columns, 3) rgb, where each block is white
+       blended toward the color of each species by its share of the cells.
+       colors is the palette (by default dinolemma.render.palette).
+    """
+    rows, columns = math.ceil(codes.shape[0] / block), math.ceil(codes.shape[1] / block)
+    padded = numpy.full((rows * block, columns * block), EMPTY, dtype=codes.dtype)
+    padded[: codes.shape[0], : codes.shape[1]] = codes
+    blocks = padded.reshape(rows, block, columns, block)
+
+    colors = (palette() if colors is None else colors).astype(numpy.float32)
+    image = numpy.zeros((rows, columns, 3), dtype=numpy.float32)
+    empty = numpy.ones((rows, columns), dtype=numpy.float32)
+    for code in numpy.unique(codes):
+        if code == EMPTY:
+            continue
+        share = (blocks == code).mean(axis=(1, 3), dtype=numpy.float32)
+        empty -= share
+        image += share[:, :, None] * colors[code]
+    image += empty[:, :, None] * colors[EMPTY]
+    return image.astype(numpy.uint8)
+
+
+class Viewport:
+    """A Viewport is the part of a square world (of size cells) shown in a
+       window of width x height pixels. It can be panned and zoomed, and
+       draws only what is visible: every pixel looks up the cell under it,
+       so the cost of a frame depends on the pixels of the window and not
+       the size of the world. When zoomed out so far that a pixel covers
+       more than one cell, an overview is shown instead, where the grid is
+       reduced to blocks (one per pixel) colored by density. The overview
+       is computed once per grid of codes (e.g., once a day), and reused
+       for frames while panning, as is the palette.
+
+       cell: the pitch of a cell in pixels (by default the world fits)
+       margin: the share of the pitch drawn as a margin before each cell
+    """
+
+    def __init__(self, size, width, height, cell=None, margin=0.0):
+        self.size = size
+        self.width = width
+        self.height = height
+        self.margin = margin
+        self.fit = min(width, height) / size
+        self.cell = cell or self.fit
+        self.x = self.y = 0.0
+        self.center(size / 2, size / 2)
+        self.overview = None
+        self.colors = palette()
+
+    def __str__(self):
+        return "[viewport:%.2f px per cell at %.1f,%.1f]" % (self.cell, self.x, self.y)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def center(self, x, y):
+        """Center the view on cell x (row), y (column)
+        """
+        self.x = x - self.height / self.cell / 2
+        self.y = y - self.width / self.cell / 2
+        self.clamp()
+
+    def clamp(self):
+        """Keep the view on the world (or centered on it if it is smaller)
+        """
+        for axis, pixels in [("x", self.height), ("y", self.width)]:
+            span = pixels / self.cell
+            if span >= self.size:
+                value = (self.size - span) / 2
+            else:
+                value = min(max(getattr(self, axis), 0), self.size - span)
+            setattr(self, axis, value)
+
+    def pan(self, dx, dy):
+        """Move the view by dx, dy pixels (right and down)
+        """
+        self.x += dy / self.cell
+        self.y += dx / self.cell
+        self.clamp()
+
+    def zoom(self, factor, px=None, py=None):
+        """Zoom by a factor (above one zooms in), keeping the cell under the
+           pixel px, py (by default the center of the window) in place
+        """
+        px = self.width / 2 if px is None else px
+        py = self.height / 2 if py is None else py
+        x, y = self.x + py / self.cell, self.y + px / self.cell
+        self.cell = min(max(self.cell * factor, self.fit), MAX_CELL)
+        self.x, self.y = x - py / self.cell, y - px / self.cell
+        self.clamp()
+
+    def reset(self):
+        """Zoom out to fit the world, centered
+        """
+        self.cell = self.fit
+        self.center(self.size / 2, self.size / 2)
+
+    def cell_at(self, px, py):
+        """Return the cell (row, column) under pixel px, py, or None
+        """
+        x, y = math.floor(self.x + py / self.cell), math.floor(self.y + px / self.cell)
+        if 0 <= x < self.size and 0 <= y < self.size:
+            return x, y
+
+    def _axis(self, start, pixels, scale=1):
+        """For each pixel along an axis, the index (of cells, or blocks of
+           scale cells) under it, whether it is on the world, and whether it
+           is in the margin of its cell
+        """
+        position = start + numpy.arange(pixels) / self.cell
+        index = numpy.floor(position).astype(numpy.int64)
+        inside = (index >= 0) & (index < self.size)
+        edge = numpy.zeros(pixels, dtype=bool)
+        if self.margin and self.cell >= MIN_MARGIN_CELL:
+            edge = (position - index) * self.cell + 1e-6 < self.margin * self.cell
+        return numpy.clip(index // scale, 0, (self.size - 1) // scale), inside, edge
+
+    def render(self, codes):
+        """Render a grid of palette codes (see dinolemma.render.grid_codes)
+           for the view, as a (height, width, 3) rgb image
+        """
+        if self.cell >= 1:
+            rows, inside_rows, edge_rows = self._axis(self.x, self.height)
+            cols, inside_cols, edge_cols = self._axis(self.y, self.width)
+            image = codes[numpy.ix_(rows, cols)]
+            image[edge_rows[:, None] | edge_cols[None, :]] = MARGIN
+            image[~(inside_rows[:, None] & inside_cols[None, :])] = MARGIN
+            return self.colors[image]
+
+        # Zoomed out: each pixel shows a block of cells
+        block = math.ceil(1 / self.cell)
+        if (
+            self.overview is None
+            or self.overview[0] is not codes
+            or self.overview[1] != block
+        ):
+            self.overview = (codes, block, block_reduce(codes, block, self.colors))
+        rows, inside_rows, _ = self._axis(self.x, self.height, block)
+        cols, inside_cols, _ = self._axis(self.y, self.width, block)
+        image = self.overview[2][numpy.ix_(rows, cols)]
+        image[~(inside_rows[:, None] & inside_cols[None, :])] = self.colors[MARGIN]
+        return image
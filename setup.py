@@ -64,6 +64,7 @@ if __name__ == "__main__":
     INSTALL_REQUIRES = get_reqs(lookup)
     TESTS_REQUIRES = get_reqs(lookup, "TESTS_REQUIRES")
     GAME_REQUIRES = get_reqs(lookup, "GAME_REQUIRES")
+    RENDER_REQUIRES = get_reqs(lookup, "RENDER_REQUIRES")
     setup(
         name=NAME,
         version=VERSION,
@@ -83,7 +84,7 @@ if __name__ == "__main__":
         setup_requires=["pytest-runner"],
         install_requires=INSTALL_REQUIRES,
         tests_require=TESTS_REQUIRES,
-        extras_require={"game": GAME_REQUIRES},
+        extras_require={"game": GAME_REQUIRES, "render": RENDER_REQUIRES},
         classifiers=[
             "Intended Audience :: Science/Research",
             "Intended Audience :: Developers",